@@ -1,10 +1,8 @@
 import os
-import json
-import requests
 import time
 import argparse
 import threading
-import re
+import subprocess
 import tempfile
 from io import BytesIO
 from playsound import playsound
@@ -13,9 +11,17 @@ from contextlib import contextmanager
 import sys
 
 import speech_recognition as sr
-from gtts import gTTS
 
-OLLAMA_URL = "http://localhost:11434/api/generate"
+# Modules partagés avec l'application web
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "webapp"))
+from ollama_client import ollama_client, OllamaError
+from history import HistoryManager
+from vad import vad
+from constants import INGEST_SAMPLE_RATE, STT_BACKEND, STT_FALLBACKS, TTS_BACKEND
+from speech_recognizers import create_recognizer, preload_recognizers
+from tts_backends import load_tts_backend
+from speech_text import normalize_for_speech
+
 MODEL_NAME = "mistral:7b"
 SYSTEM_PROMPT = """Tu es un assistant vocal français intelligent et serviable. 
 Réponds de manière claire et concise, idéalement en 2-3 phrases. 
@@ -40,8 +46,14 @@ class AssistantVocal:
         self.temp_dir = tempfile.gettempdir()
         
         self.listening = False
-        self.conversation_history = []
+        self.historique = HistoryManager()
         self.language = "fr-FR"
+        # Même moteur que l'application web, chargé une fois ; l'anglais reste un repli,
+        # désormais tenté en même temps que le français et non plus après lui
+        preload_recognizers(self.language)
+        self.reconnaissance = create_recognizer(STT_BACKEND, self.language, INGEST_SAMPLE_RATE,
+                                                list(STT_FALLBACKS) + ["google:en-US"])
+        self.synthese = load_tts_backend(TTS_BACKEND)
     
     def ecouter(self):
         with suppress_stderr():
@@ -71,27 +83,8 @@ class AssistantVocal:
                 print("🔇 Silence détecté - aucune entrée vocale")
                 return None
             
-            texte = None
-            
-            try:
-                texte = self.recognizer.recognize_google(audio, language="fr-FR")
-            except:
-                pass
-                
-            if not texte:
-                try:
-                    options = {"language": "fr-FR", "show_all": True}
-                    results = self.recognizer.recognize_google(audio, **options)
-                    if isinstance(results, dict) and 'alternative' in results and results['alternative']:
-                        texte = results['alternative'][0]['transcript']
-                except:
-                    pass
-            
-            if not texte:
-                try:
-                    texte = self.recognizer.recognize_google(audio)
-                except:
-                    pass
+            pcm = audio.get_raw_data(convert_rate=INGEST_SAMPLE_RATE, convert_width=2)
+            texte = self.reconnaissance.recognize(pcm)
             
             if texte and len(texte.strip()) < 2:
                 print("🔇 Détection trop courte ignorée")
@@ -113,39 +106,33 @@ class AssistantVocal:
             
     def _est_silence(self, audio_data):
         try:
-            import numpy as np
-            
-            audio_array = np.frombuffer(audio_data.get_raw_data(), dtype=np.int16)
-            
-            rms = np.sqrt(np.mean(np.square(audio_array.astype(np.float32))))
-            
-            silence_threshold = 200
-            
-            if rms < silence_threshold:
-                return True
-                
-            silence_percentage = np.sum(np.abs(audio_array) < 100) / len(audio_array)
-            if silence_percentage > 0.9:
-                return True
-                
-            return False
+            # Même détection d'activité vocale que l'application web (énergie + passages par zéro)
+            resultat = vad.analyze(audio_data.get_raw_data(convert_width=2), audio_data.sample_rate)
+            vad.record(resultat)
+            return not resultat.speech
         except Exception as e:
             print(f"⚠️ Erreur lors de la vérification du silence: {e}")
             return False
     
     def parler(self, texte):
-        texte = self._nettoyer_texte(texte)
+        texte = normalize_for_speech(texte, 'fr')
         print(f"🔊 Assistant: {texte}")
         
+        speed_factor = 1.3
         try:
-            tts = gTTS(text=texte, lang='fr', slow=False)
-            
-            temp_file = os.path.join(self.temp_dir, f"assistant_vocal_{int(time.time())}.mp3")
-            tts.save(temp_file)
+            if self.synthese.streaming and self._check_ffplay_installed():
+                # Moteur local : la lecture commence dès la première trame, pendant la synthèse
+                self._lire_en_flux(self.synthese.stream(texte, 'fr', speed_factor))
+                return
+
+            clip = self.synthese.synthesize(texte, 'fr', speed_factor)
+            temp_file = os.path.join(self.temp_dir, f"assistant_vocal_{int(time.time())}.{clip.format}")
+            with open(temp_file, 'wb') as f:
+                f.write(clip.data)
             
             if self._check_ffplay_installed():
-                speed_factor = 1.3
-                cmd = f"ffplay -nodisp -autoexit -loglevel quiet -af atempo={speed_factor} {temp_file}"
+                tempo = "" if self.synthese.native_speed else f"-af atempo={speed_factor} "
+                cmd = f"ffplay -nodisp -autoexit -loglevel quiet {tempo}{temp_file}"
                 os.system(cmd)
             else:
                 playsound(temp_file)
@@ -158,6 +145,23 @@ class AssistantVocal:
         except Exception as e:
             print(f"❌ Erreur lors de la synthèse vocale: {e}")
     
+    def _lire_en_flux(self, trames):
+        lecteur = None
+        try:
+            for trame in trames:
+                if lecteur is None:
+                    lecteur = subprocess.Popen(
+                        ["ffplay", "-nodisp", "-autoexit", "-loglevel", "quiet",
+                         "-f", "s16le", "-ar", str(trame.sample_rate), "-ac", "1", "-"],
+                        stdin=subprocess.PIPE
+                    )
+                lecteur.stdin.write(trame.data)
+                lecteur.stdin.flush()
+        finally:
+            if lecteur is not None:
+                lecteur.stdin.close()
+                lecteur.wait()
+
     def _check_ffplay_installed(self):
         try:
             result = os.system("ffplay -version > /dev/null 2>&1")
@@ -165,14 +169,12 @@ class AssistantVocal:
         except:
             return False
     
-    def _nettoyer_texte(self, texte):
-        texte = re.sub(r'(\d+)\.(\d+)', r'\1 virgule \2', texte)
-        texte = re.sub(r'(\w+)\.(\w+)', r'\1 point \2', texte)
-        return texte
-    
     def obtenir_reponse_ollama(self, question):
-        context = "\n".join([f"{'Assistant' if i%2 else 'Utilisateur'}: {msg}" 
-                            for i, msg in enumerate(self.conversation_history)])
+        resume = self.historique.summary_text("fr")
+        lignes = [resume] if resume else []
+        lignes += [f"{'Assistant' if i%2 else 'Utilisateur'}: {msg}" 
+                   for i, msg in enumerate(self.historique.contents())]
+        context = "\n".join(lignes)
         
         prompt = f"{context}\nUtilisateur: {question}\nAssistant:"
         
@@ -188,17 +190,14 @@ class AssistantVocal:
         }
         
         try:
-            response = requests.post(OLLAMA_URL, json=payload)
-            if response.status_code == 200:
-                response_text = response.json().get("response", "")
-                if len(self.conversation_history) > 10:
-                    self.conversation_history = self.conversation_history[-10:]
-                self.conversation_history.append(question)
-                self.conversation_history.append(response_text)
-                return response_text
-            else:
-                print(f"❌ Erreur Ollama: {response.status_code}")
-                return "Désolé, j'ai rencontré une erreur de communication avec le modèle."
+            response_text = ollama_client.generate(payload).get("response", "")
+            self.historique.add_turn(question, response_text)
+            # Le résumé des échanges évincés tourne pendant que la réponse est prononcée
+            self.historique.schedule_summary(ollama_client, MODEL_NAME, "fr")
+            return response_text
+        except OllamaError as e:
+            print(f"❌ Erreur Ollama: {e.status_code}")
+            return "Désolé, j'ai rencontré une erreur de communication avec le modèle."
         except Exception as e:
             print(f"❌ Exception lors de l'appel à Ollama: {e}")
             return "Désolé, je ne peux pas accéder au modèle pour le moment."
@@ -222,11 +221,11 @@ class AssistantVocal:
 
 def verifier_ollama():
     try:
-        response = requests.get("http://localhost:11434/api/tags")
-        if response.status_code != 200:
+        try:
+            models = ollama_client.list_models()
+        except OllamaError:
             return False, "Ollama n'est pas accessible"
         
-        models = response.json().get("models", [])
         model_names = [model.get("name") for model in models]
         
         if MODEL_NAME not in model_names:
@@ -1,76 +1,115 @@
-import requests
-import queue
+import os
+import threading
 from flask import Flask
 from flask_socketio import SocketIO
 from constants import *
-from routes import register_routes
+from ollama_client import ollama_client
+from routes import register_routes, register_async_routes, process_audio, process_audio_async
+from sessions import SessionManager, AsyncSessionManager
 from webassistant import WebAssistant
+from model_manager import model_manager
+from speech_recognizers import preload_recognizers
+from tts_backends import load_tts_backend
 
 app = Flask(__name__, static_folder='static', template_folder='templates')
 app.config['SECRET_KEY'] = FLASK_SECRET_KEY
 socketio = SocketIO(app, cors_allowed_origins="*")
 
-audio_queue = queue.Queue()
-is_processing_ref = [False]
-processing_thread_ref = [None]
-
-global_assistant = None
+session_manager = SessionManager(socketio, process_audio, max_workers=SESSION_MAX_WORKERS)
 
 def verifier_ollama():
+    model_ref = DEFAULT_MODEL
     try:
-        model_ref = DEFAULT_MODEL
-        response = requests.get(OLLAMA_TAGS_URL)
-        if response.status_code != 200:
-            return False, "Ollama n'est pas accessible"
-        
-        models = response.json().get("models", [])
-        available_models_ref = {}
-        for model in models:
-            model_name = model.get("name")
-            if ':' in model_name:
-                available_models_ref[model_name] = model_name
-            else:
-                model_tag = model.get("tag")
-                full_model_name = f"{model_name}:{model_tag}" if model_tag != "latest" else model_name
-                available_models_ref[full_model_name] = full_model_name
+        try:
+            available_models_ref = model_manager.refresh()
+        except Exception:
+            return False, "Ollama n'est pas accessible", {}, model_ref
         
         if model_ref not in available_models_ref:
-            return False, f"Le modèle {model_ref} n'est pas téléchargé. Exécutez: ollama pull {model_ref}"
+            return False, f"Le modèle {model_ref} n'est pas téléchargé. Exécutez: ollama pull {model_ref}", available_models_ref, model_ref
         
         return True, "OK", available_models_ref, model_ref
     except Exception as e:
-        return False, f"Erreur lors de la vérification d'Ollama: {e}"
+        return False, f"Erreur lors de la vérification d'Ollama: {e}", {}, model_ref
+
+def prechauffer_cache_tts():
+    assistant = WebAssistant()
+    try:
+        assistant.prewarm_tts_cache()
+    except Exception as e:
+        print(f"⚠️ Préchauffage du cache TTS interrompu: {e}")
+    finally:
+        assistant.close()
+
+def run_asyncio_server(models_dict, model_ref, ssl_paths):
+    import ssl
+    import socketio as python_socketio
+    from aiohttp import web
+
+    sio = python_socketio.AsyncServer(async_mode='aiohttp', cors_allowed_origins="*")
+    web_app = web.Application()
+    sio.attach(web_app)
+    async_session_manager = AsyncSessionManager(sio, process_audio_async, default_model=model_ref, max_workers=SESSION_MAX_WORKERS)
+    register_async_routes(web_app, sio, async_session_manager, models_dict, model_ref)
+
+    async def on_cleanup(_):
+        async_session_manager.shutdown()
+        model_manager.shutdown()
+        await ollama_client.aclose()
+    web_app.on_cleanup.append(on_cleanup)
+
+    ssl_context = None
+    if ssl_paths:
+        ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        ssl_context.load_cert_chain(*ssl_paths)
+    web.run_app(web_app, host=SERVER_HOST, port=SERVER_PORT, ssl_context=ssl_context)
+
+def certificats_ssl():
+    if os.path.exists(SSL_CERT_PATH) and os.path.exists(SSL_KEY_PATH):
+        return SSL_CERT_PATH, SSL_KEY_PATH
+    return None
 
 if __name__ == '__main__':
     
     ollama_ok, message, models_dict, model_ref = verifier_ollama()
-    global_assistant = WebAssistant()
-    register_routes(
-        app, 
-        socketio, 
-        global_assistant, 
-        audio_queue, 
-        is_processing_ref, 
-        processing_thread_ref, 
-        models_dict, 
-        model_ref
-    )
 
     if not ollama_ok:
         print(f"❌ {message}")
     else:
         print(f"✅ Ollama est prêt avec le modèle {model_ref}")
-        cert_path = '/home/arezkisaba/git/voice-assistant-sample/webapp/certs/192.168.1.100+3.pem'
-        key_path = '/home/arezkisaba/git/voice-assistant-sample/webapp/certs/192.168.1.100+3-key.pem'
-        # if not (os.path.exists(cert_path) and os.path.exists(key_path)):
+        # Catalogue tenu à jour en arrière-plan, modèle par défaut chargé avant le premier tour
+        model_manager.start()
+        if MODEL_PRELOAD:
+            model_manager.prefetch(model_ref)
+        preload_recognizers(SPEECH_LANG_MAP[DEFAULT_TTS_LANG])
+        load_tts_backend(TTS_BACKEND)
+        if TTS_CACHE_PREWARM:
+            threading.Thread(target=prechauffer_cache_tts, name="tts-prewarm", daemon=True).start()
+        ssl_paths = certificats_ssl()
+        # if not ssl_paths:
         #     print("🔐 Generating self-signed SSL certificate...")
-        #     os.system(f'openssl req -x509 -newkey rsa:4096 -nodes -out {cert_path} -keyout {key_path} -days 365 -subj "/CN=localhost"')
-        print("🔒 Starting server with HTTPS enabled")
-        socketio.run(
-            app,
-            host='0.0.0.0',
-            port=5000,
-            debug=True, 
-            ssl_context=(cert_path, key_path),
-            allow_unsafe_werkzeug=True
-        )
\ No newline at end of file
+        #     os.system(f'openssl req -x509 -newkey rsa:4096 -nodes -out {SSL_CERT_PATH} -keyout {SSL_KEY_PATH} -days 365 -subj "/CN=localhost"')
+        if ssl_paths:
+            print("🔒 Starting server with HTTPS enabled")
+        else:
+            print(f"⚠️ Certificat introuvable ({SSL_CERT_PATH}), démarrage en HTTP")
+        if SERVER_MODE == "asyncio":
+            print("⚡ Mode asyncio (python-socketio + aiohttp)")
+            run_asyncio_server(models_dict, model_ref, ssl_paths)
+        else:
+            session_manager.default_model = model_ref
+            register_routes(
+                app, 
+                socketio, 
+                session_manager, 
+                models_dict, 
+                model_ref
+            )
+            socketio.run(
+                app,
+                host=SERVER_HOST,
+                port=SERVER_PORT,
+                debug=SERVER_DEBUG,
+                ssl_context=ssl_paths,
+                allow_unsafe_werkzeug=True
+            )
\ No newline at end of file
@@ -0,0 +1,193 @@
+import asyncio
+import time
+
+from constants import *
+from ollama_client import OllamaError
+from tts_pipeline import overlap_metrics
+from cancellation import CancelToken
+from response_cache import replay_timeline
+from response_turn import ResponseTurn
+from metrics import metrics
+import logs
+import tracing
+
+
+async def stream_ollama_response(assistant, user_prompt, emitter, model_ref, cancel_token=None, typed=False, tts=True):
+    with tracing.turn("response", model=model_ref, typed=typed, tts=tts):
+        return await _stream_response(assistant, user_prompt, emitter, model_ref, cancel_token, typed, tts)
+
+
+async def _stream_response(assistant, user_prompt, emitter, model_ref, cancel_token, typed, tts):
+    loop = asyncio.get_running_loop()
+    cancel_token = cancel_token or CancelToken()
+    turn = ResponseTurn(assistant, model_ref, tts)
+    for event, data in turn.open(user_prompt, typed):
+        await emitter.emit(event, data)
+    if not turn.user_prompt:
+        return None
+    if turn.cached is not None:
+        return await replay_response(turn, emitter, cancel_token)
+
+    turn.start_generation()
+    lang = turn.lang
+    spans = []
+    first_frames = []
+    # File bornée entre le LLM et le TTS/émission : si la synthèse prend du retard,
+    # la lecture du flux Ollama est suspendue au lieu d'accumuler des segments
+    pending_audio = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+
+    binary_audio = getattr(emitter, 'binary_audio', False)
+
+    def synthesize(index, text, frames):
+        # Exécuté dans le pool TTS : les trames sont remises à la boucle au fil de la synthèse
+        push = lambda item: loop.call_soon_threadsafe(frames.put_nowait, item)
+        start = time.perf_counter()
+        first_frame_at = None
+        try:
+            result = assistant.tts_pipeline.synthesize(text, lang)
+            if isinstance(result, tuple):
+                push((result[0], None))
+            else:
+                # Synthèse en flux : chaque trame part dès qu'elle est prête, l'ordre des blocs est rétabli à l'émission
+                for part, frame in enumerate(result):
+                    first_frame_at = first_frame_at or time.perf_counter()
+                    push((frame, part))
+                    if cancel_token.cancelled:
+                        result.close()
+                        break
+        finally:
+            push(None)
+            end = time.perf_counter()
+            spans.append((start, end))
+            first_frames.append((first_frame_at or end) - start)
+            metrics.stage("tts_chunk", end - start)
+            tracing.record("tts_chunk", start, end, index=index, first_frame=first_frame_at and round(first_frame_at - start, 3))
+
+    async def emit_clip(index, clip, part=None):
+        payload = turn.audio_chunk(index, clip, binary_audio, part)
+        if payload:
+            with metrics.timed("emit"):
+                await emitter.emit('response_chunk', payload)
+
+    async def emit_audio():
+        while True:
+            item = await pending_audio.get()
+            if item is None:
+                return
+            index, frames, future = item
+            if cancel_token.cancelled:
+                # Synthèses en attente retirées de l'exécuteur, rien n'est plus émis
+                future.cancel()
+                continue
+            # Émission dans l'ordre des blocs, chaque trame dès sa remise par l'exécuteur
+            frame = await frames.get()
+            while frame is not None and not cancel_token.cancelled:
+                await emit_clip(index, *frame)
+                frame = await frames.get()
+            try:
+                await future
+            except Exception as e:
+                logs.error("❌ Erreur TTS", bloc=index, erreur=e)
+                if not cancel_token.cancelled:
+                    await emit_clip(index, None)
+
+    emit_task = asyncio.create_task(emit_audio())
+    next_index = 0
+
+    async def speak(index, spoken):
+        if spoken:
+            frames = asyncio.Queue()
+            future = loop.run_in_executor(assistant.tts_pipeline.executor, tracing.bind(synthesize), index, spoken, frames)
+            await pending_audio.put((index, frames, future))
+
+    async def emit_block(text):
+        nonlocal next_index
+        if cancel_token.cancelled:
+            return
+        index = next_index
+        next_index += 1
+        await emitter.emit('response_chunk', turn.text_chunk(index, text))
+        await speak(index, turn.speech(text))
+
+    async def read_stream():
+        nonlocal next_index
+        stream = turn.conversation.client.astream(turn.path, turn.payload)
+        try:
+            async for chunk_data in stream:
+                for segment in turn.feed(chunk_data):
+                    await emit_block(segment)
+                if turn.done:
+                    tail = turn.speech_tail()
+                    if tail and not cancel_token.cancelled:
+                        await speak(next_index, tail)
+                        next_index += 1
+                    turn.commit()
+                    break
+        finally:
+            # Ferme la réponse HTTP, y compris sur annulation : Ollama arrête de générer
+            await stream.aclose()
+
+    read_task = asyncio.create_task(read_stream())
+    # L'annulation peut venir d'un autre thread (tri des interruptions, transcript partiel)
+    cancel_reader = lambda: loop.call_soon_threadsafe(read_task.cancel)
+    cancel_token.add_callback(cancel_reader)
+    try:
+        await read_task
+    except asyncio.CancelledError:
+        if not cancel_token.cancelled:
+            raise
+    except OllamaError as e:
+        logs.error("❌ Erreur Ollama", statut=e.status_code)
+        await emitter.emit('response', turn.error("model_communication"))
+    except Exception as e:
+        logs.error("❌ Exception lors du streaming depuis Ollama", erreur=e)
+        await emitter.emit('response', turn.error("model_access"))
+    finally:
+        cancel_token.remove_callback(cancel_reader)
+        turn.touch_model()
+        generation_done_at = time.perf_counter()
+        if cancel_token.cancelled:
+            # Pas d'attente des synthèses en cours : émissions arrêtées, file vidée
+            emit_task.cancel()
+            while not pending_audio.empty():
+                item = pending_audio.get_nowait()
+                if item:
+                    item[2].cancel()
+            await asyncio.gather(emit_task, return_exceptions=True)
+        else:
+            await pending_audio.put(None)
+            await emit_task
+
+    if cancel_token.cancelled:
+        await emitter.emit('response_complete', turn.cancelled(cancel_token))
+        return None
+
+    if not turn.done:
+        return None
+
+    overlap = overlap_metrics(spans, generation_done_at, time.perf_counter() - generation_done_at)
+    if first_frames:
+        # Délai entre le début de synthèse d'un bloc et sa première trame audio
+        overlap['tts_first_frame'] = round(sum(first_frames) / len(first_frames), 3)
+    await emitter.emit('response_complete', turn.complete(overlap))
+    return turn.finish()
+
+
+async def replay_response(turn, emitter, cancel_token):
+    # Même requête déterministe : texte et audio enregistrés rejoués par les mêmes événements
+    turn.start_replay()
+    binary_audio = getattr(emitter, 'binary_audio', False)
+
+    for delay, kind, index, value in replay_timeline(turn.cached):
+        if delay:
+            await asyncio.sleep(delay)
+        if cancel_token.cancelled:
+            break
+        await emitter.emit('response_chunk', turn.replay_chunk(kind, index, value, binary_audio))
+
+    if cancel_token.cancelled:
+        await emitter.emit('response_complete', turn.cancelled(cancel_token))
+        return None
+
+    await emitter.emit('response_complete', turn.replay_complete())
+    return turn.finish()
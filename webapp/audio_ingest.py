@@ -0,0 +1,114 @@
+import base64
+import subprocess
+import threading
+
+from constants import *
+from metrics import metrics
+
+
+class AudioIngestError(Exception):
+    pass
+
+
+def decode_data_url(audio_data):
+    # "data:audio/webm;codecs=opus;base64,XXXX" -> octets bruts
+    if isinstance(audio_data, (bytes, bytearray, memoryview)):
+        return bytes(audio_data)
+    _, _, payload = audio_data.partition(',')
+    with metrics.timed("base64_decode"):
+        return base64.b64decode(payload or audio_data)
+
+
+def decode_to_pcm(audio_bytes, sample_rate=INGEST_SAMPLE_RATE):
+    # Conversion entièrement en mémoire : le conteneur arrive sur stdin, le PCM
+    # 16 bits mono ressort sur stdout, aucun fichier temporaire
+    command = [
+        "ffmpeg", "-nostdin", "-loglevel", "error",
+        "-i", "pipe:0",
+        "-f", "s16le", "-acodec", "pcm_s16le", "-ar", str(sample_rate), "-ac", "1",
+        "pipe:1"
+    ]
+    try:
+        with metrics.timed("ffmpeg"):
+            process = subprocess.run(command, input=audio_bytes, capture_output=True, check=False, timeout=INGEST_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        raise AudioIngestError(f"ffmpeg n'a pas pu être exécuté: {e}")
+    if process.returncode != 0 or not process.stdout:
+        stderr = process.stderr.decode('utf-8', errors='replace').strip()
+        raise AudioIngestError(f"ffmpeg a retourné {process.returncode}: {stderr}")
+    return process.stdout
+
+
+def ingest(audio_data, sample_rate=INGEST_SAMPLE_RATE):
+    audio_bytes = decode_data_url(audio_data)
+    return decode_to_pcm(audio_bytes, sample_rate)
+
+
+class StreamingDecoder:
+    # Un processus ffmpeg par énoncé : les morceaux du MediaRecorder sont écrits sur
+    # stdin au fil de l'eau, le PCM décodé est lu sur stdout par un thread dédié
+    def __init__(self, on_pcm, sample_rate=INGEST_SAMPLE_RATE, input_format=None):
+        input_args = ["-f", input_format] if input_format else []
+        command = [
+            "ffmpeg", "-nostdin", "-loglevel", "error",
+            "-fflags", "nobuffer", "-probesize", "4096", "-analyzeduration", "0",
+            *input_args, "-i", "pipe:0",
+            "-f", "s16le", "-acodec", "pcm_s16le", "-ar", str(sample_rate), "-ac", "1",
+            "-flush_packets", "1", "pipe:1"
+        ]
+        try:
+            self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except OSError as e:
+            raise AudioIngestError(f"ffmpeg n'a pas pu être exécuté: {e}")
+        self._on_pcm = on_pcm
+        self._block = sample_rate // 10 * 2
+        self.decoded_bytes = 0
+        self.error = None
+        self._reader = threading.Thread(target=self._read, name="ingest-stream", daemon=True)
+        self._reader.start()
+
+    def _read(self):
+        pending = b''
+        try:
+            while True:
+                data = self._process.stdout.read1(self._block)
+                if not data:
+                    break
+                # Toujours un nombre pair d'octets : un échantillon 16 bits n'est jamais coupé
+                pending += data
+                usable = len(pending) - len(pending) % 2
+                if usable:
+                    self.decoded_bytes += usable
+                    self._on_pcm(pending[:usable])
+                    pending = pending[usable:]
+        except Exception as e:
+            self.error = e
+
+    def feed(self, data):
+        try:
+            self._process.stdin.write(data)
+            self._process.stdin.flush()
+        except (BrokenPipeError, ValueError) as e:
+            raise AudioIngestError(f"ffmpeg a fermé le flux: {e}")
+
+    def close(self, timeout=INGEST_TIMEOUT):
+        try:
+            self._process.stdin.close()
+        except (BrokenPipeError, ValueError):
+            pass
+        self._reader.join(timeout)
+        try:
+            self._process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+            raise AudioIngestError("ffmpeg n'a pas terminé le décodage à temps")
+        if self.error:
+            raise AudioIngestError(f"Lecture du PCM interrompue: {self.error}")
+        if self._process.returncode != 0 and not self.decoded_bytes:
+            stderr = self._process.stderr.read().decode('utf-8', errors='replace').strip()
+            raise AudioIngestError(f"ffmpeg a retourné {self._process.returncode}: {stderr}")
+        return self.decoded_bytes
+
+    def abort(self):
+        self._process.kill()
+        self._reader.join(1)
@@ -0,0 +1,393 @@
+import io
+import subprocess
+import threading
+import wave
+from collections import namedtuple
+
+import numpy as np
+
+from constants import *
+import logs
+
+AudioClip = namedtuple("AudioClip", ["data", "format", "sample_rate"])
+
+
+class PostProcessError(Exception):
+    pass
+
+
+def time_stretch(samples, factor, sample_rate, frame_ms=30, search_ms=8, decimation=4):
+    # WSOLA : fenêtres de Hann superposées à 50 %, chaque fenêtre lue en entrée avec un pas
+    # multiplié par `factor` puis recalée (± search_ms) sur la continuité de la précédente.
+    # La recherche se fait sur le signal décimé puis est affinée à pleine résolution.
+    if factor == 1.0 or len(samples) == 0:
+        return samples
+    x = samples.astype(np.float32)
+    frame = max(32, int(sample_rate * frame_ms / 1000))
+    hop_out = frame // 2
+    hop_in = hop_out * factor
+    search = int(sample_rate * search_ms / 1000)
+    window = np.hanning(frame).astype(np.float32)
+
+    x = np.concatenate([np.zeros(search, np.float32), x, np.zeros(frame + 2 * search, np.float32)])
+    n_frames = max(1, int((len(samples) - frame) / hop_in) + 1)
+    out = np.zeros(n_frames * hop_out + frame, np.float32)
+    norm = np.zeros_like(out)
+
+    position = search
+    for k in range(n_frames):
+        nominal = search + int(k * hop_in)
+        if k > 0:
+            target = x[position + hop_out:position + hop_out + frame]
+            region = x[nominal - search:nominal + search + frame]
+            coarse = np.lib.stride_tricks.sliding_window_view(region[::decimation], frame // decimation)
+            offset = int(np.argmax(coarse @ target[::decimation][:frame // decimation])) * decimation
+            low = max(0, offset - decimation)
+            high = min(2 * search, offset + decimation)
+            fine = np.lib.stride_tricks.sliding_window_view(region[low:high + frame], frame)
+            position = nominal - search + low + int(np.argmax(fine @ target))
+        else:
+            position = nominal
+        start = k * hop_out
+        out[start:start + frame] += x[position:position + frame] * window
+        norm[start:start + frame] += window
+
+    out /= np.maximum(norm, 1e-3)
+    expected = int(len(samples) / factor)
+    return np.clip(out[:expected], -32768, 32767).astype(np.int16)
+
+
+def pcm_to_wav(pcm, sample_rate):
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+
+MP3_BITRATES = {
+    1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+}
+MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+# Retard du banc de filtres de synthèse : l'échantillon n d'un bloc ressort en position n + 529
+MP3_DECODER_DELAY = 529
+
+Mp3Frame = namedtuple("Mp3Frame", ["offset", "length", "samples", "sample_rate", "channels", "header", "bitrate"])
+
+
+def mp3_frame_info(data, offset):
+    # En-tête MPEG Layer III valide -> Mp3Frame, sinon None
+    header = int.from_bytes(data[offset:offset + 4], 'big')
+    version = (header >> 19) & 3
+    bitrate_index = (header >> 12) & 15
+    rate_index = (header >> 10) & 3
+    if header >> 21 != 0x7ff or version == 1 or (header >> 17) & 3 != 1 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    mpeg1 = version == 3
+    bitrate = MP3_BITRATES[1 if mpeg1 else 2][bitrate_index] * 1000
+    sample_rate = MP3_SAMPLE_RATES[version][rate_index]
+    length = (144 if mpeg1 else 72) * bitrate // sample_rate + ((header >> 9) & 1)
+    channels = 1 if (header >> 6) & 3 == 3 else 2
+    return Mp3Frame(offset, length, 1152 if mpeg1 else 576, sample_rate, channels, header, bitrate)
+
+
+def mp3_frames(data):
+    # Trames audio d'un mp3, sans étiquette ID3v2 ni trame d'en-tête Xing/Info (qui ne porte pas de son)
+    frames = []
+    offset = 0
+    while offset + 4 <= len(data):
+        if data[offset:offset + 3] == b'ID3' and offset + 10 <= len(data):
+            size = (data[offset + 6] << 21) | (data[offset + 7] << 14) | (data[offset + 8] << 7) | data[offset + 9]
+            offset += 10 + size
+            continue
+        frame = mp3_frame_info(data, offset)
+        if frame is None:
+            offset += 1
+            continue
+        if offset + frame.length > len(data):
+            break
+        side_info = (17 if frame.channels == 1 else 32) if frame.samples == 1152 else (9 if frame.channels == 1 else 17)
+        tag = offset + 4 + side_info + (0 if frame.header & 0x10000 else 2)
+        if data[tag:tag + 4] not in (b'Xing', b'Info'):
+            frames.append(frame)
+        offset += frame.length
+    return frames
+
+
+def silent_mp3_frame(header):
+    # Même en-tête sans CRC ni octet de bourrage, informations annexes à zéro : le décodeur
+    # produit une trame de silence sans rien lire dans le réservoir de bits
+    header = (header | 0x10000) & ~0x200
+    frame = mp3_frame_info(header.to_bytes(4, 'big'), 0)
+    return header.to_bytes(4, 'big') + bytes(frame.length - 4)
+
+
+class PersistentFfmpeg:
+    # Un ffmpeg gardé ouvert : écriture sur stdin, sortie accumulée par un thread de lecture
+    def __init__(self, command, timeout=MP3_DECODER_TIMEOUT):
+        try:
+            self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        except OSError as e:
+            raise PostProcessError(f"ffmpeg n'a pas pu être exécuté: {e}")
+        self.timeout = timeout
+        self._available = threading.Condition()
+        self._buffer = bytearray()
+        self._closed = False
+        self._reader = threading.Thread(target=self._read, name="ffmpeg-worker", daemon=True)
+        self._reader.start()
+
+    def _read(self):
+        try:
+            while True:
+                data = self._process.stdout.read1(65536)
+                if not data:
+                    break
+                with self._available:
+                    self._buffer += data
+                    self._available.notify_all()
+        finally:
+            with self._available:
+                self._closed = True
+                self._available.notify_all()
+
+    def _write(self, data):
+        try:
+            self._process.stdin.write(data)
+            self._process.stdin.flush()
+        except (BrokenPipeError, ValueError) as e:
+            raise PostProcessError(f"ffmpeg a fermé le flux: {e}")
+
+    def close(self):
+        self._process.kill()
+        self._reader.join(1)
+
+
+class Mp3StreamWorker(PersistentFfmpeg):
+    # mp3 -> PCM : les blocs sont écrits l'un après l'autre sur stdin, chacun suivi de trames muettes
+    # qui poussent ses derniers échantillons hors du décodeur. Le nombre d'échantillons par trame
+    # est fixe, la position de chaque bloc dans le PCM est donc exacte
+    def __init__(self, silence, timeout=MP3_DECODER_TIMEOUT):
+        super().__init__([
+            "ffmpeg", "-nostdin", "-loglevel", "error",
+            "-fflags", "nobuffer", "-probesize", "32", "-analyzeduration", "0",
+            "-f", "mp3", "-i", "pipe:0",
+            "-f", "s16le", "-acodec", "pcm_s16le", "-ac", "1",
+            "-flush_packets", "1", "pipe:1"
+        ], timeout)
+        self._buffer_start = 0
+        self._written = 0
+        # La première trame sert à détecter le format et ne ressort pas : une trame muette, non comptée
+        self._write(silence)
+
+    def decode(self, body, samples, flush, flush_samples):
+        # Positions en échantillons depuis le lancement du processus
+        first = self._written + MP3_DECODER_DELAY
+        last = first + samples
+        self._written += samples + flush_samples
+        self._write(body + flush)
+        with self._available:
+            ready = self._available.wait_for(
+                lambda: self._closed or self._buffer_start + len(self._buffer) // 2 >= last, self.timeout)
+            if not ready or self._buffer_start + len(self._buffer) // 2 < last:
+                raise PostProcessError("le décodeur mp3 n'a pas rendu le bloc à temps")
+            pcm = bytes(self._buffer[(first - self._buffer_start) * 2:(last - self._buffer_start) * 2])
+            del self._buffer[:(last - self._buffer_start) * 2]
+            self._buffer_start = last
+        return pcm
+
+
+class Mp3EncodeWorker(PersistentFfmpeg):
+    # PCM -> mp3 CBR sans réservoir de bits : chaque trame se décode seule, les trames d'un bloc
+    # forment donc un mp3 complet. La trame k couvre les échantillons [k * F - 576, (k + 1) * F - 576)
+    # de l'entrée ; chaque bloc est complété jusqu'à une frontière de trame, puis suivi de silence
+    # qui pousse ses dernières trames hors de l'encodeur et sera écarté au bloc suivant
+    def __init__(self, sample_rate, bitrate, timeout=MP3_DECODER_TIMEOUT):
+        super().__init__([
+            "ffmpeg", "-nostdin", "-loglevel", "error",
+            "-probesize", "32", "-analyzeduration", "0",
+            "-f", "s16le", "-ar", str(sample_rate), "-ac", "1", "-i", "pipe:0",
+            "-c:a", "libmp3lame", "-b:a", str(bitrate), "-reservoir", "0", "-compression_level", "7",
+            "-write_xing", "0", "-id3v2_version", "0",
+            "-f", "mp3", "-flush_packets", "1", "pipe:1"
+        ], timeout)
+        self.frame_samples = 1152 if sample_rate >= 32000 else 576
+        flush = int(sample_rate * MP3_ENCODER_FLUSH_MS / 1000)
+        self.flush_samples = -(-flush // self.frame_samples) * self.frame_samples
+        self._frame_start = 0
+        # Fins des trames complètes déjà repérées dans le tampon, complétées à chaque réveil
+        self._frame_ends = []
+        # Entrée alignée : le premier bloc commence sur une frontière de trame
+        priming = -MP3_ENCODER_DELAY % self.frame_samples
+        self._written = priming
+        self._write(bytes(priming * 2))
+
+    def _complete_frames(self):
+        offset = self._frame_ends[-1] if self._frame_ends else 0
+        while offset + 4 <= len(self._buffer):
+            frame = mp3_frame_info(self._buffer, offset)
+            if frame is None:
+                raise PostProcessError("trame mp3 invalide en sortie de l'encodeur")
+            if offset + frame.length > len(self._buffer):
+                break
+            offset += frame.length
+            self._frame_ends.append(offset)
+        return len(self._frame_ends)
+
+    def encode(self, pcm):
+        # Silence final : le décodeur rend l'échantillon n en n + 529, la fin du bloc doit tenir dans ses trames
+        samples = len(pcm) // 2
+        frames = -(-(samples + MP3_DECODER_DELAY) // self.frame_samples)
+        padded = frames * self.frame_samples
+        first = (self._written + MP3_ENCODER_DELAY) // self.frame_samples
+        skip = first - self._frame_start
+        self._written += padded + self.flush_samples
+        self._write(pcm[:samples * 2] + bytes((padded - samples + self.flush_samples) * 2))
+        with self._available:
+            ready = self._available.wait_for(lambda: self._closed or self._complete_frames() >= skip + frames, self.timeout)
+            if not ready or self._complete_frames() < skip + frames:
+                raise PostProcessError("l'encodeur mp3 n'a pas rendu le bloc à temps")
+            start = self._frame_ends[skip - 1] if skip else 0
+            end = self._frame_ends[skip + frames - 1]
+            mp3 = bytes(self._buffer[start:end])
+            del self._buffer[:end]
+            self._frame_ends = [offset - end for offset in self._frame_ends[skip + frames:]]
+            self._frame_start = first + frames
+        return mp3
+
+
+class WorkerPool:
+    # Processus persistants par format : chaque bloc prend un worker libre ou en lance un, et le rend
+    # ensuite. Les blocs synthétisés en parallèle (workers TTS de toutes les sessions) ne s'attendent
+    # pas ; au-delà de max_idle workers libres par format, les suivants sont arrêtés à leur retour.
+    # Un échec tue le worker : le bloc suivant en relance un neuf
+    def __init__(self, max_idle=MP3_POOL_MAX_IDLE):
+        self.max_idle = max_idle
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def run(self, key, create, job):
+        with self._lock:
+            idle = self._idle.get(key)
+            worker = idle.pop() if idle else None
+        if worker is None:
+            worker = create()
+        try:
+            result = job(worker)
+        except PostProcessError:
+            worker.close()
+            raise
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append(worker)
+                worker = None
+        if worker is not None:
+            worker.close()
+        return result
+
+    def close(self):
+        with self._lock:
+            workers = [worker for idle in self._idle.values() for worker in idle]
+            self._idle.clear()
+        for worker in workers:
+            worker.close()
+
+
+class Mp3Decoder:
+    # mp3 -> PCM 16 bits mono par des ffmpeg persistants par format (fréquence, canaux), au lieu
+    # d'un processus lancé pour chaque bloc
+    def __init__(self, flush_bytes=MP3_DECODER_FLUSH_BYTES, timeout=MP3_DECODER_TIMEOUT, max_idle=MP3_POOL_MAX_IDLE):
+        self.flush_bytes = flush_bytes
+        self.timeout = timeout
+        self.pool = WorkerPool(max_idle)
+
+    def decode(self, data):
+        # -> (PCM, fréquence, débit en bit/s de la première trame)
+        frames = mp3_frames(data)
+        if not frames:
+            raise PostProcessError("aucune trame mp3 dans le bloc")
+        first = frames[0]
+        if any(frame.sample_rate != first.sample_rate or frame.channels != first.channels for frame in frames):
+            raise PostProcessError("fréquence ou canaux variables dans le bloc")
+        body = b''.join(data[frame.offset:frame.offset + frame.length] for frame in frames)
+        # Trames muettes : un paquet complet du démultiplexeur, plus les deux trames que garde l'analyseur
+        silence = silent_mp3_frame(first.header)
+        flush_frames = -(-self.flush_bytes // len(silence)) + 2
+        pcm = self.pool.run((first.sample_rate, first.channels), lambda: Mp3StreamWorker(silence, self.timeout),
+                            lambda worker: worker.decode(body, len(frames) * first.samples, silence * flush_frames,
+                                                         flush_frames * first.samples))
+        return pcm, first.sample_rate, first.bitrate
+
+    def encode(self, pcm, sample_rate, bitrate):
+        # PCM 16 bits mono -> mp3 autonome, par un encodeur persistant par (fréquence, débit)
+        return self.pool.run(('encode', sample_rate, bitrate), lambda: Mp3EncodeWorker(sample_rate, bitrate, self.timeout),
+                             lambda worker: worker.encode(pcm))
+
+    def close(self):
+        self.pool.close()
+
+
+mp3_decoder = Mp3Decoder()
+
+
+class FfmpegPostProcessor:
+    def __init__(self, speed_factor=AUDIO_SPEED_FACTOR):
+        self.speed_factor = speed_factor
+
+    def process(self, clip):
+        if self.speed_factor == 1.0:
+            return clip
+        if clip.format == 'pcm':
+            input_args = ["-f", "s16le", "-ar", str(clip.sample_rate), "-ac", "1"]
+            output_args = ["-f", "wav"]
+            output_format = 'wav'
+        else:
+            input_args = ["-f", clip.format]
+            output_args = ["-f", clip.format]
+            output_format = clip.format
+        # Tout passe par stdin/stdout : pas de fichier temporaire, donc pas de collision
+        command = ["ffmpeg", "-nostdin", "-loglevel", "error", *input_args, "-i", "pipe:0",
+                   "-filter:a", f"atempo={self.speed_factor}", "-vn", *output_args, "pipe:1"]
+        try:
+            process = subprocess.run(command, input=clip.data, capture_output=True, check=False, timeout=30)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            raise PostProcessError(f"ffmpeg n'a pas pu être exécuté: {e}")
+        if process.returncode != 0 or not process.stdout:
+            raise PostProcessError(process.stderr.decode('utf-8', errors='replace').strip())
+        return AudioClip(process.stdout, output_format, clip.sample_rate)
+
+
+class NumpyPostProcessor:
+    def __init__(self, speed_factor=AUDIO_SPEED_FACTOR):
+        self.speed_factor = speed_factor
+        self.fallback = FfmpegPostProcessor(speed_factor)
+
+    def process(self, clip):
+        # Étirement en processus ; le mp3 (gTTS) est décodé puis réencodé en mp3 au même débit par
+        # des ffmpeg persistants. Seuls les autres formats, ou un échec, passent par ffmpeg
+        if clip.format == 'mp3' and self.speed_factor != 1.0:
+            try:
+                pcm, sample_rate, bitrate = mp3_decoder.decode(clip.data)
+                stretched = time_stretch(np.frombuffer(pcm, dtype=np.int16), self.speed_factor, sample_rate)
+                return AudioClip(mp3_decoder.encode(stretched.tobytes(), sample_rate, bitrate), 'mp3', sample_rate)
+            except PostProcessError as e:
+                logs.warning("⚠️ Codec mp3 persistant en échec, bloc passé à ffmpeg", erreur=e)
+                return self.fallback.process(clip)
+        if clip.format != 'pcm':
+            return self.fallback.process(clip)
+        samples = np.frombuffer(clip.data, dtype=np.int16)
+        stretched = time_stretch(samples, self.speed_factor, clip.sample_rate)
+        return AudioClip(pcm_to_wav(stretched.tobytes(), clip.sample_rate), 'wav', clip.sample_rate)
+
+
+POSTPROCESSORS = {
+    "ffmpeg": FfmpegPostProcessor,
+    "numpy": NumpyPostProcessor
+}
+
+
+def create_postprocessor(name=AUDIO_POSTPROCESS_ENGINE, speed_factor=AUDIO_SPEED_FACTOR):
+    return POSTPROCESSORS.get(name, NumpyPostProcessor)(speed_factor)
@@ -0,0 +1,53 @@
+import base64
+
+from constants import *
+from audio_postprocess import AudioClip, pcm_to_wav
+
+AUDIO_MIME_TYPES = {
+    'mp3': 'audio/mpeg',
+    'wav': 'audio/wav',
+    'ogg': 'audio/ogg',
+    'webm': 'audio/webm'
+}
+
+
+def client_supports_binary(auth):
+    # Les anciens clients ne s'annoncent pas : ils restent en base64
+    return AUDIO_BINARY_TRANSPORT and bool(auth) and bool(auth.get('binaryAudio'))
+
+
+def playable(clip):
+    # Trame PCM d'un moteur local : enveloppée en WAV pour être lue telle quelle par le navigateur
+    if clip.format == 'pcm':
+        return AudioClip(pcm_to_wav(clip.data, clip.sample_rate), 'wav', clip.sample_rate)
+    return clip
+
+
+def audio_chunk(index, clip, binary=False, part=None):
+    # En binaire, l'audio part en pièce jointe Socket.IO à côté d'un petit en-tête JSON
+    # (index, format, taille) : pas d'encodage base64 ni de surcoût de 33 %
+    clip = playable(clip)
+    payload = {
+        'text': '',
+        'index': index,
+        'format': clip.format,
+        'mime': AUDIO_MIME_TYPES.get(clip.format, 'application/octet-stream'),
+        'size': len(clip.data),
+        'isComplete': False
+    }
+    if part is not None:
+        # Trame d'un bloc synthétisé en flux : le client l'enchaîne sans pause avec la suivante
+        payload['part'] = part
+    if binary:
+        payload['audio'] = clip.data
+        payload['binary'] = True
+    else:
+        payload['audio'] = base64.b64encode(clip.data).decode('utf-8')
+    return payload
+
+
+def upload_bytes(data):
+    # Nouveau client : {'audio': <bytes>, 'mime': ...} ; ancien client : {'audio': 'data:...;base64,...'}
+    if isinstance(data, dict):
+        return data.get('audio')
+    return data
@@ -0,0 +1,91 @@
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from constants import *
+from conversation import ConversationEngine
+from ollama_client import OllamaClient
+from fake_ollama import FakeOllamaServer
+
+QUESTIONS = [
+    "Quelle est la capitale de la France ?",
+    "Combien d'habitants y vit-il ?",
+    "Quels monuments faut-il visiter ?",
+    "Et pour manger, que me conseilles-tu ?",
+    "Quel est le meilleur moment de l'année pour y aller ?",
+    "Comment s'y déplacer facilement ?",
+    "Peux-tu me résumer tout cela ?",
+    "Merci, et pour Lyon ?",
+    "Quelle spécialité culinaire goûter à Lyon ?",
+    "Combien de temps en train entre Paris et Lyon ?",
+    "Et en voiture ?",
+    "Merci beaucoup."
+]
+
+
+class LegacyConversation(ConversationEngine):
+    # Reproduit l'ancien comportement : prompt texte reconstruit à chaque tour, fenêtre glissante [-10:]
+    def build_request(self, model, lang, user_prompt):
+        return "/api/generate", {
+            "model": model,
+            "prompt": self._flat_prompt(lang, user_prompt),
+            "system": SYSTEM_PROMPTS.get(lang, SYSTEM_PROMPTS["fr"]),
+            "options": OLLAMA_OPTIONS
+        }
+
+    def commit_turn(self, model, lang, user_prompt, response, final_chunk=None):
+        history = self.history
+        if len(history) > 10:
+            history = history[-10:]
+        self.history = history + [user_prompt, response]
+        return {'prompt_eval_count': final_chunk.get('prompt_eval_count') if final_chunk else None}
+
+
+def run(engine_factory, turns):
+    server = FakeOllamaServer().start()
+    try:
+        engine = engine_factory(OllamaClient(base_url=server.base_url))
+        counts = []
+        for i in range(turns):
+            question = QUESTIONS[i % len(QUESTIONS)]
+            response = ""
+            final_chunk = None
+            with engine.stream(DEFAULT_MODEL, "fr", question) as stream:
+                for chunk in stream:
+                    response += engine.chunk_text(chunk)
+                    if chunk.get("done"):
+                        final_chunk = chunk
+            counts.append(engine.commit_turn(DEFAULT_MODEL, "fr", question, response, final_chunk)["prompt_eval_count"])
+        return counts
+    finally:
+        server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tokens de prompt évalués par tour selon la stratégie de conversation")
+    parser.add_argument("--turns", type=int, default=12)
+    parser.add_argument("--json", action="store_true", help="Sortie JSON")
+    args = parser.parse_args()
+
+    strategies = {
+        "legacy": lambda client: LegacyConversation(client=client),
+        "chat": lambda client: ConversationEngine(client=client, mode="chat"),
+        "context": lambda client: ConversationEngine(client=client, mode="context")
+    }
+    results = {name: run(factory, args.turns) for name, factory in strategies.items()}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print("Tour  " + "".join(f"{name:>10}" for name in results))
+    for turn in range(args.turns):
+        print(f"{turn + 1:>4}  " + "".join(f"{counts[turn]:>10}" for counts in results.values()))
+    print("Total " + "".join(f"{sum(counts):>10}" for counts in results.values()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from constants import *
+from audio_postprocess import AudioClip
+from ollama_client import ollama_client
+from sessions import SessionManager
+from fake_ollama import FakeOllamaServer
+from bench_sessions import RecordingSocketIO
+
+LONG_REPLY = " ".join(["La réponse continue avec une phrase de plus pour occuper le modèle."] * 40)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latence d'interruption : fin de l'énoncé d'arrêt -> dernier audio émis")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--tokens-per-second", type=float, default=30)
+    parser.add_argument("--tts-delay", type=float, default=0.3, help="durée d'une synthèse simulée")
+    parser.add_argument("--stt-delay", type=float, default=0.4, help="durée de reconnaissance simulée de l'interruption")
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(tokens_per_second=args.tokens_per_second, reply=LONG_REPLY).start()
+    ollama_client.base_url = server.base_url
+    socketio = RecordingSocketIO()
+
+    def handle(session, items):
+        text = " ".join(getattr(item, 'text', item) for item in items)
+        cancel_token = session.begin_turn()
+        try:
+            session.assistant.get_ollama_response(f"ok assistant {text}", session.emitter, session.model, cancel_token)
+        finally:
+            session.end_turn(cancel_token)
+
+    manager = SessionManager(socketio, handle)
+    session = manager.create("client")
+
+    def synthesize(text, lang):
+        time.sleep(args.tts_delay)
+        return AudioClip(text.encode("utf-8"), 'mp3', None), text
+
+    def transcribe(item):
+        # Reconnaissance simulée de l'énoncé d'arrêt reçu pendant la réponse
+        time.sleep(args.stt_delay)
+        return item
+
+    session.assistant.tts_pipeline.synthesize = synthesize
+    session.assistant.transcribe = transcribe
+
+    results = []
+    for _ in range(args.runs):
+        socketio.events.clear()
+        manager.submit("client", "raconte une longue histoire")
+        while not any(event == 'response_chunk' and data.get('audio') for _, _, event, data in list(socketio.events)):
+            time.sleep(0.01)
+        time.sleep(0.5)
+        manager.submit("client", INTERRUPT_WORDS[DEFAULT_TTS_LANG][0])
+        while not any(event == 'response_complete' for _, _, event, _ in list(socketio.events)):
+            time.sleep(0.01)
+        complete = [data for _, _, event, data in socketio.events if event == 'response_complete'][-1]
+        results.append(complete['metrics'])
+        time.sleep(0.2)
+
+    manager.shutdown()
+    server.stop()
+
+    def median(key):
+        values = sorted(m.get(key, 0.0) for m in results)
+        return values[len(values) // 2]
+
+    print(f"{args.runs} interruptions, reconnaissance {args.stt_delay}s, synthèse {args.tts_delay}s par bloc")
+    print(f"fin d'énoncé -> annulation         : {median('interrupt_to_cancel') * 1000:7.1f} ms (médiane)")
+    print(f"fin d'énoncé -> dernier audio émis : {median('interrupt_to_last_audio') * 1000:7.1f} ms (médiane)")
+    print(f"fin d'énoncé -> tour arrêté        : {median('interrupt_to_quiet') * 1000:7.1f} ms (médiane)")
+    print(f"générations coupées côté Ollama    : {server.cancelled}/{args.runs}")
+    if not all(m.get('cancel_reason') == 'interrupt' for m in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from constants import *
+from speech_text import SpeechNormalizer, normalize_for_speech
+from text_segmenter import create_segmenter
+
+ANSWER = """## Installation
+
+Voici **les étapes principales**, à suivre dans l'ordre. Consultez [la documentation
+officielle de Python](https://docs.python.org/3/) avant de commencer : la version 3.12 est recommandée.
+
+1. Créez un environnement virtuel avec `python -m venv env` puis activez-le.
+2. Installez les dépendances listées dans requirements.txt, *sans* les options de développement.
+3. Lancez le serveur :
+
+```python
+import app
+app.main(port=5000)  # le serveur écoute ici. Rien de tout cela n'est à lire.
+```
+
+> Astuce : gardez un terminal ouvert pour **suivre les journaux
+pendant le démarrage**, cela aide beaucoup.
+
+| Option | Valeur | Effet |
+|--------|--------|-------|
+| port   | 5000   | écoute |
+| debug  | non    | journaux |
+
+---
+
+Le fichier <code>config.yaml</code> contient le reste des réglages, par exemple __le modèle__ utilisé.
+"""
+
+# Caractères qui ne doivent jamais être prononcés
+MARKUP = re.compile(r'[`*#|<>]|\]\(|^\s*[-+]\s', re.MULTILINE)
+
+
+# Implémentation précédente (webassistant), conservée telle quelle comme référence
+def legacy_markdown_to_text(markdown_text):
+    if not markdown_text:
+        return ""
+    text = re.sub(r'```[\s\S]*?```', '', markdown_text)
+    text = re.sub(r'`([^`]+)`', r'\1', text)
+    text = re.sub(r'<[^>]+>', '', markdown_text)
+    text = re.sub(r'\[([^\]]+)\]\([^)]+\)', r'\1', text)
+    text = re.sub(r'^#{1,6}\s+', '', text, flags=re.MULTILINE)
+    text = re.sub(r'^\s*[-*+]\s+', '', text, flags=re.MULTILINE)
+    text = re.sub(r'^\s*\d+\.\s+', '', text, flags=re.MULTILINE)
+    text = re.sub(r'\*\*(.*?)\*\*', r'\1', text)
+    text = re.sub(r'__(.*?)__', r'\1', text)
+    text = re.sub(r'\*(.*?)\*', r'\1', text)
+    text = re.sub(r'_(.*?)_', r'\1', text)
+    text = re.sub(r'^\s*>\s+', '', text, flags=re.MULTILINE)
+    text = re.sub(r'^\s*([-_*])\1{2,}\s*$', '', text, flags=re.MULTILINE)
+    if '|' in text and re.search(r'[-|]+', text):
+        lines = text.split('\n')
+        in_table = False
+        table_lines = []
+        for i, line in enumerate(lines):
+            if '|' in line:
+                if not in_table:
+                    in_table = True
+                table_lines.append(i)
+            elif in_table and not line.strip():
+                in_table = False
+        if table_lines:
+            text_lines = text.split('\n')
+            for i in sorted(table_lines, reverse=True):
+                if i < len(text_lines):
+                    text_lines.pop(i)
+                    if i == table_lines[0]:
+                        text_lines.insert(i, f"[Tableau]")
+            text = '\n'.join(text_lines)
+    text = re.sub(r'\n{3,}', '\n\n', text)
+    return text.strip()
+
+
+def legacy_clean_text(texte):
+    texte = re.sub(r'(\d+)\.(\d+)', r'\1 virgule \2', texte)
+    texte = re.sub(r'(\w+)\.(\w+)', r'\1 point \2', texte)
+    return texte
+
+
+def stream_segments(text, token_chars=4):
+    # Découpe du flux comme en production : jetons de quelques caractères, segments de phrases
+    segmenter = create_segmenter(TEXT_SEGMENTER)
+    segments = []
+    for start in range(0, len(text), token_chars):
+        segments.extend(segmenter.feed(text[start:start + token_chars]))
+    segments.extend(segmenter.flush())
+    return segments
+
+
+def spoken_legacy(segments):
+    return [legacy_clean_text(legacy_markdown_to_text(segment)) for segment in segments]
+
+
+def spoken_streaming(segments):
+    normalizer = SpeechNormalizer("fr")
+    spoken = [normalizer.feed(segment) for segment in segments]
+    spoken.append(normalizer.flush())
+    return spoken
+
+
+def split_everywhere(text):
+    # Chaque coupure en deux morceaux (clôture de code, balise, lien, emphase coupés en plein milieu),
+    # sauf à l'intérieur d'un mot ou d'un nombre que le segmenteur ne coupe jamais : les positions
+    # dont le texte parlé diffère de la version d'un bloc, espaces ignorés
+    expected = re.sub(r'\s+', '', normalize_for_speech(text, "fr"))
+    return [cut for cut in range(1, len(text))
+            if not re.match(r'\w[\w.]|[\w.]\w', text[cut - 1:cut + 1])
+            and re.sub(r'\s+', '', "".join(spoken_streaming([text[:cut], text[cut:]]))) != expected]
+
+
+def timed(function, segments, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = function(segments)
+    return (time.perf_counter() - start) / rounds, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Markdown -> texte parlé : passes successives contre normaliseur en une passe")
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    segments = stream_segments(ANSWER)
+    legacy_time, legacy = timed(spoken_legacy, segments, args.rounds)
+    streaming_time, streaming = timed(spoken_streaming, segments, args.rounds)
+    one_shot = normalize_for_speech(ANSWER, "fr")
+
+    legacy_text, streaming_text = " ".join(legacy), " ".join(s for s in streaming if s)
+    print(f"{len(segments)} segments, {len(ANSWER)} caractères")
+    print(f"ancien normaliseur   : {legacy_time * 1e6:7.0f} µs par réponse, "
+          f"{len(MARKUP.findall(legacy_text))} symboles prononcés, code lu : {'app.main' in legacy_text}")
+    print(f"normaliseur en flux  : {streaming_time * 1e6:7.0f} µs par réponse, "
+          f"{len(MARKUP.findall(streaming_text))} symboles prononcés, code lu : {'app.main' in streaming_text}")
+    print(f"texte parlé : {streaming_text}")
+    bad_cuts = split_everywhere(ANSWER)
+    print(f"coupures en deux morceaux : {len(ANSWER) - 1 - len(bad_cuts)}/{len(ANSWER) - 1} sans effet, "
+          f"en échec {[ANSWER[max(0, cut - 8):cut + 8] for cut in bad_cuts[:3]]}")
+
+    same_as_one_shot = streaming_text.split() == one_shot.split()
+    if MARKUP.search(streaming_text) or 'app.main' in streaming_text or not same_as_one_shot or bad_cuts:
+        print("❌ Balisage prononcé ou résultat dépendant du découpage en segments")
+        sys.exit(1)
+    print(f"✅ Aucun balisage prononcé, même texte en flux et d'un bloc, {legacy_time / streaming_time:.1f}x plus rapide")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import argparse
+import base64
+import io
+import logging
+import os
+import re
+import sys
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from flask import Flask
+from flask_socketio import SocketIO
+
+from constants import *
+import logs
+import webassistant
+from audio_postprocess import pcm_to_wav
+from metrics import metrics
+from ollama_client import ollama_client
+from response_cache import response_cache
+from routes import process_audio, register_routes
+from sessions import SessionManager
+from webassistant import WebAssistant
+from fake_ollama import FakeOllamaServer
+from bench_postprocess import synthetic_speech
+from bench_sessions import stub_synthesize
+
+STAGES = ("base64_decode", "ffmpeg", "recognition", "ttft", "tts_chunk", "emit")
+SAMPLE = re.compile(r'^[a-z_]+(\{[a-z_]+="[^"]*"(,[a-z_]+="[^"]*")*\})? -?[0-9.e+]+$')
+
+
+class StubRecognizer:
+    def recognize(self, pcm):
+        time.sleep(0.02)
+        return "ok assistant bonjour"
+
+
+def legacy_verbose(audio_bytes, pcm):
+    # Journal de l'ancienne analyse audio, écrit à chaque énoncé
+    print(f"💾 Début d'analyse audio, taille de données: {len(audio_bytes)}")
+    print(f"💾 Audio décodé avec succès, taille: {len(audio_bytes)} octets")
+    print(f"🔍 En-tête fichier audio: {audio_bytes[:16].hex(' ')}")
+    print(f"✅ Conversion réussie: {len(pcm)} octets PCM")
+
+
+def leveled_verbose(audio_bytes, pcm):
+    logs.debug("💾 Début d'analyse audio", taille=len(audio_bytes))
+    if logs.enabled(logging.DEBUG):
+        logs.debug("🔍 Audio décodé", octets=len(audio_bytes), entete=audio_bytes[:16].hex())
+    logs.debug("✅ Conversion réussie", octets_pcm=len(pcm))
+
+
+def per_call(function, rounds, *args):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        function(*args)
+    return (time.perf_counter() - start) / rounds
+
+
+def check_exposition(text):
+    # Chaque ligne est un commentaire ou un échantillon ; buckets cumulés, +Inf égal au total
+    errors = [line for line in text.splitlines() if line and not line.startswith('#') and not SAMPLE.match(line)]
+    buckets = {}
+    for line in text.splitlines():
+        if '_bucket{' in line:
+            series = re.sub(r',?le="[^"]*"', '', line.split(' ')[0])
+            buckets.setdefault(series, []).append(int(line.split(' ')[1]))
+    for series, counts in buckets.items():
+        if counts != sorted(counts):
+            errors.append(f"buckets non cumulés: {series}")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Métriques par étape sur /metrics et coût des journaux désactivés")
+    parser.add_argument("--rounds", type=int, default=20000)
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(tokens_per_second=60, prefill_delay=0.05).start()
+    ollama_client.base_url = server.base_url
+    response_cache.sync_models(ollama_client.list_models())
+    WebAssistant.synthesize_for_turn = lambda self, text, lang=None: stub_synthesize(text, lang)
+    webassistant.create_recognizer = lambda *args, **kwargs: StubRecognizer()
+
+    app = Flask(__name__)
+    socketio = SocketIO(app, async_mode='threading')
+    session_manager = SessionManager(socketio, process_audio)
+    register_routes(app, socketio, session_manager, [DEFAULT_MODEL], DEFAULT_MODEL)
+
+    # Un énoncé complet : data URL base64 -> ffmpeg -> VAD -> reconnaissance -> LLM -> TTS -> émission
+    pcm = synthetic_speech(1.5, INGEST_SAMPLE_RATE)
+    data_url = "data:audio/wav;base64," + base64.b64encode(pcm_to_wav(pcm, INGEST_SAMPLE_RATE)).decode()
+    client = socketio.test_client(app)
+    client.emit('audio_data', data_url)
+    deadline = time.perf_counter() + 30
+    while time.perf_counter() < deadline and not any(e['name'] == 'response_complete' for e in client.get_received()):
+        time.sleep(0.02)
+    exposition = app.test_client().get('/metrics').get_data(as_text=True)
+    client.disconnect()
+    session_manager.shutdown()
+    server.stop()
+
+    for stage in STAGES:
+        count, total = metrics.summary("assistant_stage_seconds", stage=stage)
+        print(f"{stage:<15} {count:3d} observation(s), {total * 1000 / max(count, 1):8.2f} ms en moyenne")
+    rate_count, rate_total = metrics.summary("assistant_llm_tokens_per_second")
+    print(f"tokens/s        {rate_count:3d} observation(s), {rate_total / max(rate_count, 1):8.1f} en moyenne")
+
+    audio_bytes = pcm_to_wav(pcm, INGEST_SAMPLE_RATE)
+    with redirect_stdout(io.StringIO()):
+        legacy = per_call(legacy_verbose, args.rounds, audio_bytes, pcm)
+    logs.configure_logging("INFO")
+    disabled = per_call(leveled_verbose, args.rounds, audio_bytes, pcm)
+    print(f"journal verbeux par énoncé : {legacy * 1e6:.2f} µs en print, {disabled * 1e6:.2f} µs en DEBUG désactivé")
+
+    errors = check_exposition(exposition)
+    missing = [stage for stage in STAGES if f'stage="{stage}"' not in exposition]
+    gauges = [name for name in ("assistant_sessions_active", "assistant_utterance_queue_depth", "assistant_vad_checked_total",
+                                "assistant_vad_recognitions_saved_total") if f"\n{name} " not in exposition]
+    if "# TYPE assistant_vad_checked_total counter" not in exposition:
+        gauges.append("assistant_vad_checked_total (type counter)")
+    if errors or missing or gauges or not rate_count or disabled > legacy:
+        print(f"❌ Exposition invalide ou incomplète: {errors[:3]} étapes manquantes {missing} jauges manquantes {gauges}")
+        sys.exit(1)
+    print(f"✅ /metrics au format Prometheus ({len(exposition.splitlines())} lignes), toutes les étapes mesurées")
+
+
+if __name__ == "__main__":
+    main()
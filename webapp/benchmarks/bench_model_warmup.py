@@ -0,0 +1,76 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from constants import *
+from ollama_client import ollama_client
+from model_manager import ModelManager
+from webassistant import WebAssistant
+from fake_ollama import FakeOllamaServer
+from bench_sessions import RecordingSocketIO, stub_synthesize
+
+OTHER_MODEL = "llama3:8b"
+
+
+def first_turn(manager, model, question):
+    assistant = WebAssistant()
+    assistant.model_manager = manager
+    assistant.response_cache.clear()
+    assistant.tts_pipeline.synthesize = stub_synthesize
+    socketio = RecordingSocketIO()
+    assistant.get_ollama_response(f"ok assistant {question}", socketio, model)
+    assistant.close()
+    return [data for _, _, event, data in socketio.events if event == 'response_complete'][-1]['metrics']
+
+
+def run(load_delay, preload):
+    server = FakeOllamaServer(models=(DEFAULT_MODEL, OTHER_MODEL), tokens_per_second=40, load_delay=load_delay).start()
+    ollama_client.base_url = server.base_url
+    manager = ModelManager(client=ollama_client)
+    manager.refresh()
+    if preload:
+        # Démarrage de l'application : modèle par défaut chargé pendant que le serveur démarre
+        manager.prefetch(DEFAULT_MODEL).result()
+    startup = first_turn(manager, DEFAULT_MODEL, "bonjour")
+    if preload:
+        # change_model : préchargement pendant que l'utilisateur formule sa question
+        manager.prefetch(OTHER_MODEL)
+        time.sleep(load_delay + 0.2)
+    switched = first_turn(manager, OTHER_MODEL, "et maintenant ?")
+    stats = manager.stats()
+    manager.shutdown()
+    server.stop()
+    return startup, switched, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Préchargement des modèles : premier token à froid / à chaud")
+    parser.add_argument("--load-delay", type=float, default=1.5, help="durée simulée de chargement d'un modèle")
+    args = parser.parse_args()
+
+    results = {}
+    for preload in (False, True):
+        results[preload] = run(args.load_delay, preload)
+
+    print(f"chargement simulé d'un modèle : {args.load_delay}s")
+    for preload, (startup, switched, _) in results.items():
+        label = "avec préchargement" if preload else "sans préchargement"
+        print(f"{label:<20} premier tour {startup['time_to_first_token'] * 1000:6.0f} ms ({'chaud' if startup['model_warm'] else 'froid'}), "
+              f"après change_model {switched['time_to_first_token'] * 1000:6.0f} ms ({'chaud' if switched['model_warm'] else 'froid'})")
+    for model, entry in results[True][2]['models'].items():
+        print(f"{model:<12} chargé en {entry['load_time']}s, TTFT froid {entry['ttft_cold']['mean']}, chaud {entry['ttft_warm']['mean']}")
+
+    cold_startup, cold_switch, _ = results[False]
+    warm_startup, warm_switch, _ = results[True]
+    if not (warm_startup['time_to_first_token'] < cold_startup['time_to_first_token'] - args.load_delay / 2
+            and warm_switch['time_to_first_token'] < cold_switch['time_to_first_token'] - args.load_delay / 2):
+        print("❌ Le préchargement ne retire pas le temps de chargement du premier tour")
+        sys.exit(1)
+    print("✅ Temps de chargement retiré du premier tour et du changement de modèle")
+
+
+if __name__ == "__main__":
+    main()
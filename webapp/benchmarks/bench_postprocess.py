@@ -0,0 +1,90 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from constants import *
+from audio_postprocess import AudioClip, FfmpegPostProcessor, NumpyPostProcessor
+
+SAMPLE_RATE = 24000
+
+
+def synthetic_speech(seconds, sample_rate=SAMPLE_RATE):
+    # Signal voisé modulé en amplitude, proche d'une voix de synthèse pour le WSOLA
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    pitch = 140 + 30 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    voice = sum(np.sin(k * phase) / k for k in range(1, 8))
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 3 * t) ** 2
+    return (voice * envelope * 6000).astype(np.int16).tobytes()
+
+
+def encode_mp3(pcm, sample_rate=SAMPLE_RATE):
+    command = ["ffmpeg", "-nostdin", "-loglevel", "error", "-f", "s16le", "-ar", str(sample_rate), "-ac", "1",
+               "-i", "pipe:0", "-f", "mp3", "-b:a", "32k", "pipe:1"]
+    return subprocess.run(command, input=pcm, capture_output=True, check=True).stdout
+
+
+def legacy_process(mp3):
+    # Ancien chemin : deux fichiers temporaires et un os.system par bloc
+    temp_dir = tempfile.gettempdir()
+    file_id = uuid.uuid4().hex
+    temp_file = os.path.join(temp_dir, f"assistant_vocal_{file_id}.mp3")
+    temp_file_fast = os.path.join(temp_dir, f"assistant_vocal_{file_id}_fast.mp3")
+    with open(temp_file, 'wb') as f:
+        f.write(mp3)
+    os.system(f"ffmpeg -y -i {temp_file} -filter:a \"atempo={AUDIO_SPEED_FACTOR}\" -vn {temp_file_fast} > /dev/null 2>&1")
+    with open(temp_file_fast, 'rb') as f:
+        data = f.read()
+    os.remove(temp_file)
+    os.remove(temp_file_fast)
+    return data
+
+
+def measure(name, func, chunks, workers):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(func, range(chunks)))
+    elapsed = time.perf_counter() - start
+    print(f"{name:<24}{chunks / elapsed:>10.1f} chunks/s{elapsed / chunks * 1000:>10.1f} ms/chunk")
+    return chunks / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Débit du post-traitement TTS (accélération x AUDIO_SPEED_FACTOR)")
+    parser.add_argument("--chunks", type=int, default=40)
+    parser.add_argument("--seconds", type=float, default=3.0, help="Durée d'un bloc audio")
+    parser.add_argument("--workers", type=int, default=TTS_MAX_WORKERS)
+    args = parser.parse_args()
+
+    pcm = synthetic_speech(args.seconds)
+    mp3 = encode_mp3(pcm)
+    ffmpeg = FfmpegPostProcessor()
+    numpy_engine = NumpyPostProcessor()
+
+    print(f"{args.chunks} blocs de {args.seconds}s, {args.workers} worker(s), facteur {AUDIO_SPEED_FACTOR}")
+    measure("legacy (fichiers)", lambda _: legacy_process(mp3), args.chunks, args.workers)
+    measure("ffmpeg (pipes, mp3)", lambda _: ffmpeg.process(AudioClip(mp3, 'mp3', None)), args.chunks, args.workers)
+    measure("numpy (PCM -> wav)", lambda _: numpy_engine.process(AudioClip(pcm, 'pcm', SAMPLE_RATE)), args.chunks, args.workers)
+    measure("numpy (mp3 -> mp3)", lambda _: numpy_engine.process(AudioClip(mp3, 'mp3', None)), args.chunks, args.workers)
+
+    # Le bloc accéléré part tel quel vers le client et dans les caches : il reste compressé
+    reference = ffmpeg.process(AudioClip(mp3, 'mp3', None))
+    stretched = numpy_engine.process(AudioClip(mp3, 'mp3', None))
+    print(f"taille d'un bloc     : gTTS {len(mp3)} o, ffmpeg {len(reference.data)} o, numpy {len(stretched.data)} o ({stretched.format})")
+    if stretched.format != 'mp3' or len(stretched.data) > 1.5 * len(reference.data):
+        print("❌ Le moteur numpy ne rend pas un mp3 de taille comparable à ffmpeg")
+        sys.exit(1)
+    print("✅ Bloc accéléré en mp3, de la taille de celui de ffmpeg")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from constants import *
+from ollama_client import ollama_client
+from response_cache import response_cache
+from webassistant import WebAssistant
+from fake_ollama import FakeOllamaServer
+from bench_sessions import RecordingSocketIO, stub_synthesize
+
+
+def ask(server, question, tts_delay):
+    # Nouvelle conversation à chaque fois : même historique, donc même requête exacte
+    socketio = RecordingSocketIO()
+    assistant = WebAssistant()
+    assistant.tts_pipeline.synthesize = lambda text, lang: (time.sleep(tts_delay), stub_synthesize(text, lang))[1]
+    requests_before = len(server.requests)
+    start = time.perf_counter()
+    assistant.get_ollama_response(f"ok assistant {question}", socketio, DEFAULT_MODEL)
+    elapsed = time.perf_counter() - start
+    assistant.close()
+    chunks = [data for _, _, event, data in socketio.events if event == 'response_chunk']
+    complete = [data for _, _, event, data in socketio.events if event == 'response_complete'][-1]
+    return {
+        'elapsed': elapsed,
+        'metrics': complete['metrics'],
+        'texts': [c['text'] for c in chunks if c['text']],
+        'audio': [c['audio'] for c in chunks if c.get('audio')],
+        'ollama_requests': len(server.requests) - requests_before
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cache de réponses : question répétée, rejouée sans génération ni synthèse")
+    parser.add_argument("--tokens-per-second", type=float, default=30)
+    parser.add_argument("--tts-delay", type=float, default=0.3, help="durée d'une synthèse simulée")
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(tokens_per_second=args.tokens_per_second, prefill_delay=0.2).start()
+    ollama_client.base_url = server.base_url
+    response_cache.sync_models(ollama_client.list_models())
+    question = "quelle est la capitale de la France ?"
+
+    miss = ask(server, question, args.tts_delay)
+    hit = ask(server, question, args.tts_delay)
+
+    server.digests[DEFAULT_MODEL] = "sha256:" + "f" * 64
+    response_cache.sync_models(ollama_client.list_models())
+    after_invalidation = ask(server, question, args.tts_delay)
+    server.stop()
+
+    for label, run in (("génération", miss), ("cache", hit), ("après invalidation", after_invalidation)):
+        m = run['metrics']
+        print(f"{label:<20} premier segment {m.get('time_to_first_chunk', 0) * 1000:6.0f} ms, "
+              f"premier audio {m.get('time_to_first_audio', 0) * 1000:6.0f} ms, tour complet {run['elapsed'] * 1000:6.0f} ms, "
+              f"{run['ollama_requests']} requête(s) Ollama")
+    print(response_cache.stats())
+
+    checks = [
+        hit['metrics'].get('cached') is True and hit['ollama_requests'] == 0,
+        hit['texts'] == miss['texts'] and hit['audio'] == miss['audio'],
+        not after_invalidation['metrics'].get('cached') and after_invalidation['ollama_requests'] == 1
+    ]
+    if not all(checks):
+        print(f"❌ Vérifications échouées: {checks}")
+        sys.exit(1)
+    print("✅ Rejeu identique, sans Ollama ni TTS ; invalidé quand le modèle change")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from constants import *
+from audio_postprocess import AudioClip
+from ollama_client import ollama_client
+from sessions import SessionManager
+from fake_ollama import FakeOllamaServer
+
+
+class RecordingSocketIO:
+    def __init__(self):
+        self.events = []
+        self._lock = threading.Lock()
+
+    def emit(self, event, data=None, to=None):
+        with self._lock:
+            self.events.append((time.perf_counter(), to, event, data))
+
+
+def stub_synthesize(text, lang):
+    time.sleep(0.05)
+    return AudioClip(text.encode("utf-8"), 'mp3', None), text
+
+
+def handle_text(session, texts):
+    # L'ordonnanceur peut regrouper plusieurs énoncés en attente en un seul tour
+    text = " ".join(getattr(item, 'text', item) for item in texts)
+    session.assistant.get_ollama_response(f"ok assistant {text}", session.emitter, session.model)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="N sessions simultanées : chacune progresse indépendamment")
+    parser.add_argument("--sessions", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=SESSION_MAX_WORKERS)
+    parser.add_argument("--tokens-per-second", type=float, default=40)
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(tokens_per_second=args.tokens_per_second).start()
+    ollama_client.base_url = server.base_url
+    socketio = RecordingSocketIO()
+    manager = SessionManager(socketio, handle_text, max_workers=args.workers)
+
+    sids = [f"client-{i}" for i in range(args.sessions)]
+    for sid in sids:
+        manager.create(sid).assistant.tts_pipeline.synthesize = stub_synthesize
+
+    start = time.perf_counter()
+    for sid in sids:
+        manager.submit(sid, "Quelle est la capitale de la France ?")
+
+    while True:
+        done = {to for _, to, event, _ in socketio.events if event == 'response_complete'}
+        if len(done) == len(sids) or time.perf_counter() - start > 60:
+            break
+        time.sleep(0.05)
+    manager.shutdown()
+    server.stop()
+
+    first_chunk = {}
+    complete = {}
+    for at, to, event, _ in socketio.events:
+        if event == 'response_chunk':
+            first_chunk.setdefault(to, at - start)
+        elif event == 'response_complete':
+            complete[to] = at - start
+
+    print(f"{'session':<12}{'1er chunk':>12}{'terminé':>12}")
+    for sid in sids:
+        print(f"{sid:<12}{first_chunk.get(sid, float('nan')):>12.3f}{complete.get(sid, float('nan')):>12.3f}")
+
+    foreign = [e for e in socketio.events if e[1] not in sids]
+    concurrent = len(complete) == len(sids) and max(first_chunk.values()) < min(complete.values())
+    print(f"Émissions sans destinataire: {len(foreign)}")
+    print("✅ Les sessions progressent en parallèle" if concurrent else "❌ Les sessions ont été servies l'une après l'autre")
+    sys.exit(0 if concurrent and not foreign else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from constants import *
+from audio_ingest import decode_to_pcm
+from speech_stream import start_utterance
+from speech_recognizers import create_recognizer
+from local_recognizer import LocalRecognizer
+
+
+def recorded_utterance(seconds):
+    # Équivalent d'un enregistrement MediaRecorder : webm/opus à 48 kHz
+    command = ["ffmpeg", "-nostdin", "-loglevel", "error", "-f", "lavfi",
+               "-i", f"sine=frequency=220:duration={seconds}", "-ar", "48000",
+               "-c:a", "libopus", "-f", "webm", "pipe:1"]
+    return subprocess.run(command, capture_output=True, check=True).stdout
+
+
+def split_chunks(data, seconds, chunk_ms=100):
+    count = max(1, int(seconds * 1000 / chunk_ms))
+    size = -(-len(data) // count)
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def batch(data):
+    # Ancien chemin : tout arrive à la fin, décodage puis reconnaissance complets
+    start = time.perf_counter()
+    pcm = decode_to_pcm(data, INGEST_SAMPLE_RATE)
+    texte = create_recognizer("local", "fr-FR").recognize(pcm)
+    return time.perf_counter() - start, texte, 0
+
+
+def streaming(chunks, chunk_delay):
+    partials = []
+    utterance = start_utterance("fr-FR", partials.append, "audio/webm", backend="local", fallbacks=())
+    for seq, chunk in enumerate(chunks):
+        utterance.feed(seq, chunk)
+        time.sleep(chunk_delay)
+    utterance.end(len(chunks))
+    # Seule la finalisation reste après la fin d'énoncé
+    start = time.perf_counter()
+    texte = utterance.finish()
+    return time.perf_counter() - start, texte, len(partials)
+
+
+def lost_chunk(chunks):
+    # Le premier morceau n'arrive jamais : l'attente est bornée puis l'énoncé abandonné, sans attendre la fin
+    utterance = start_utterance("fr-FR", None, "audio/webm", backend="local", fallbacks=())
+    held = 0
+    for seq, chunk in enumerate(chunks[1:], 1):
+        utterance.feed(seq, chunk)
+        held = max(held, len(utterance._out_of_order))
+    utterance.end(len(chunks))
+    start = time.perf_counter()
+    texte = utterance.finish()
+    return utterance.dropped, held, time.perf_counter() - start, texte
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latence de fin d'énoncé : upload complet vs flux incrémental")
+    parser.add_argument("--seconds", type=float, default=4.0)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--recognizer-cost", type=float, default=LocalRecognizer.cost)
+    parser.add_argument("--chunk-delay", type=float, default=0.01, help="pause entre morceaux (0.1 = temps réel)")
+    args = parser.parse_args()
+
+    LocalRecognizer.cost = args.recognizer_cost
+    data = recorded_utterance(args.seconds)
+    chunks = split_chunks(data, args.seconds)
+    print(f"Énoncé de {args.seconds}s, {len(data)} octets en {len(chunks)} morceaux, reconnaissance {args.recognizer_cost * 1000:.0f} ms")
+
+    for label, run in (("upload complet", lambda: batch(data)),
+                       ("flux incrémental", lambda: streaming(chunks, args.chunk_delay))):
+        timings = []
+        for _ in range(args.runs):
+            elapsed, texte, partials = run()
+            timings.append(elapsed)
+        timings.sort()
+        print(f"{label:<20} fin d'énoncé -> texte: {timings[len(timings) // 2] * 1000:7.1f} ms (médiane), "
+              f"{partials} partiel(s), texte: {texte!r}")
+
+    long_chunks = split_chunks(recorded_utterance(STREAM_MAX_PENDING_CHUNKS * 0.2), STREAM_MAX_PENDING_CHUNKS * 0.2)
+    dropped, held, elapsed, texte = lost_chunk(long_chunks)
+    print(f"morceau perdu        {len(long_chunks) - 1} morceaux reçus, au plus {held} en attente, "
+          f"fin en {elapsed * 1000:.1f} ms, texte: {texte!r}")
+    if not dropped or held > STREAM_MAX_PENDING_CHUNKS or texte is not None or elapsed >= STREAM_END_GRACE:
+        print(f"❌ Morceaux hors ordre non bornés (max {STREAM_MAX_PENDING_CHUNKS})")
+        sys.exit(1)
+    print(f"✅ Au plus {STREAM_MAX_PENDING_CHUNKS} morceaux gardés en attente d'un morceau perdu, énoncé abandonné")
+
+
+if __name__ == "__main__":
+    main()
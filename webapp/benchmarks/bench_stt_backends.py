@@ -0,0 +1,101 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from constants import *
+import speech_recognizers
+from speech_recognizers import ENGINE_LOADERS, RECOGNIZERS, create_recognizer, load_engine
+from bench_postprocess import synthetic_speech
+
+
+class SlowRecognizer:
+    # Moteur simulé : coût fixe par appel, résultat configurable (None = rien reconnu)
+    delays = {}
+    results = {}
+    calls = []
+
+    def __init__(self, language="fr-FR", sample_rate=INGEST_SAMPLE_RATE):
+        self.language = language
+        self.sample_rate = sample_rate
+
+    def accept(self, pcm):
+        return None
+
+    def finalize(self, pcm):
+        return self.recognize(pcm)
+
+    def recognize(self, pcm):
+        self.calls.append(self.language)
+        time.sleep(self.delays.get(self.language, 0.0))
+        return self.results.get(self.language)
+
+
+def serial_fallbacks(recognizers, pcm):
+    # Ancien comportement du script : chaque repli attend l'échec du précédent
+    for recognizer in recognizers:
+        texte = recognizer.recognize(pcm)
+        if texte:
+            return texte
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Moteurs de reconnaissance : replis différés, modèle local partagé")
+    parser.add_argument("--delay", type=float, default=0.4, help="durée simulée d'un appel de reconnaissance")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    RECOGNIZERS["slow"] = SlowRecognizer
+    # Le principal et le premier repli ne reconnaissent rien, le dernier repli réussit
+    SlowRecognizer.delays = {"fr-FR": args.delay, "fr-CA": args.delay, "en-US": args.delay}
+    SlowRecognizer.results = {"en-US": "ok assistant bonjour"}
+    pcm = synthetic_speech(1.5, INGEST_SAMPLE_RATE)
+
+    chain = [SlowRecognizer("fr-FR"), SlowRecognizer("fr-CA"), SlowRecognizer("en-US")]
+    start = time.perf_counter()
+    serial = serial_fallbacks(chain, pcm)
+    serial_time = time.perf_counter() - start
+
+    # Principal lent et sans résultat : les replis partent au bout du délai, sans attendre son échec
+    recognizer = create_recognizer("slow", "fr-FR", INGEST_SAMPLE_RATE, ["slow:fr-CA", "slow:en-US"])
+    recognizer.delay = args.delay / 2
+    start = time.perf_counter()
+    hedged = recognizer.recognize(pcm)
+    hedged_time = time.perf_counter() - start
+
+    # Principal rapide qui reconnaît : aucun repli n'est appelé
+    SlowRecognizer.delays["fr-FR"] = 0.0
+    SlowRecognizer.results["fr-FR"] = "ok assistant"
+    SlowRecognizer.calls.clear()
+    quick = recognizer.recognize(pcm)
+    time.sleep(recognizer.delay * 2)
+    quick_calls = list(SlowRecognizer.calls)
+
+    # Modèle local : un seul chargement, quel que soit le nombre de workers qui le demandent
+    loads = []
+    ENGINE_LOADERS["stub"] = lambda lang: (time.sleep(0.2), loads.append(lang), object())[2]
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        engines = list(executor.map(lambda _: load_engine("stub", "fr-FR"), range(args.workers)))
+
+    print(f"replis en série     : {serial_time * 1000:6.0f} ms -> {serial}")
+    print(f"replis différés     : {hedged_time * 1000:6.0f} ms -> {hedged} (partis après {recognizer.delay * 1000:.0f} ms)")
+    print(f"principal reconnu   : appels {quick_calls} -> {quick}")
+    print(f"modèle local demandé par {args.workers} workers : {len(loads)} chargement(s), "
+          f"{len(set(map(id, engines)))} instance(s) partagée(s)")
+    print(f"moteur configuré : {STT_BACKEND}, replis {STT_FALLBACKS}, "
+          f"local disponible : {type(create_recognizer(STT_BACKEND, 'fr-FR', INGEST_SAMPLE_RATE)).__name__}")
+
+    if (serial != hedged or hedged_time > recognizer.delay + args.delay * 1.5 or quick_calls != ["fr-FR"]
+            or len(loads) != 1 or len(set(map(id, engines))) != 1):
+        print("❌ Replis appelés sans raison, trop tardifs, ou modèle chargé plusieurs fois")
+        sys.exit(1)
+    print("✅ Replis seulement sur échec ou retard du principal, modèle local chargé une fois et partagé")
+    speech_recognizers.fallback_executor.shutdown(wait=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from flask import Flask
+from flask_socketio import SocketIO
+
+from constants import *
+from ollama_client import ollama_client
+from response_cache import response_cache
+from routes import process_audio, register_routes
+from sessions import SessionManager
+from webassistant import WebAssistant
+from fake_ollama import FakeOllamaServer
+from bench_sessions import stub_synthesize
+
+synthesized = []
+recognized = []
+
+
+def counting_synthesize(self, text, lang=None):
+    synthesized.append(text)
+    return stub_synthesize(text, lang)
+
+
+def counting_analyze(self, audio_data):
+    recognized.append(len(audio_data))
+    return None
+
+
+def post_chat(client, text, tts):
+    # Réponse lue au fil de l'eau : une ligne JSON par événement
+    start = time.perf_counter()
+    response = client.post('/chat', json={'text': text, 'tts': tts}, buffered=False)
+    first_chunk = None
+    events = []
+    for line in response.response:
+        for raw in line.decode('utf-8').splitlines():
+            event = json.loads(raw)
+            events.append(event)
+            if event['event'] == 'response_chunk' and first_chunk is None:
+                first_chunk = time.perf_counter() - start
+    response.close()
+    return {
+        'status': response.status_code,
+        'elapsed': time.perf_counter() - start,
+        'first_chunk': first_chunk,
+        'events': events,
+        'audio': sum(1 for e in events if e['event'] == 'response_chunk' and e['data'].get('audio'))
+    }
+
+
+def llm_only(text):
+    # Référence : le même tour lu directement chez Ollama, sans pipeline
+    start = time.perf_counter()
+    payload = {"model": DEFAULT_MODEL, "prompt": text, "stream": True}
+    with ollama_client.stream("/api/generate", payload) as stream:
+        for _ in stream:
+            pass
+    return time.perf_counter() - start
+
+
+def socket_turn(socketio, app, text):
+    client = socketio.test_client(app)
+    client.get_received()
+    start = time.perf_counter()
+    client.emit('text_input', {'text': text})
+    received = []
+    while time.perf_counter() - start < 30:
+        received += client.get_received()
+        if any(event['name'] == 'response_complete' for event in received):
+            break
+        time.sleep(0.01)
+    client.disconnect()
+    return time.perf_counter() - start, [event['name'] for event in received]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Message saisi : tour sans décodage ni reconnaissance, synthèse optionnelle")
+    parser.add_argument("--tokens-per-second", type=float, default=40)
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(tokens_per_second=args.tokens_per_second, prefill_delay=0.1).start()
+    ollama_client.base_url = server.base_url
+    response_cache.sync_models(ollama_client.list_models())
+    WebAssistant.synthesize_for_turn = counting_synthesize
+    WebAssistant.analyze_audio = counting_analyze
+
+    app = Flask(__name__)
+    socketio = SocketIO(app, async_mode='threading')
+    session_manager = SessionManager(socketio, process_audio)
+    register_routes(app, socketio, session_manager, [DEFAULT_MODEL], DEFAULT_MODEL)
+    client = app.test_client()
+
+    reference = llm_only("quelle est la capitale de la France ?")
+    text_only = post_chat(client, "quelle est la capitale de la France ?", tts=False)
+    text_synth = len(synthesized)
+    spoken = post_chat(client, "et celle de l'Italie ?", tts=True)
+    rejected = client.post('/chat', json={'text': '  '})
+    socket_time, socket_events = socket_turn(socketio, app, "et celle de l'Espagne ?")
+    session_manager.shutdown()
+    server.stop()
+
+    print(f"LLM seul                    : {reference * 1000:6.0f} ms")
+    print(f"/chat sans synthèse         : {text_only['elapsed'] * 1000:6.0f} ms, premier segment "
+          f"{(text_only['first_chunk'] or 0) * 1000:4.0f} ms, {text_synth} synthèse(s)")
+    print(f"/chat avec synthèse         : {spoken['elapsed'] * 1000:6.0f} ms, {spoken['audio']} bloc(s) audio")
+    print(f"text_input (Socket.IO)      : {socket_time * 1000:6.0f} ms, événements {sorted(set(socket_events))}")
+    print(f"reconnaissances vocales     : {len(recognized)}, message vide -> HTTP {rejected.status_code}")
+
+    completed = [e for e in text_only['events'] if e['event'] == 'response_complete']
+    if (text_synth or recognized or not completed or not spoken['audio'] or rejected.status_code != 400
+            or 'response_complete' not in socket_events or text_only['elapsed'] > reference * 1.5 + 0.1):
+        print("❌ Le texte saisi passe par l'audio, ou la synthèse n'est pas évitée")
+        sys.exit(1)
+    print("✅ Texte saisi : ni décodage ni reconnaissance, sans synthèse le tour ne coûte que le LLM")
+
+
+if __name__ == "__main__":
+    main()
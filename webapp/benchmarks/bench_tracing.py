@@ -0,0 +1,135 @@
+import argparse
+import base64
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from flask import Flask
+from flask_socketio import SocketIO
+
+from constants import *
+import tracing
+import webassistant
+from audio_postprocess import pcm_to_wav
+from ollama_client import ollama_client
+from response_cache import response_cache
+from routes import process_audio, register_routes
+from sessions import SessionManager
+from tracing import tracer
+from webassistant import WebAssistant
+from fake_ollama import FakeOllamaServer
+from bench_postprocess import synthetic_speech
+from bench_sessions import stub_synthesize
+from bench_metrics import StubRecognizer
+
+SPANS = ("turn", "transcribe", "ffmpeg", "recognition", "response", "llm_prefill", "llm_generate", "tts_chunk", "emit")
+
+
+def per_call(rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        with tracing.span("noop"):
+            pass
+    return (time.perf_counter() - start) / rounds
+
+
+def wait_idle(session_manager, timeout=5):
+    # Un énoncé reçu pendant un tour est transcrit à part, hors de la trace du tour suivant
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline and any(s.active for s in list(session_manager.sessions.values())):
+        time.sleep(0.01)
+
+
+def spoken_turn(client, session_manager, data_url):
+    wait_idle(session_manager)
+    client.get_received()
+    start = time.perf_counter()
+    client.emit('audio_data', data_url)
+    received = []
+    while time.perf_counter() - start < 30:
+        received += client.get_received()
+        if any(event['name'] == 'response_complete' for event in received):
+            break
+        time.sleep(0.01)
+    complete = [event['args'][0] for event in received if event['name'] == 'response_complete']
+    return time.perf_counter() - start, (complete[0].get('metrics') or {}) if complete else {}
+
+
+def load_trace(turn_id, timeout=5):
+    # La trace est écrite à la sortie du tour, juste après response_complete
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        for entry in list(tracer.recent):
+            if entry['turn_id'] == turn_id:
+                with open(os.path.join(tracer.directory, entry['file']), encoding='utf-8') as f:
+                    return json.load(f)
+        time.sleep(0.01)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trace d'un tour (Chrome trace JSON) et profil à la demande")
+    parser.add_argument("--rounds", type=int, default=100000)
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(tokens_per_second=60, prefill_delay=0.05).start()
+    ollama_client.base_url = server.base_url
+    response_cache.sync_models(ollama_client.list_models())
+    WebAssistant.synthesize_for_turn = lambda self, text, lang=None: stub_synthesize(text, lang)
+    webassistant.create_recognizer = lambda *args, **kwargs: StubRecognizer()
+    tracer.directory = tempfile.mkdtemp(prefix="traces-")
+    tracer.max_files = 2
+
+    app = Flask(__name__)
+    socketio = SocketIO(app, async_mode='threading')
+    session_manager = SessionManager(socketio, process_audio)
+    register_routes(app, socketio, session_manager, [DEFAULT_MODEL], DEFAULT_MODEL)
+    http = app.test_client()
+
+    pcm = synthetic_speech(1.5, INGEST_SAMPLE_RATE)
+    data_url = "data:audio/wav;base64," + base64.b64encode(pcm_to_wav(pcm, INGEST_SAMPLE_RATE)).decode()
+    client = socketio.test_client(app)
+
+    # Traçage désactivé : coût d'un span, et aucun fichier écrit
+    off_span = per_call(args.rounds)
+    off_time, off_metrics = spoken_turn(client, session_manager, data_url)
+    untraced = not os.listdir(tracer.directory) and 'turn_id' not in off_metrics
+
+    # Traçage activé par HTTP, puis profil demandé par Socket.IO pour le tour suivant
+    http.post('/traces', json={'enabled': True})
+    on_time, traced_metrics = spoken_turn(client, session_manager, data_url)
+    client.emit('profile_next_turn')
+    _, profiled_metrics = spoken_turn(client, session_manager, data_url)
+    traced = load_trace(traced_metrics.get('turn_id'))
+    profiled = load_trace(profiled_metrics.get('turn_id'))
+    # Un tour de plus que max_files : le plus ancien fichier disparaît
+    _, last_metrics = spoken_turn(client, session_manager, data_url)
+    load_trace(last_metrics.get('turn_id'))
+    stats = http.get('/traces').get_json()
+    client.disconnect()
+    session_manager.shutdown()
+    server.stop()
+
+    names = {event['name'] for event in (traced or {}).get('traceEvents', []) if event.get('cat') == 'turn'}
+    samples = [event for event in (profiled or {}).get('traceEvents', []) if event.get('cat') == 'profile']
+    files = sorted(os.listdir(tracer.directory))
+
+    print(f"span sans traçage   : {off_span * 1e9:6.0f} ns par appel")
+    print(f"tour sans traçage   : {off_time * 1000:6.0f} ms, avec traçage {on_time * 1000:6.0f} ms")
+    print(f"spans du tour       : {sorted(names)}")
+    print(f"tour profilé        : {len(samples)} cadre(s) échantillonnés")
+    print(f"répertoire tournant : {len(files)} fichier(s) gardés (max {tracer.max_files}), {len(stats['recent'])} tour(s) tracés")
+
+    missing = [name for name in SPANS if name not in names]
+    if not untraced or missing or not samples or len(files) > tracer.max_files or off_span > 2e-6:
+        print(f"❌ Trace incomplète ou coûteuse à l'arrêt : spans manquants {missing}")
+        sys.exit(1)
+    print("✅ Chaque tour tracé produit un fichier Chrome trace, profil à la demande, coût négligeable à l'arrêt")
+
+
+if __name__ == "__main__":
+    main()
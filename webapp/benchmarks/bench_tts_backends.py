@@ -0,0 +1,131 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from constants import *
+from audio_postprocess import AudioClip
+from tts_backends import EspeakBackend, TtsUnavailable, batch_frames
+from tts_cache import tts_cache
+from webassistant import WebAssistant
+from bench_postprocess import synthetic_speech
+
+SENTENCES = [
+    "Bien sûr, voici la réponse.",
+    "La capitale de la France est Paris, une ville de plus de deux millions d'habitants.",
+    "Elle est traversée par la Seine et compte vingt arrondissements.",
+    "N'hésitez pas si vous avez besoin d'autres précisions sur la ville ou sur son histoire."
+]
+SAMPLE_RATE = 22050
+
+
+def speech_seconds(text, speed):
+    # Durée parlée approximative : 14 caractères par seconde à vitesse normale
+    return len(text) / 14.0 / speed
+
+
+class StubGtts:
+    # Même profil que gTTS : aller-retour réseau, puis le mp3 entier d'un coup
+    name = codec = "stub-gtts"
+    streaming = False
+    native_speed = True
+
+    def __init__(self, latency, realtime_factor):
+        self.latency = latency
+        self.realtime_factor = realtime_factor
+
+    def synthesize(self, text, lang, speed=1.0):
+        time.sleep(self.latency + speech_seconds(text, speed) * self.realtime_factor)
+        return AudioClip(synthetic_speech(speech_seconds(text, speed), SAMPLE_RATE), 'mp3', None)
+
+    def stream(self, text, lang, speed=1.0):
+        yield self.synthesize(text, lang, speed)
+
+
+class StubStreaming:
+    # Moteur local simulé : modèle déjà chargé, PCM produit au fil de la synthèse
+    name = codec = "stub-local"
+    streaming = True
+    native_speed = True
+
+    def __init__(self, realtime_factor):
+        self.realtime_factor = realtime_factor
+
+    def synthesize(self, text, lang, speed=1.0):
+        return AudioClip(b''.join(frame.data for frame in self.stream(text, lang, speed)), 'pcm', SAMPLE_RATE)
+
+    def stream(self, text, lang, speed=1.0):
+        pcm = synthetic_speech(speech_seconds(text, speed), SAMPLE_RATE)
+        step = SAMPLE_RATE // 20 * 2
+
+        def chunks():
+            for start in range(0, len(pcm), step):
+                time.sleep(step / 2 / SAMPLE_RATE * self.realtime_factor)
+                yield pcm[start:start + step]
+        yield from batch_frames(chunks(), SAMPLE_RATE)
+
+
+def run_turn(assistant, backend):
+    assistant.tts_backend = backend
+    assistant.tts_codec = backend.codec
+    first_audio = {}
+    turn_start = time.perf_counter()
+    submitted = {}
+
+    def on_audio(index, text, clip, part=None):
+        if clip:
+            first_audio.setdefault(index, time.perf_counter())
+
+    turn = assistant.tts_pipeline.start_turn(on_audio, "fr")
+    for sentence in SENTENCES:
+        index = turn.submit(sentence)
+        submitted[index] = time.perf_counter()
+        # Phrases livrées par le LLM au fil de la génération
+        time.sleep(0.15)
+    metrics = turn.wait()
+    per_chunk = [first_audio[i] - submitted[i] for i in sorted(first_audio)]
+    return {
+        'time_to_first_audio': first_audio[0] - turn_start,
+        'per_chunk': per_chunk,
+        'total': time.perf_counter() - turn_start,
+        'first_frame': metrics.get('tts_first_frame')
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthèse : gTTS (bouchon réseau) contre moteur local en flux")
+    parser.add_argument("--latency", type=float, default=0.35, help="aller-retour réseau simulé de gTTS")
+    parser.add_argument("--realtime-factor", type=float, default=0.15, help="temps de calcul par seconde d'audio")
+    args = parser.parse_args()
+
+    tts_cache.disk_dir = None
+    assistant = WebAssistant()
+    backends = [("gtts (bouchon)", StubGtts(args.latency, args.realtime_factor)),
+                ("local en flux (bouchon)", StubStreaming(args.realtime_factor))]
+    try:
+        backends.append(("espeak-ng", EspeakBackend()))
+    except TtsUnavailable as e:
+        print(f"espeak-ng non mesuré: {e}")
+
+    results = {}
+    for label, backend in backends:
+        tts_cache.clear()
+        results[label] = run_turn(assistant, backend)
+    assistant.close()
+
+    for label, r in results.items():
+        chunks = ", ".join(f"{t * 1000:.0f}" for t in r['per_chunk'])
+        print(f"{label:<24} premier audio {r['time_to_first_audio'] * 1000:6.0f} ms, "
+              f"par bloc (soumission -> première trame) [{chunks}] ms, tour {r['total'] * 1000:6.0f} ms")
+
+    gtts, local = results["gtts (bouchon)"], results["local en flux (bouchon)"]
+    if not all(l < g for l, g in zip(local['per_chunk'], gtts['per_chunk'])):
+        print("❌ La synthèse en flux ne réduit pas la latence par bloc")
+        sys.exit(1)
+    print("✅ Première trame de chaque bloc avant la fin de sa synthèse")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from constants import *
+from vad import VoiceActivityDetector
+from bench_postprocess import synthetic_speech
+
+SAMPLE_RATE = INGEST_SAMPLE_RATE
+
+
+def noise(seconds, level, rng):
+    return (rng.standard_normal(int(seconds * SAMPLE_RATE)) * level).astype(np.int16).tobytes()
+
+
+def corpus(count, rng):
+    # Mélange d'énoncés réalistes : silence de pièce, souffle/bruit, parole entourée de silence
+    items = []
+    for i in range(count):
+        kind = ("silence", "bruit", "parole")[i % 3]
+        if kind == "silence":
+            pcm = noise(2.0, 30, rng)
+        elif kind == "bruit":
+            pcm = noise(2.0, 400, rng)
+        else:
+            pcm = noise(0.8, 30, rng) + synthetic_speech(1.5, SAMPLE_RATE) + noise(1.0, 30, rng)
+        items.append((kind, pcm))
+    return items
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Porte VAD avant la reconnaissance : appels évités, coût, découpe")
+    parser.add_argument("--utterances", type=int, default=30)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    items = corpus(args.utterances, rng)
+    detector = VoiceActivityDetector(SAMPLE_RATE)
+    audio_seconds = sum(len(pcm) / 2 / SAMPLE_RATE for _, pcm in items)
+
+    # Ancienne porte : seule la taille des données est vérifiée
+    legacy_calls = sum(1 for _, pcm in items if len(pcm) >= 100)
+
+    errors = 0
+    start = time.perf_counter()
+    for kind, pcm in items:
+        speech = detector.gate(pcm, SAMPLE_RATE)
+        if (speech is not None) != (kind == "parole"):
+            errors += 1
+    elapsed = time.perf_counter() - start
+
+    stats = detector.stats()
+    vad_calls = stats['checked'] - stats['recognitions_saved']
+    print(f"{len(items)} énoncés, {audio_seconds:.1f}s d'audio")
+    print(f"appels de reconnaissance : {legacy_calls} sans VAD -> {vad_calls} avec VAD "
+          f"({stats['recognitions_saved']} évités), {errors} erreur(s) de classement")
+    print(f"audio non envoyé à la reconnaissance (écarté ou coupé) : {stats['trimmed_ms'] / 1000:.1f}s")
+    print(f"coût VAD : {elapsed * 1000:.1f} ms au total, {elapsed / audio_seconds * 1e6:.0f} µs par seconde d'audio")
+
+
+if __name__ == "__main__":
+    main()
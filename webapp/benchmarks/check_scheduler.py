@@ -0,0 +1,54 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from constants import *
+from scheduler import Transcript, UtteranceScheduler
+
+
+def main():
+    drops = []
+    scheduler = UtteranceScheduler(capacity=3, max_age=10, coalesce_max=3, priority_capacity=1,
+                                   on_drop=lambda entry, reason: drops.append((entry.item.text, reason)), name="check")
+    failures = []
+
+    def check(label, condition):
+        print(f"{'✅' if condition else '❌'} {label}")
+        if not condition:
+            failures.append(label)
+
+    # Rafale : le plus ancien est écarté, jamais le plus récent
+    for i in range(4):
+        scheduler.put(Transcript(f"énoncé {i}"), received_at=100.0 + i)
+    check("débordement : le plus ancien écarté", drops == [("énoncé 0", "overflow")])
+    batch = scheduler.pop_batch(now=105.0)
+    check("regroupement des énoncés en attente", [e.item.text for e in batch] == ["énoncé 1", "énoncé 2", "énoncé 3"])
+
+    # Énoncé trop vieux au moment d'être servi
+    drops.clear()
+    scheduler.put(Transcript("vieux"), received_at=100.0)
+    scheduler.put(Transcript("frais"), received_at=118.0)
+    batch = scheduler.pop_batch(now=120.0)
+    check("énoncé périmé écarté et signalé", drops == [("vieux", "stale")] and [e.item.text for e in batch] == ["frais"])
+
+    # Une interruption passe devant et rend caducs les énoncés plus anciens
+    drops.clear()
+    scheduler.put(Transcript("question"), received_at=200.0)
+    scheduler.put(Transcript(INTERRUPT_WORDS[DEFAULT_TTS_LANG][0]), priority=True, received_at=201.0)
+    scheduler.put(Transcript("après"), received_at=202.0)
+    first = scheduler.pop_batch(now=203.0)
+    second = scheduler.pop_batch(now=203.0)
+    check("interruption servie seule et en premier", [e.item.text for e in first] == [INTERRUPT_WORDS[DEFAULT_TTS_LANG][0]])
+    check("énoncé antérieur remplacé, postérieur gardé",
+          drops == [("question", "superseded")] and [e.item.text for e in second] == ["après"])
+
+    stats = scheduler.stats()
+    check("chaque abandon est compté", sum(stats['dropped'].values()) == 3)
+    print(stats)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
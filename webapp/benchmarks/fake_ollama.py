@@ -0,0 +1,259 @@
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+DEFAULT_REPLY = (
+    "Bien sûr. Voici une réponse courte et claire à votre question. "
+    "Elle tient en quelques phrases, comme le demande le prompt système. "
+    "N'hésitez pas si vous avez besoin de précisions."
+)
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text or "")
+
+
+def common_prefix(a, b):
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            models = [{"name": name, "digest": self.server.fake.digests.get(name)} for name in self.server.fake.models]
+            self._send_json({"models": models})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        fake = self.server.fake
+
+        if self.path == "/api/chat":
+            tokens = []
+            for message in payload.get("messages", []):
+                tokens += [f"<{message['role']}>"] + tokenize(message.get("content")) + [f"</{message['role']}>"]
+            tokens.append("<assistant>")
+        elif self.path == "/api/generate":
+            tokens = [fake.token_of_id(i) for i in payload.get("context") or []]
+            if not payload.get("context"):
+                tokens += ["<system>"] + tokenize(payload.get("system")) + ["</system>"]
+            tokens += ["<user>"] + tokenize(payload.get("prompt")) + ["</user>", "<assistant>"]
+        else:
+            self._send_json({"error": "not found"}, status=404)
+            return
+
+        model = payload.get("model")
+        if model not in fake.models:
+            self._send_json({"error": f"model '{model}' not found"}, status=404)
+            return
+        fake.load(model)
+        if self.path == "/api/generate" and not payload.get("prompt") and not payload.get("context"):
+            # Requête vide : chargement seul, comme le préchargement d'Ollama
+            self._send_json({"model": model, "done": True, "done_reason": "load"})
+            return
+
+        prompt_eval_count = fake.evaluate(model, tokens)
+        if prompt_eval_count:
+            time.sleep(fake.prefill_delay + prompt_eval_count * fake.prefill_per_token)
+        reply_tokens = fake.reply_for(payload)
+        fake.remember(model, tokens + reply_tokens)
+        fake.record(self.path, model, payload, prompt_eval_count)
+
+        if payload.get("stream", True):
+            self._stream(payload, tokens, reply_tokens, prompt_eval_count)
+        else:
+            text = fake.detokenize(reply_tokens)
+            self._send_json(self._final_chunk(payload, tokens, reply_tokens, prompt_eval_count, text))
+
+    def _final_chunk(self, payload, tokens, reply_tokens, prompt_eval_count, text=""):
+        chunk = {
+            "model": payload.get("model"),
+            "done": True,
+            "prompt_eval_count": prompt_eval_count,
+            "eval_count": len(reply_tokens)
+        }
+        if self.path == "/api/chat":
+            chunk["message"] = {"role": "assistant", "content": text}
+        else:
+            chunk["response"] = text
+            chunk["context"] = [self.server.fake.id_of_token(t) for t in tokens + reply_tokens]
+        return chunk
+
+    def _stream(self, payload, tokens, reply_tokens, prompt_eval_count):
+        fake = self.server.fake
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            previous = None
+            for token in reply_tokens:
+                piece = fake.piece(previous, token)
+                previous = token
+                if self.path == "/api/chat":
+                    chunk = {"message": {"role": "assistant", "content": piece}, "done": False}
+                else:
+                    chunk = {"response": piece, "done": False}
+                self._write_chunk(chunk)
+                if fake.token_interval:
+                    time.sleep(fake.token_interval)
+            self._write_chunk(self._final_chunk(payload, tokens, reply_tokens, prompt_eval_count))
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            fake.cancelled += 1
+
+    def _write_chunk(self, chunk):
+        data = (json.dumps(chunk) + "\n").encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, data, status=200):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeOllamaServer:
+    def __init__(self, host="127.0.0.1", port=0, models=("mistral:7b",), tokens_per_second=0,
+                 prefill_delay=0.0, prefill_per_token=0.0, reply=DEFAULT_REPLY, load_delay=0.0):
+        self.models = list(models)
+        # Changer un digest simule un modèle re-téléchargé sous le même nom
+        self.digests = {name: f"sha256:{i:064x}" for i, name in enumerate(self.models)}
+        self.token_interval = 1.0 / tokens_per_second if tokens_per_second else 0
+        self.prefill_delay = prefill_delay
+        self.prefill_per_token = prefill_per_token
+        # Chargement d'un modèle en mémoire, payé par la première requête qui le vise
+        self.load_delay = load_delay
+        self.loaded = set()
+        self._load_lock = threading.Lock()
+        self.loads = 0
+        self.reply = reply
+        self.requests = []
+        self.cancelled = 0
+        self._lock = threading.Lock()
+        self._kv_cache = {}
+        self._vocab = {}
+        self._tokens = []
+        self.httpd = ThreadingHTTPServer((host, port), FakeOllamaHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.handle_error = lambda request, client_address: None
+        self.httpd.fake = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def id_of_token(self, token):
+        with self._lock:
+            if token not in self._vocab:
+                self._vocab[token] = len(self._tokens)
+                self._tokens.append(token)
+            return self._vocab[token]
+
+    def token_of_id(self, token_id):
+        return self._tokens[token_id] if 0 <= token_id < len(self._tokens) else "<unk>"
+
+    def load(self, model):
+        # Les requêtes qui arrivent pendant un chargement l'attendent, comme avec Ollama
+        with self._load_lock:
+            if model in self.loaded:
+                return
+            time.sleep(self.load_delay)
+            self.loaded.add(model)
+            self.loads += 1
+
+    def evaluate(self, model, tokens):
+        # Simule le cache KV d'Ollama : seul le suffixe différent est réévalué
+        with self._lock:
+            cached = self._kv_cache.get(model, [])
+        return len(tokens) - common_prefix(tokens, cached)
+
+    def remember(self, model, tokens):
+        with self._lock:
+            self._kv_cache[model] = tokens
+
+    def record(self, path, model, payload, prompt_eval_count):
+        with self._lock:
+            self.requests.append({
+                "path": path,
+                "model": model,
+                "keep_alive": payload.get("keep_alive"),
+                "prompt_eval_count": prompt_eval_count
+            })
+
+    def reply_for(self, payload):
+        return tokenize(self.reply)
+
+    @staticmethod
+    def piece(previous, token):
+        if previous is None or not token[0].isalnum():
+            return token
+        return " " + token
+
+    def detokenize(self, tokens):
+        text = ""
+        previous = None
+        for token in tokens:
+            text += self.piece(previous, token)
+            previous = token
+        return text
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Faux serveur Ollama pour les benchmarks")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--model", action="append", default=None)
+    parser.add_argument("--tokens-per-second", type=float, default=30)
+    parser.add_argument("--prefill-delay", type=float, default=0.2)
+    parser.add_argument("--prefill-per-token", type=float, default=0.0005)
+    parser.add_argument("--load-delay", type=float, default=2.0)
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(
+        host="0.0.0.0",
+        port=args.port,
+        models=args.model or ["mistral:7b"],
+        tokens_per_second=args.tokens_per_second,
+        prefill_delay=args.prefill_delay,
+        prefill_per_token=args.prefill_per_token,
+        load_delay=args.load_delay
+    )
+    print(f"🤖 Faux Ollama sur {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import argparse
+import itertools
+import os
+import runpy
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+WEBAPP_DIR = os.path.join(BENCH_DIR, "..")
+sys.path.insert(0, WEBAPP_DIR)
+
+# Chaque module copie les constantes à son import (from constants import *) : elles sont
+# remplacées ici, avant que app.py n'importe quoi que ce soit
+import constants
+
+
+class StubRecognizer:
+    # Reconnaissance au coût fixe ; chaque énoncé donne une question différente pour que
+    # le cache de réponses ne court-circuite pas le LLM
+    latency = 0.0
+    _counter = itertools.count(1)
+
+    def __init__(self, language="fr-FR", sample_rate=constants.INGEST_SAMPLE_RATE):
+        self.language = language
+        self.sample_rate = sample_rate
+
+    def recognize(self, pcm):
+        time.sleep(self.latency)
+        return f"ok assistant question numéro {next(self._counter)}"
+
+
+class StubTts:
+    # Synthèse au coût fixe renvoyant un mp3 réel : décodage et accélération restent mesurés
+    name = codec = "stub-tts"
+    streaming = False
+    native_speed = False
+    latency = 0.0
+    mp3 = b""
+
+    def synthesize(self, text, lang, speed=1.0):
+        from audio_postprocess import AudioClip
+
+        time.sleep(self.latency)
+        return AudioClip(self.mp3, 'mp3', None)
+
+    def stream(self, text, lang, speed=1.0):
+        yield self.synthesize(text, lang, speed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lance le vrai webapp/app.py avec STT/TTS simulés et un Ollama au choix")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--ollama-url", default=constants.OLLAMA_BASE_URL)
+    parser.add_argument("--mode", choices=["threading", "asyncio"], default=constants.SERVER_MODE)
+    parser.add_argument("--stt-latency", type=float, default=0.1, help="Durée d'une reconnaissance simulée (s)")
+    parser.add_argument("--tts-latency", type=float, default=0.15, help="Durée d'une synthèse simulée par bloc (s)")
+    parser.add_argument("--workers", type=int, default=constants.SESSION_MAX_WORKERS, help="Sessions servies en parallèle")
+    parser.add_argument("--keep-caches", action="store_true", help="Garde les caches de réponses et de synthèse")
+    args = parser.parse_args()
+
+    constants.OLLAMA_BASE_URL = args.ollama_url.rstrip('/')
+    constants.OLLAMA_URL = f"{constants.OLLAMA_BASE_URL}/api/generate"
+    constants.SERVER_MODE = args.mode
+    constants.SERVER_HOST = "127.0.0.1"
+    constants.SERVER_PORT = args.port
+    constants.SERVER_DEBUG = False
+    constants.SSL_CERT_PATH = constants.SSL_KEY_PATH = ""
+    constants.SESSION_MAX_WORKERS = args.workers
+    constants.STT_BACKEND = "stub"
+    constants.STT_FALLBACKS = []
+    constants.TTS_BACKEND = "stub"
+    constants.TTS_CACHE_PREWARM = False
+    constants.LOG_LEVEL = "WARNING"
+    if not args.keep_caches:
+        constants.RESPONSE_CACHE_ENABLED = False
+        constants.TTS_CACHE_MAX_BYTES = 0
+        constants.TTS_CACHE_DIR = None
+
+    import speech_recognizers
+    import tts_backends
+
+    StubRecognizer.latency = args.stt_latency
+    StubTts.latency = args.tts_latency
+    with open(os.path.join(BENCH_DIR, "fixtures", "reply.mp3"), 'rb') as f:
+        StubTts.mp3 = f.read()
+    speech_recognizers.RECOGNIZERS["stub"] = StubRecognizer
+    tts_backends.TTS_BACKENDS["stub"] = StubTts
+
+    print(f"🧪 app.py sur le port {args.port} ({args.mode}), Ollama {constants.OLLAMA_BASE_URL}, "
+          f"STT {args.stt_latency * 1000:.0f} ms, TTS {args.tts_latency * 1000:.0f} ms/bloc", flush=True)
+    sys.argv = [os.path.join(WEBAPP_DIR, "app.py")]
+    runpy.run_path(sys.argv[0], run_name="__main__")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+import argparse
+import asyncio
+import base64
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import socketio
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE = os.path.join(BENCH_DIR, "fixtures", "utterance.webm")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values, p):
+    # Rang le plus proche, sans interpolation : p99 de 50 tours = le pire
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def rss_mb(pid, field="VmRSS"):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def wait_http(url, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def start_stack(args):
+    # Faux Ollama et vrai app.py, chacun dans son processus comme en production
+    ollama_port = free_port()
+    port = free_port()
+    ollama = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, "fake_ollama.py"), "--port", str(ollama_port),
+                               "--tokens-per-second", str(args.tokens_per_second), "--prefill-delay", str(args.prefill_delay),
+                               "--load-delay", "0"], stdout=subprocess.DEVNULL)
+    if not wait_http(f"http://127.0.0.1:{ollama_port}/api/tags", 10):
+        ollama.kill()
+        raise RuntimeError("le faux Ollama n'a pas démarré")
+    server = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, "load_server.py"), "--port", str(port),
+                               "--ollama-url", f"http://127.0.0.1:{ollama_port}", "--mode", args.mode,
+                               "--stt-latency", str(args.stt_latency), "--tts-latency", str(args.tts_latency),
+                               "--workers", str(args.workers)],
+                              stdout=None if args.verbose else subprocess.DEVNULL,
+                              stderr=None if args.verbose else subprocess.DEVNULL)
+    if not wait_http(f"http://127.0.0.1:{port}/models", 60):
+        server.kill()
+        ollama.kill()
+        raise RuntimeError("app.py n'a pas démarré (relancer avec --verbose)")
+    return f"http://127.0.0.1:{port}", server, [server, ollama]
+
+
+class SimulatedSpeaker:
+    # Un client Socket.IO : envoie un énoncé, lit les response_chunk, attend response_complete
+    def __init__(self, url, name, payload, text_mode, turns, think, timeout):
+        self.url = url
+        self.name = name
+        self.payload = payload
+        self.text_mode = text_mode
+        self.turns = turns
+        self.think = think
+        self.timeout = timeout
+        self.results = []
+        self.errors = []
+        self.client = socketio.AsyncClient(reconnection=False)
+        self._turn = None
+        self.client.on('response_chunk', self.on_chunk)
+        self.client.on('response_complete', self.on_complete)
+        self.client.on('error', self.on_error)
+
+    async def on_chunk(self, data):
+        turn = self._turn
+        if turn is None:
+            return
+        now = time.perf_counter()
+        turn.setdefault('first_chunk', now - turn['start'])
+        if data.get('format') or data.get('audio'):
+            turn.setdefault('first_audio', now - turn['start'])
+            turn['audio_chunks'] = turn.get('audio_chunks', 0) + 1
+
+    async def on_complete(self, data):
+        if self._turn is not None:
+            self._turn['done'].set()
+
+    async def on_error(self, data):
+        self.errors.append((data or {}).get('message', 'error'))
+        if self._turn is not None:
+            self._turn['done'].set()
+
+    async def run(self, start_delay):
+        await asyncio.sleep(start_delay)
+        try:
+            await self.client.connect(self.url, auth={'binaryAudio': True}, wait_timeout=10)
+        except Exception as e:
+            self.errors.append(f"connexion: {e}")
+            return
+        try:
+            for _ in range(self.turns):
+                await self.turn()
+                await asyncio.sleep(self.think)
+        finally:
+            await self.client.disconnect()
+
+    async def turn(self):
+        self._turn = turn = {'start': time.perf_counter(), 'done': asyncio.Event()}
+        if self.text_mode:
+            await self.client.emit('text_input', {'text': self.payload})
+        else:
+            await self.client.emit('audio_data', self.payload)
+        try:
+            await asyncio.wait_for(turn['done'].wait(), self.timeout)
+            turn['elapsed'] = time.perf_counter() - turn['start']
+        except asyncio.TimeoutError:
+            self.errors.append("délai dépassé")
+        self._turn = None
+        if 'elapsed' in turn and 'first_audio' in turn:
+            self.results.append({k: v for k, v in turn.items() if k not in ('start', 'done')})
+
+
+async def run_load(args, url, server_pid):
+    if args.text:
+        payload = args.text
+    else:
+        with open(FIXTURE, 'rb') as f:
+            payload = "data:audio/webm;codecs=opus;base64," + base64.b64encode(f.read()).decode()
+    speakers = [SimulatedSpeaker(url, f"client-{i}", payload, bool(args.text), args.turns, args.think, args.timeout)
+                for i in range(args.clients)]
+
+    memory = []
+    stop = asyncio.Event()
+
+    async def sample_memory():
+        while not stop.is_set():
+            if server_pid:
+                memory.append(rss_mb(server_pid))
+            await asyncio.sleep(0.2)
+
+    sampler = asyncio.create_task(sample_memory())
+    start = time.perf_counter()
+    await asyncio.gather(*(speaker.run(i * args.ramp / max(args.clients, 1)) for i, speaker in enumerate(speakers)))
+    wall = time.perf_counter() - start
+    stop.set()
+    await sampler
+    return speakers, wall, [m for m in memory if m is not None]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Charge de bout en bout : N clients Socket.IO contre le vrai app.py")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--turns", type=int, default=5, help="Tours par client")
+    parser.add_argument("--think", type=float, default=0.5, help="Pause entre deux tours d'un client (s)")
+    parser.add_argument("--ramp", type=float, default=2.0, help="Étalement des connexions (s)")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--text", help="Envoie ce texte par text_input au lieu d'un énoncé audio")
+    parser.add_argument("--mode", choices=["threading", "asyncio"], default="threading")
+    parser.add_argument("--workers", type=int, default=4, help="SESSION_MAX_WORKERS du serveur")
+    parser.add_argument("--tokens-per-second", type=float, default=30)
+    parser.add_argument("--prefill-delay", type=float, default=0.2)
+    parser.add_argument("--stt-latency", type=float, default=0.1)
+    parser.add_argument("--tts-latency", type=float, default=0.15)
+    parser.add_argument("--url", help="Serveur déjà lancé (load_server.py) : rien n'est démarré")
+    parser.add_argument("--server-pid", type=int, help="PID du serveur visé par --url, pour sa mémoire")
+    parser.add_argument("--json", help="Fichier où écrire le rapport")
+    parser.add_argument("--verbose", action="store_true", help="Affiche la sortie du serveur")
+    args = parser.parse_args()
+
+    processes = []
+    if args.url:
+        url, server_pid = args.url, args.server_pid
+    else:
+        url, server, processes = start_stack(args)
+        server_pid = server.pid
+    try:
+        baseline_mb = rss_mb(server_pid) if server_pid else None
+        speakers, wall, memory = asyncio.run(run_load(args, url, server_pid))
+        peak_mb = rss_mb(server_pid, "VmHWM") if server_pid else None
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    results = [result for speaker in speakers for result in speaker.results]
+    errors = [error for speaker in speakers for error in speaker.errors]
+    ttfa = [r['first_audio'] for r in results]
+    latency = [r['elapsed'] for r in results]
+    expected = args.clients * args.turns
+    report = {
+        'clients': args.clients,
+        'turns_expected': expected,
+        'turns_completed': len(results),
+        'errors': len(errors),
+        'wall_seconds': round(wall, 3),
+        'throughput_turns_per_second': round(len(results) / wall, 3) if wall else None,
+        'ttfa_seconds': {f'p{p}': round(percentile(ttfa, p), 3) if ttfa else None for p in (50, 95, 99)},
+        'turn_seconds': {f'p{p}': round(percentile(latency, p), 3) if latency else None for p in (50, 95, 99)},
+        'server_rss_mb': {
+            'start': round(baseline_mb, 1) if baseline_mb else None,
+            'max_sampled': round(max(memory), 1) if memory else None,
+            'peak': round(peak_mb, 1) if peak_mb else None
+        }
+    }
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print(f"{args.clients} client(s) x {args.turns} tour(s), mode {args.mode}, {args.workers} worker(s) de session")
+    print(f"tours réussis        : {len(results)}/{expected}, {len(errors)} erreur(s) {sorted(set(errors))[:3]}")
+    print(f"débit                : {report['throughput_turns_per_second']} tour(s)/s sur {wall:.1f} s")
+    print(f"premier audio (TTFA) : p50 {report['ttfa_seconds']['p50']} s, p95 {report['ttfa_seconds']['p95']} s, "
+          f"p99 {report['ttfa_seconds']['p99']} s")
+    print(f"tour complet         : p50 {report['turn_seconds']['p50']} s, p95 {report['turn_seconds']['p95']} s")
+    memory_report = report['server_rss_mb']
+    print(f"mémoire serveur      : {memory_report['start']} Mo au départ, pic {memory_report['peak']} Mo")
+
+    if len(results) < expected or errors:
+        print("❌ Des tours ont échoué ou dépassé le délai : l'instance est saturée à cette charge")
+        sys.exit(1)
+    print(f"✅ {args.clients} locuteur(s) simultané(s) servis, TTFA p95 {report['ttfa_seconds']['p95']} s")
+
+
+if __name__ == "__main__":
+    main()
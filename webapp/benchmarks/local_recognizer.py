@@ -0,0 +1,44 @@
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from constants import *
+from speech_recognizers import RECOGNIZERS
+
+
+class LocalRecognizer:
+    # Remplaçant local du moteur de reconnaissance : pas de réseau, un coût fixe par
+    # appel et un partiel par seconde d'audio reçue, pour mesurer le pipeline seul
+    transcript = "ok assistant quelle est la capitale de la France"
+    cost = 0.05
+
+    def __init__(self, language="fr-FR", sample_rate=INGEST_SAMPLE_RATE):
+        self.language = language
+        self.sample_rate = sample_rate
+        self._samples = 0
+        self.partials = 0
+
+    def accept(self, pcm):
+        seconds_before = self._samples // self.sample_rate
+        self._samples += len(pcm) // 2
+        seconds = self._samples // self.sample_rate
+        if seconds > seconds_before:
+            self.partials += 1
+            words = self.transcript.split()
+            return ' '.join(words[:min(len(words), seconds * 2)])
+        return None
+
+    def finalize(self, pcm):
+        return self.recognize(pcm)
+
+    def recognize(self, pcm):
+        time.sleep(self.cost)
+        samples = np.frombuffer(pcm, dtype=np.int16)
+        return self.transcript if len(samples) else None
+
+
+RECOGNIZERS["local"] = LocalRecognizer
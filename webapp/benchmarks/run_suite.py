@@ -0,0 +1,269 @@
+import argparse
+import base64
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from constants import *
+import webassistant
+from audio_postprocess import AudioClip
+from conversation import ConversationEngine
+from scheduler import Transcript
+from sessions import SessionManager
+from speech_text import SpeechNormalizer, normalize_for_speech
+from tts_cache import TtsCache
+from webassistant import WebAssistant
+from bench_conversation import QUESTIONS
+from bench_markdown import ANSWER, stream_segments
+from bench_postprocess import synthetic_speech
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(BENCH_DIR, "fixtures")
+BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+
+# Énoncé tel qu'envoyé par le MediaRecorder du navigateur, et bloc renvoyé par gTTS
+FIXTURES = {
+    "utterance.webm": (2.0, 48000, ["-c:a", "libopus", "-b:a", "32k", "-f", "webm"]),
+    "reply.mp3": (3.0, 24000, ["-c:a", "libmp3lame", "-b:a", "32k", "-f", "mp3"])
+}
+
+
+def make_fixtures():
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    for name, (seconds, sample_rate, output_args) in FIXTURES.items():
+        command = ["ffmpeg", "-nostdin", "-loglevel", "error", "-y", "-f", "s16le", "-ar", str(sample_rate), "-ac", "1",
+                   "-i", "pipe:0", *output_args, os.path.join(FIXTURES_DIR, name)]
+        subprocess.run(command, input=synthetic_speech(seconds, sample_rate), check=True)
+        print(f"📦 Fixture écrite: {name}")
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), 'rb') as f:
+        return f.read()
+
+
+class StubRecognizer:
+    # Reconnaissance hors périmètre : seul le chemin décodage -> ffmpeg -> VAD est mesuré
+    def recognize(self, pcm):
+        return "ok assistant bonjour"
+
+
+class StubGtts:
+    # Même sortie que gTTS (un mp3 entier), sans réseau
+    name = codec = "stub-gtts"
+    streaming = False
+    native_speed = False
+
+    def __init__(self, mp3):
+        self.mp3 = mp3
+
+    def synthesize(self, text, lang, speed=1.0):
+        return AudioClip(self.mp3, 'mp3', None)
+
+
+def case_speech_text():
+    normalizer_segments = stream_segments(ANSWER)
+
+    def streamed():
+        normalizer = SpeechNormalizer("fr")
+        for segment in normalizer_segments:
+            normalizer.feed(segment)
+        normalizer.flush()
+    return {
+        "speech_text.normalize": lambda: normalize_for_speech(ANSWER, "fr"),
+        "speech_text.stream": streamed
+    }
+
+
+def case_ingest():
+    data_url = "data:audio/webm;codecs=opus;base64," + base64.b64encode(fixture("utterance.webm")).decode()
+    webassistant.create_recognizer = lambda *args, **kwargs: StubRecognizer()
+    assistant = WebAssistant()
+
+    def analyze():
+        if assistant.analyze_audio(data_url) is None:
+            raise RuntimeError("analyze_audio n'a rien reconnu sur la fixture")
+    return {
+        "ingest.base64_decode": lambda: base64.b64decode(data_url.partition(',')[2]),
+        "ingest.analyze_audio": analyze
+    }
+
+
+def case_tts():
+    assistant = WebAssistant()
+    assistant.tts_backend = StubGtts(fixture("reply.mp3"))
+    assistant.tts_codec = assistant.tts_backend.codec
+    # Cache vide et sans disque : chaque appel synthétise et post-traite réellement
+    assistant.tts_cache = TtsCache(max_bytes=0, disk_dir=None)
+
+    def convert():
+        audio, _ = assistant._convert_text_to_speech("Voici **la réponse** à votre question.", "fr")
+        if audio is None:
+            raise RuntimeError("post-traitement TTS en échec")
+    return {"tts.convert_text_to_speech": convert}
+
+
+def case_history():
+    answer = normalize_for_speech(ANSWER, "fr")
+    contents = []
+    for question in QUESTIONS:
+        contents += [question, answer]
+    engines = {}
+    for mode in ("chat", "context"):
+        engine = ConversationEngine(mode=mode, token_budget=10 ** 6)
+        engine.history = contents
+        engines[mode] = engine
+    return {
+        "history.build_request_chat": lambda: engines["chat"].build_request(DEFAULT_MODEL, "fr", QUESTIONS[0]),
+        "history.build_request_context": lambda: engines["context"].build_request(DEFAULT_MODEL, "fr", QUESTIONS[0])
+    }
+
+
+def case_dispatch():
+    # Énoncé soumis -> file de la session -> worker -> gestionnaire, 20 allers-retours par mesure ;
+    # des transcriptions, pour ne mesurer que l'ordonnancement
+    handled = threading.Semaphore(0)
+    manager = SessionManager(None, lambda session, items: [handled.release() for _ in items])
+    manager.create("bench")
+    rounds = 20
+
+    def dispatch():
+        for i in range(rounds):
+            manager.submit("bench", Transcript(f"énoncé {i}", typed=True))
+            if not handled.acquire(timeout=5):
+                raise RuntimeError("énoncé perdu par la file de la session")
+    return {"dispatch.process_queue_20": dispatch}
+
+
+CASES = {
+    "speech_text": case_speech_text,
+    "ingest": case_ingest,
+    "tts": case_tts,
+    "history": case_history,
+    "dispatch": case_dispatch
+}
+
+# Réglages propres à un banc, prioritaires sur --tolerance et --min-rounds. L'aller-retour par
+# la file de session dépend du réveil d'un thread : sa médiane varie de x1.0 à x1.5 d'un
+# lancement à l'autre sur la même machine, sans changement de code
+CASE_SETTINGS = {
+    "dispatch.process_queue_20": {"tolerance": 0.75, "min_rounds": 200}
+}
+
+
+def calls_per_round(function, round_time=0.001):
+    # Un banc de quelques µs est répété dans chaque mesure jusqu'à ~1 ms : le bruit de l'horloge
+    # et de l'ordonnanceur ne pèse plus sur la médiane
+    number = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(number):
+            function()
+        if time.perf_counter() - t0 >= round_time or number >= 10 ** 6:
+            return number
+        number *= 10
+
+
+def measure(function, min_time, min_rounds):
+    number = calls_per_round(function)
+    durations = []
+    start = time.perf_counter()
+    while len(durations) < min_rounds or time.perf_counter() - start < min_time:
+        t0 = time.perf_counter()
+        for _ in range(number):
+            function()
+        durations.append((time.perf_counter() - t0) / number)
+    durations.sort()
+    return {
+        "rounds": len(durations),
+        "calls_per_round": number,
+        "median_ms": round(statistics.median(durations) * 1000, 4),
+        "p95_ms": round(durations[int(0.95 * (len(durations) - 1))] * 1000, 4),
+        "mean_ms": round(statistics.fmean(durations) * 1000, 4)
+    }
+
+
+def compare(results, baseline, tolerance):
+    # Régression : médiane au-delà de la référence de plus de la tolérance du banc
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if not reference:
+            print(f"{name:<34} {result['median_ms']:>10.3f} ms   (pas de référence)")
+            continue
+        allowed = CASE_SETTINGS.get(name, {}).get("tolerance", tolerance)
+        ratio = result['median_ms'] / reference['median_ms']
+        flag = "❌" if ratio > 1 + allowed else ("🚀" if ratio < 1 - allowed else "  ")
+        print(f"{name:<34} {result['median_ms']:>10.3f} ms   réf {reference['median_ms']:>10.3f} ms   "
+              f"x{ratio:5.2f} (max x{1 + allowed:.2f}) {flag}")
+        if ratio > 1 + allowed:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-bancs des étapes du pipeline, comparés à une référence enregistrée")
+    parser.add_argument("--only", nargs="*", choices=sorted(CASES), help="Groupes à mesurer (tous par défaut)")
+    parser.add_argument("--min-time", type=float, default=1.0, help="Durée minimale de mesure par banc (s)")
+    parser.add_argument("--min-rounds", type=int, default=10)
+    parser.add_argument("--output", help="Fichier JSON où écrire les résultats")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Enregistre ces résultats comme nouvelle référence")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Ralentissement toléré sur la médiane (0.25 = +25 %%)")
+    parser.add_argument("--make-fixtures", action="store_true", help="Régénère les fixtures audio avec ffmpeg")
+    args = parser.parse_args()
+
+    if args.make_fixtures or not all(os.path.exists(os.path.join(FIXTURES_DIR, name)) for name in FIXTURES):
+        make_fixtures()
+
+    results = {}
+    for group in args.only or CASES:
+        for name, function in CASES[group]().items():
+            min_rounds = max(args.min_rounds, CASE_SETTINGS.get(name, {}).get("min_rounds", 0))
+            results[name] = measure(function, args.min_time, min_rounds)
+
+    report = {
+        "meta": {
+            "date": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "python": platform.python_version(),
+            "machine": f"{platform.system()} {platform.machine()}",
+            "cpus": os.cpu_count()
+        },
+        "results": results
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            saved = json.load(f)
+        baseline = saved.get("results", {})
+        cpus = saved.get("meta", {}).get("cpus")
+        if cpus != os.cpu_count():
+            # Une référence prise sur une autre machine ne vaut que pour des écarts grossiers
+            print(f"⚠️ Référence mesurée sur {cpus} CPU, cette machine en a {os.cpu_count()} : "
+                  f"relancer avec --save-baseline pour une référence locale")
+    regressions = compare(results, baseline, args.tolerance)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"💾 Référence enregistrée: {args.baseline}")
+    elif regressions:
+        print(f"❌ {len(regressions)} régression(s) au-delà de la tolérance: {', '.join(regressions)}")
+        sys.exit(1)
+    print(f"✅ {len(results)} banc(s) mesurés, aucune régression au-delà de +{args.tolerance:.0%} (ou de la tolérance du banc)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import threading
+import time
+
+import logs
+
+
+class CancelledTurn(Exception):
+    pass
+
+
+class CancelToken:
+    # Partagé par toutes les étapes d'un tour (flux Ollama, synthèses, émissions) :
+    # un seul cancel() les arrête toutes, depuis n'importe quel thread
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self.reason = None
+        self.origin_at = None
+        self.cancelled_at = None
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self, reason="interrupt", origin_at=None):
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.reason = reason
+            self.cancelled_at = time.perf_counter()
+            # Instant de fin de l'énoncé qui a provoqué l'annulation, pour mesurer la réactivité
+            self.origin_at = origin_at or self.cancelled_at
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logs.warning("⚠️ Erreur lors de l'annulation", erreur=e)
+        return True
+
+    def add_callback(self, callback):
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise CancelledTurn(self.reason)
+
+    def wait(self, timeout=None):
+        return self._event.wait(timeout)
@@ -1,5 +1,17 @@
-OLLAMA_URL = "http://localhost:11434/api/generate"
-OLLAMA_TAGS_URL = "http://localhost:11434/api/tags"
+OLLAMA_BASE_URL = "http://localhost:11434"
+OLLAMA_URL = f"{OLLAMA_BASE_URL}/api/generate"
+OLLAMA_TAGS_URL = f"{OLLAMA_BASE_URL}/api/tags"
+OLLAMA_POOL_SIZE = 8
+OLLAMA_CONNECT_TIMEOUT = 5
+OLLAMA_READ_TIMEOUT = 120
+OLLAMA_KEEPALIVE_TIMEOUT = 60
+# Durée pendant laquelle Ollama garde le modèle (et son cache KV) en mémoire
+OLLAMA_KEEP_ALIVE = "30m"
+# Modèle par défaut chargé dès le démarrage, catalogue (/api/tags) relu toutes les MODEL_CATALOG_TTL
+# secondes, et derniers temps jusqu'au premier token conservés par modèle (à froid / à chaud)
+MODEL_PRELOAD = True
+MODEL_CATALOG_TTL = 300
+MODEL_TTFT_SAMPLES = 50
 
 DEFAULT_MODEL = "mistral:7b"
 DEFAULT_TTS_LANG = "fr"
@@ -36,13 +48,17 @@ ERROR_MESSAGES = {
         "not_understood": "Je n'ai pas compris ce que vous avez dit",
         "model_communication": "Désolé, j'ai rencontré une erreur de communication avec le modèle.",
         "model_access": "Désolé, je ne peux pas accéder au modèle pour le moment.",
-        "language_not_supported": "Langue non prise en charge"
+        "language_not_supported": "Langue non prise en charge",
+        "server_busy": "Trop de messages en attente, veuillez patienter",
+        "empty_message": "Message vide"
     },
     "en": {
         "not_understood": "I didn't understand what you said",
         "model_communication": "Sorry, I encountered an error communicating with the model.",
         "model_access": "Sorry, I cannot access the model at the moment.",
-        "language_not_supported": "Language not supported"
+        "language_not_supported": "Language not supported",
+        "server_busy": "Too many pending messages, please wait",
+        "empty_message": "Empty message"
     }
 }
 
@@ -50,12 +66,16 @@ RESPONSE_MESSAGES = {
     "fr": {
         "goodbye": "Au revoir! À bientôt.",
         "language_changed": "Langue changée pour le français",
-        "response_cancelled": "Génération de réponse arrêtée"
+        "response_cancelled": "Génération de réponse arrêtée",
+        "profile_next_turn": "Le prochain tour sera profilé",
+        "utterance_dropped": "Un message vocal n'a pas pu être traité, merci de le répéter"
     },
     "en": {
         "goodbye": "Goodbye! See you soon.",
         "language_changed": "Language changed to English",
-        "response_cancelled": "Response generation stopped"
+        "response_cancelled": "Response generation stopped",
+        "profile_next_turn": "The next turn will be profiled",
+        "utterance_dropped": "A voice message could not be processed, please repeat it"
     }
 }
 
@@ -66,4 +86,145 @@ OLLAMA_OPTIONS = {
     "top_p": 0.9
 }
 
-AUDIO_SPEED_FACTOR = 1.5
\ No newline at end of file
+AUDIO_SPEED_FACTOR = 1.5
+# Moteur de synthèse vocale, partagé par l'application web et le script en ligne de commande :
+# "piper" (voix ONNX locales), "espeak" (espeak-ng local) ou "gtts" (réseau, mp3 complet par bloc).
+# Les moteurs locaux produisent le PCM au fil de la synthèse, envoyé par trames de TTS_STREAM_FRAME_MS ;
+# un moteur absent (paquet, binaire ou voix manquants) est remplacé par gTTS au démarrage
+TTS_BACKEND = "piper"
+TTS_VOICES = {
+    "espeak": {"fr": "fr", "en": "en-us"},
+    # Relatives à webapp/, avec leur .onnx.json à côté (https://github.com/rhasspy/piper/blob/master/VOICES.md)
+    "piper": {"fr": "models/piper/fr_FR-siwis-medium.onnx", "en": "models/piper/en_US-lessac-medium.onnx"}
+}
+ESPEAK_BASE_RATE = 175
+TTS_STREAM_FRAME_MS = 250
+# Accélération de l'audio synthétisé : "numpy" (WSOLA en processus ; le mp3 est décodé puis réencodé
+# par des ffmpeg persistants, réutilisés d'un bloc à l'autre) ou "ffmpeg" (un processus par bloc)
+AUDIO_POSTPROCESS_ENGINE = "numpy"
+# Décodeur mp3 persistant : le démultiplexeur de ffmpeg lit par paquets de 1024 octets, chaque bloc
+# est donc suivi d'au moins autant de trames muettes pour le vider. Au-delà du délai, le processus
+# est relancé et le bloc passe par ffmpeg à la demande
+MP3_DECODER_FLUSH_BYTES = 1024
+MP3_DECODER_TIMEOUT = 5
+# Encodeur mp3 persistant : retard de LAME en échantillons, et silence écrit après chaque bloc pour
+# vider le démultiplexeur PCM (paquets de 40 ms) et l'anticipation de l'encodeur (~130 ms mesurés)
+MP3_ENCODER_DELAY = 576
+MP3_ENCODER_FLUSH_MS = 250
+# Décodeurs et encodeurs libres gardés par format ; un bloc n'en trouvant aucun en lance un de plus
+MP3_POOL_MAX_IDLE = 4
+
+# Cache de l'audio synthétisé, indexé par (texte normalisé, langue, vitesse, codec) :
+# LRU en mémoire borné en octets, plus un niveau disque écrit en tâche de fond (relatif à webapp/,
+# None pour le désactiver)
+TTS_CACHE_MAX_BYTES = 32 * 1024 * 1024
+TTS_CACHE_DIR = "cache/tts"
+# Budget du niveau disque : au-delà, les fichiers les moins récemment utilisés (mtime) sont supprimés
+TTS_CACHE_DISK_MAX_BYTES = 256 * 1024 * 1024
+TTS_CACHE_PREWARM = True
+
+# Cache des réponses du LLM (température 0 : même requête, même réponse), indexé par la requête
+# exacte envoyée à Ollama ; un succès rejoue texte et audio enregistrés, accélérés de
+# RESPONSE_CACHE_REPLAY_SPEED avec des pauses bornées à RESPONSE_CACHE_MAX_GAP secondes
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_MAX_BYTES = 16 * 1024 * 1024
+RESPONSE_CACHE_REPLAY_SPEED = 2.0
+RESPONSE_CACHE_MAX_GAP = 0.3
+
+# Audio en pièces jointes binaires Socket.IO pour les clients qui l'annoncent (sinon base64)
+AUDIO_BINARY_TRANSPORT = True
+
+# Décodage des uploads : PCM 16 bits mono à cette fréquence, directement en mémoire
+INGEST_SAMPLE_RATE = 16000
+INGEST_TIMEOUT = 30
+
+# Moteur de reconnaissance vocale, partagé par l'application web et le script en ligne de commande :
+# "vosk" (local, en flux avec partiels), "whisper" (local, faster-whisper) ou "google" (réseau).
+# Un moteur local absent (paquet ou modèle manquant) est remplacé par Google au démarrage
+STT_BACKEND = "vosk"
+# Moteurs de repli ("nom" ou "nom:langue"), lancés seulement si le principal ne reconnaît rien ou
+# n'a pas répondu après STT_FALLBACK_DELAY secondes ; liste vide pour une reconnaissance hors ligne
+STT_FALLBACKS = ["google"]
+STT_FALLBACK_DELAY = 1.5
+STT_WORKERS = 2
+# Modèles locaux, relatifs à webapp/ (https://alphacephei.com/vosk/models)
+VOSK_MODEL_PATHS = {
+    "fr": "models/vosk-model-small-fr-0.22",
+    "en": "models/vosk-model-small-en-us-0.15"
+}
+WHISPER_MODEL = "small"
+WHISPER_COMPUTE_TYPE = "int8"
+# Détection d'activité vocale sur le PCM décodé (énergie RMS en unités int16 + passages par zéro) :
+# les énoncés sans parole ne vont pas à la reconnaissance, les silences de bord sont coupés
+VAD_FRAME_MS = 20
+VAD_ENERGY_THRESHOLD = 200
+VAD_ZCR_MAX = 0.35
+VAD_HANGOVER_MS = 200
+VAD_MIN_SPEECH_MS = 200
+VAD_PADDING_MS = 100
+# Attente maximale des derniers morceaux d'un énoncé en flux arrivés après l'événement de fin
+STREAM_END_GRACE = 2.0
+# Morceaux gardés en attente d'un morceau manquant (100 ms chacun côté navigateur), et écart de numéro
+# accepté : au-delà, le trou ne se comblera plus et l'énoncé est abandonné
+STREAM_MAX_PENDING_CHUNKS = 50
+
+# "chat" : /api/chat avec messages, "context" : /api/generate en réutilisant le contexte renvoyé
+CONVERSATION_MODE = "chat"
+# Budget (en tokens estimés) de l'historique envoyé au modèle ; au-delà, les plus anciens
+# échanges sont évincés jusqu'à HISTORY_TRIM_RATIO du budget puis résumés en arrière-plan
+HISTORY_TOKEN_BUDGET = 1500
+HISTORY_TRIM_RATIO = 0.6
+HISTORY_SUMMARY_MAX_TOKENS = 150
+
+# Nombre de blocs synthétisés en parallèle pendant la génération
+TTS_MAX_WORKERS = 2
+
+# Nombre de sessions (clients Socket.IO) servies simultanément
+SESSION_MAX_WORKERS = 4
+
+# "threading" : Flask-SocketIO en threads, "asyncio" : python-socketio + aiohttp
+SERVER_MODE = "threading"
+
+# Écoute du serveur ; sans certificat lisible, le serveur démarre en HTTP simple
+SERVER_HOST = "0.0.0.0"
+SERVER_PORT = 5000
+SERVER_DEBUG = True
+SSL_CERT_PATH = "/home/arezkisaba/git/voice-assistant-sample/webapp/certs/192.168.1.100+3.pem"
+SSL_KEY_PATH = "/home/arezkisaba/git/voice-assistant-sample/webapp/certs/192.168.1.100+3-key.pem"
+
+# Files bornées : énoncés en attente par session, segments en attente de synthèse/émission
+AUDIO_QUEUE_SIZE = 4
+# Ordonnanceur d'énoncés : voie prioritaire des interruptions, regroupement des énoncés en attente
+# en un seul tour, et abandon (compté, signalé) des énoncés plus vieux que UTTERANCE_MAX_AGE secondes
+PRIORITY_QUEUE_SIZE = 2
+COALESCE_MAX_UTTERANCES = 3
+UTTERANCE_MAX_AGE = 20
+PIPELINE_QUEUE_SIZE = 4
+INGEST_MAX_WORKERS = 4
+# Analyse des énoncés reçus pendant une réponse (détection d'interruption), en parallèle du tour
+INTERRUPT_MAX_WORKERS = 2
+
+# Découpage du flux du LLM en segments envoyés au TTS ("sentence" ou "newline")
+TEXT_SEGMENTER = "sentence"
+SEGMENT_MIN_CHARS = 40
+SEGMENT_MAX_CHARS = 250
+SEGMENT_FIRST_MIN_CHARS = 12
+SEGMENT_FIRST_MAX_CHARS = 80
+
+# Journalisation : "DEBUG" pour le détail de chaque énoncé (tailles, en-têtes audio), "INFO" pour
+# un résumé par tour, "WARNING" en production ; les messages sous le niveau ne coûtent rien
+LOG_LEVEL = "INFO"
+LOG_FORMAT = "%(asctime)s %(levelname)s %(message)s"
+
+# Histogrammes exposés sur /metrics : bornes (secondes) des durées d'étape et (tokens/s) du débit LLM
+METRICS_STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_RATE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 250)
+
+# Traces par tour au format Chrome trace-event (chrome://tracing, Perfetto), écrites dans
+# TRACE_DIR en gardant les TRACE_MAX_FILES plus récentes. Le profileur par échantillonnage
+# n'est lancé qu'à la demande, pour un tour (événement profile_next_turn ou POST /traces)
+TRACE_ENABLED = False
+TRACE_DIR = "traces"
+TRACE_MAX_FILES = 50
+TRACE_PROFILE_INTERVAL = 0.005
+TRACE_PROFILE_MAX_SAMPLES = 20000
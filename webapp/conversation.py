@@ -0,0 +1,100 @@
+from constants import *
+from history import HistoryManager
+from ollama_client import ollama_client
+
+
+class ConversationEngine:
+    def __init__(self, client=ollama_client, mode=CONVERSATION_MODE, token_budget=HISTORY_TOKEN_BUDGET):
+        self.client = client
+        self.mode = mode
+        self.memory = HistoryManager(token_budget=token_budget)
+        # Contexte (tokens) renvoyé par /api/generate, valable pour un modèle et une langue
+        self.context = None
+        self.context_key = None
+
+    @property
+    def history(self):
+        return self.memory.contents()
+
+    @history.setter
+    def history(self, contents):
+        self.memory.reset(contents)
+        self.context = None
+        self.context_key = None
+
+    def reset(self):
+        self.history = []
+
+    def close(self):
+        self.memory.close()
+
+    def build_request(self, model, lang, user_prompt):
+        system_prompt = SYSTEM_PROMPTS.get(lang, SYSTEM_PROMPTS["fr"])
+
+        if self.mode == "chat":
+            messages = [{"role": "system", "content": system_prompt}]
+            summary = self.memory.summary_text(lang)
+            if summary:
+                messages.append({"role": "system", "content": summary})
+            messages.extend(self.memory.messages())
+            messages.append({"role": "user", "content": user_prompt})
+            return "/api/chat", {
+                "model": model,
+                "messages": messages,
+                "options": OLLAMA_OPTIONS,
+                "keep_alive": OLLAMA_KEEP_ALIVE
+            }
+
+        payload = {
+            "model": model,
+            "options": OLLAMA_OPTIONS,
+            "keep_alive": OLLAMA_KEEP_ALIVE
+        }
+        if self.context and self.context_key == (model, lang):
+            # Le contexte contient déjà le prompt système et l'historique
+            payload["prompt"] = user_prompt
+            payload["context"] = self.context
+        else:
+            payload["prompt"] = self._flat_prompt(lang, user_prompt)
+            payload["system"] = system_prompt
+        return "/api/generate", payload
+
+    def _flat_prompt(self, lang, user_prompt):
+        summary = self.memory.summary_text(lang)
+        context_messages = [summary] if summary else []
+        for i, msg in enumerate(self.history):
+            speaker = 'Assistant' if i % 2 else 'Utilisateur'
+            context_messages.append(f"{speaker} [{lang}]: {msg}")
+        context = "\n".join(context_messages)
+        return f"{context}\nUtilisateur [{lang}]: {user_prompt}\nAssistant [{lang}]:"
+
+    def stream(self, model, lang, user_prompt):
+        path, payload = self.build_request(model, lang, user_prompt)
+        return self.client.stream(path, payload)
+
+    @staticmethod
+    def chunk_text(chunk_data):
+        if 'message' in chunk_data:
+            return chunk_data['message'].get('content', '')
+        return chunk_data.get('response', '')
+
+    def commit_turn(self, model, lang, user_prompt, response, final_chunk=None):
+        trimmed = self.memory.add_turn(user_prompt, response)
+
+        if trimmed:
+            # Le contexte contient les messages évincés : on repart du résumé
+            self.context = None
+            self.context_key = None
+        elif final_chunk and final_chunk.get('context'):
+            self.context = final_chunk['context']
+            self.context_key = (model, lang)
+
+        metrics = {'history_tokens': self.memory.total_tokens}
+        if final_chunk:
+            metrics['prompt_eval_count'] = final_chunk.get('prompt_eval_count')
+            metrics['eval_count'] = final_chunk.get('eval_count')
+        return metrics
+
+    def schedule_summary(self, model, lang):
+        # Appelé après response_complete : le résumé ne retarde jamais la réponse
+        return self.memory.schedule_summary(self.client, model, lang)
@@ -0,0 +1,130 @@
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from constants import *
+import logs
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+SUMMARY_PROMPTS = {
+    "fr": "Résume en quelques phrases les échanges suivants entre un utilisateur et un assistant, "
+          "en conservant les faits et préférences utiles pour la suite. Réponds uniquement par le résumé.",
+    "en": "Summarize in a few sentences the following exchanges between a user and an assistant, "
+          "keeping the facts and preferences useful for the rest of the conversation. Answer with the summary only."
+}
+
+SUMMARY_HEADERS = {
+    "fr": "Résumé de la conversation précédente :",
+    "en": "Summary of the previous conversation:"
+}
+
+
+def count_tokens(text):
+    # Estimation suffisante pour un budget : mots et ponctuation, sans dépendre du tokenizer du modèle
+    return len(TOKEN_PATTERN.findall(text or ""))
+
+
+class HistoryManager:
+    def __init__(self, token_budget=HISTORY_TOKEN_BUDGET, trim_ratio=HISTORY_TRIM_RATIO):
+        self.token_budget = token_budget
+        self.trim_ratio = trim_ratio
+        self.entries = []
+        self.summary = ""
+        self.summary_tokens = 0
+        self.pending = []
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summary")
+
+    @property
+    def total_tokens(self):
+        return self.summary_tokens + sum(tokens for _, _, tokens in self.entries)
+
+    def contents(self):
+        with self._lock:
+            return [content for _, content, _ in self.entries]
+
+    def messages(self):
+        with self._lock:
+            return [{"role": role, "content": content} for role, content, _ in self.entries]
+
+    def summary_text(self, lang):
+        with self._lock:
+            if not self.summary:
+                return ""
+            return f"{SUMMARY_HEADERS.get(lang, SUMMARY_HEADERS['fr'])} {self.summary}"
+
+    def reset(self, contents=()):
+        with self._lock:
+            self._generation += 1
+            self.entries = []
+            self.summary = ""
+            self.summary_tokens = 0
+            self.pending = []
+            for i, content in enumerate(contents):
+                self.entries.append(("assistant" if i % 2 else "user", content, count_tokens(content)))
+
+    def add_turn(self, user_prompt, response):
+        with self._lock:
+            self.entries.append(("user", user_prompt, count_tokens(user_prompt)))
+            self.entries.append(("assistant", response, count_tokens(response)))
+            return self._trim()
+
+    def _trim(self):
+        if self.total_tokens <= self.token_budget:
+            return False
+        # Éviction par blocs jusqu'à une fraction du budget : le préfixe reste stable
+        # plusieurs tours, ce qui préserve le cache KV d'Ollama
+        target = self.token_budget * self.trim_ratio
+        while len(self.entries) > 2 and self.total_tokens > target:
+            self.pending.extend(self.entries[:2])
+            self.entries = self.entries[2:]
+        return True
+
+    def schedule_summary(self, client, model, lang):
+        with self._lock:
+            if not self.pending:
+                return None
+        return self._executor.submit(self._summarize, client, model, lang)
+
+    def _summarize(self, client, model, lang):
+        with self._lock:
+            evicted, self.pending = self.pending, []
+            previous_summary = self.summary
+            generation = self._generation
+        if not evicted:
+            return
+
+        transcript = "\n".join(f"{role}: {content}" for role, content, _ in evicted)
+        if previous_summary:
+            transcript = f"{SUMMARY_HEADERS.get(lang, SUMMARY_HEADERS['fr'])} {previous_summary}\n{transcript}"
+
+        try:
+            response = client.post("/api/chat", {
+                "model": model,
+                "messages": [
+                    {"role": "system", "content": SUMMARY_PROMPTS.get(lang, SUMMARY_PROMPTS["fr"])},
+                    {"role": "user", "content": transcript}
+                ],
+                "options": {**OLLAMA_OPTIONS, "num_predict": HISTORY_SUMMARY_MAX_TOKENS},
+                "keep_alive": OLLAMA_KEEP_ALIVE
+            })
+            summary = response.get("message", {}).get("content", "").strip()
+        except Exception as e:
+            logs.warning("⚠️ Erreur lors du résumé de l'historique", erreur=e)
+            with self._lock:
+                if generation == self._generation:
+                    self.pending = evicted + self.pending
+            return
+
+        with self._lock:
+            # La conversation a été réinitialisée pendant le résumé
+            if generation != self._generation:
+                return
+            self.summary = summary
+            self.summary_tokens = count_tokens(summary)
+        logs.info("📝 Historique résumé", messages=len(evicted), tokens=self.summary_tokens)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
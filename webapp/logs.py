@@ -0,0 +1,52 @@
+import logging
+
+from constants import *
+
+log = logging.getLogger("assistant")
+
+
+class FieldsFormatter(logging.Formatter):
+    # Message lisible suivi de champs clé=valeur, faciles à filtrer : "✅ Texte reconnu moteur=vosk"
+    def format(self, record):
+        message = super().format(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            message += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return message
+
+
+def configure_logging(level=LOG_LEVEL):
+    handler = logging.StreamHandler()
+    handler.setFormatter(FieldsFormatter(LOG_FORMAT))
+    log.handlers[:] = [handler]
+    log.setLevel(level)
+    log.propagate = False
+
+
+def enabled(level):
+    # Pour un calcul coûteux (en-tête hexadécimal, dump) fait seulement si le message sera écrit
+    return log.isEnabledFor(level)
+
+
+def debug(message, **fields):
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug(message, extra={'fields': fields})
+
+
+def info(message, **fields):
+    if log.isEnabledFor(logging.INFO):
+        log.info(message, extra={'fields': fields})
+
+
+def warning(message, **fields):
+    if log.isEnabledFor(logging.WARNING):
+        log.warning(message, extra={'fields': fields})
+
+
+def error(message, exc_info=False, **fields):
+    # exc_info : pile de l'exception en cours, à la place de l'ancien « Stack trace »
+    if log.isEnabledFor(logging.ERROR):
+        log.error(message, exc_info=exc_info, extra={'fields': fields})
+
+
+configure_logging()
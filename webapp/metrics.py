@@ -0,0 +1,142 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from constants import *
+import tracing
+
+
+class Histogram:
+    # Compteurs par borne (non cumulés ici, cumulés au rendu), somme et nombre d'observations
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def format_labels(labels, extra=None):
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # nom -> (aide, bornes, {étiquettes: Histogram})
+        self._histograms = {}
+        # nom -> (aide, fonction lue au moment de la collecte, type Prometheus)
+        self._gauges = {}
+
+    def histogram(self, name, help_text, buckets):
+        with self._lock:
+            self._histograms.setdefault(name, (help_text, tuple(buckets), {}))
+
+    def gauge(self, name, help_text, read, kind="gauge"):
+        with self._lock:
+            self._gauges[name] = (help_text, read, kind)
+
+    def counter(self, name, help_text, read):
+        # Total croissant tenu par son module, lu comme une jauge au moment de la collecte
+        self.gauge(name, help_text, read, kind="counter")
+
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            _, buckets, series = self._histograms[name]
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def stage(self, stage, seconds):
+        self.observe("assistant_stage_seconds", seconds, stage=stage)
+
+    @contextmanager
+    def timed(self, stage):
+        # Histogramme de l'étape, et span dans la trace du tour s'il est tracé
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.stage(stage, end - start)
+            tracing.record(stage, start, end)
+
+    def summary(self, name, **labels):
+        # (nombre, somme) d'une série : pour les bancs d'essai et les journaux
+        with self._lock:
+            histogram = self._histograms[name][2].get(tuple(sorted(labels.items())))
+            return (histogram.count, histogram.sum) if histogram else (0, 0.0)
+
+    def render(self):
+        # Format texte Prometheus (exposition 0.0.4)
+        lines = []
+        with self._lock:
+            histograms = [(name, help_text, buckets, dict(series)) for name, (help_text, buckets, series) in self._histograms.items()]
+            gauges = list(self._gauges.items())
+            for name, help_text, buckets, series in histograms:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(buckets + ('+Inf',), histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{format_labels(labels, ('le', bound))} {cumulative}")
+                    lines.append(f"{name}_sum{format_labels(labels)} {format_value(histogram.sum)}")
+                    lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+        for name, (help_text, read, kind) in gauges:
+            try:
+                value = read()
+            except Exception:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def tokens_per_second(final_chunk, decode_seconds=None):
+    # Débit de génération : mesuré par Ollama (eval_duration, en ns) ou, à défaut, côté client
+    eval_count = (final_chunk or {}).get('eval_count')
+    if not eval_count:
+        return None
+    eval_duration = final_chunk.get('eval_duration')
+    if eval_duration:
+        return eval_count / (eval_duration / 1e9)
+    if decode_seconds and decode_seconds > 0:
+        return eval_count / decode_seconds
+    return None
+
+
+def record_turn(turn_metrics, final_chunk, elapsed):
+    # Fin d'un tour généré : temps jusqu'au premier token et débit, ajouté aux métriques du tour
+    ttft = turn_metrics.get('time_to_first_token')
+    if ttft is None:
+        return
+    metrics.stage("ttft", ttft)
+    # Préremplissage (requête -> premier token) puis génération, dans la trace du tour
+    now = time.perf_counter()
+    tracing.record("llm_prefill", now - elapsed, now - elapsed + ttft)
+    tracing.record("llm_generate", now - elapsed + ttft, now, tokens=(final_chunk or {}).get('eval_count'))
+    rate = tokens_per_second(final_chunk, elapsed - ttft)
+    if rate:
+        turn_metrics['tokens_per_second'] = round(rate, 1)
+        metrics.observe("assistant_llm_tokens_per_second", rate)
+
+
+metrics = Metrics()
+metrics.histogram("assistant_stage_seconds", "Durée de chaque étape du pipeline vocal", METRICS_STAGE_BUCKETS)
+metrics.histogram("assistant_llm_tokens_per_second", "Débit de génération du LLM par tour", METRICS_RATE_BUCKETS)
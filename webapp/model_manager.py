@@ -0,0 +1,156 @@
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from constants import *
+import logs
+from ollama_client import ollama_client
+from response_cache import response_cache
+
+KEEP_ALIVE_UNITS = {'': 1, 's': 1, 'm': 60, 'h': 3600}
+
+
+def keep_alive_seconds(value):
+    # Même syntaxe qu'Ollama : "30m", "1h", un nombre de secondes, ou négatif pour ne jamais décharger
+    match = re.fullmatch(r'\s*(-?\d+(?:\.\d+)?)\s*([smh]?)\s*', str(value))
+    if not match:
+        return 300.0
+    seconds = float(match.group(1)) * KEEP_ALIVE_UNITS[match.group(2)]
+    return float('inf') if seconds < 0 else seconds
+
+
+def model_names(models):
+    available_models_ref = {}
+    for model in models:
+        model_name = model.get("name")
+        if ':' in model_name:
+            available_models_ref[model_name] = model_name
+        else:
+            model_tag = model.get("tag")
+            full_model_name = f"{model_name}:{model_tag}" if model_tag != "latest" else model_name
+            available_models_ref[full_model_name] = full_model_name
+    return available_models_ref
+
+
+class ModelManager:
+    # Catalogue rafraîchi en arrière-plan, modèles préchargés (requête vide + keep_alive)
+    # et temps jusqu'au premier token séparé selon que le modèle était déjà chargé ou non
+    def __init__(self, client=ollama_client, catalog_ttl=MODEL_CATALOG_TTL, keep_alive=OLLAMA_KEEP_ALIVE):
+        self.client = client
+        self.catalog_ttl = catalog_ttl
+        self.keep_alive = keep_alive
+        self.keep_alive_seconds = keep_alive_seconds(keep_alive)
+        # Modifié sur place : les routes gardent la même référence d'un rafraîchissement à l'autre
+        self.models = {}
+        self.refreshed_at = None
+        self._lock = threading.Lock()
+        self._last_used = {}
+        self._load_times = {}
+        self._loading = {}
+        self._ttft = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-preload")
+
+    def refresh(self):
+        models = self.client.list_models()
+        response_cache.sync_models(models)
+        names = model_names(models)
+        with self._lock:
+            self.models.clear()
+            self.models.update(names)
+            self.refreshed_at = time.time()
+        return self.models
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._refresh_loop, name="model-catalog", daemon=True)
+            self._thread.start()
+        return self
+
+    def _refresh_loop(self):
+        while not self._stop.wait(self.catalog_ttl):
+            try:
+                before = set(self.models)
+                after = set(self.refresh())
+                if before != after:
+                    logs.info("📚 Catalogue Ollama mis à jour", modeles=len(after))
+            except Exception as e:
+                logs.warning("⚠️ Rafraîchissement du catalogue Ollama impossible", erreur=e)
+
+    def is_warm(self, model):
+        with self._lock:
+            last_used = self._last_used.get(model)
+        return last_used is not None and time.monotonic() - last_used < self.keep_alive_seconds
+
+    def touch(self, model):
+        # Chaque requête repousse le déchargement du modèle par Ollama
+        with self._lock:
+            self._last_used[model] = time.monotonic()
+
+    def preload(self, model):
+        start = time.perf_counter()
+        # Requête sans prompt : Ollama charge le modèle en mémoire et l'y garde keep_alive
+        self.client.post("/api/generate", {"model": model, "keep_alive": self.keep_alive})
+        load_time = time.perf_counter() - start
+        with self._lock:
+            self._load_times[model] = round(load_time, 3)
+        self.touch(model)
+        logs.info("🔥 Modèle préchargé", modele=model, duree=round(load_time, 2))
+        return load_time
+
+    def prefetch(self, model):
+        # Non bloquant, une seule requête de préchargement en vol par modèle
+        with self._lock:
+            future = self._loading.get(model)
+            if future is not None and not future.done():
+                return future
+            future = self._executor.submit(self._prefetch, model)
+            self._loading[model] = future
+        return future
+
+    def _prefetch(self, model):
+        try:
+            # Le catalogue est relu au passage : un modèle re-téléchargé invalide ses réponses en cache
+            self.refresh()
+            if self.is_warm(model):
+                return 0.0
+            return self.preload(model)
+        except Exception as e:
+            logs.warning("⚠️ Préchargement du modèle impossible", modele=model, erreur=e)
+            return None
+
+    def record_ttft(self, model, warm, ttft):
+        if ttft is None:
+            return
+        with self._lock:
+            samples = self._ttft.setdefault(model, {'cold': [], 'warm': []})['warm' if warm else 'cold']
+            samples.append(ttft)
+            del samples[:-MODEL_TTFT_SAMPLES]
+
+    def stats(self):
+        with self._lock:
+            models = sorted(set(self.models) | set(self._ttft) | set(self._load_times))
+            ttft = {model: {state: list(values) for state, values in samples.items()} for model, samples in self._ttft.items()}
+            load_times = dict(self._load_times)
+            refreshed_at = self.refreshed_at
+        result = {}
+        for model in models:
+            entry = {'warm': self.is_warm(model), 'load_time': load_times.get(model)}
+            for state in ('cold', 'warm'):
+                samples = ttft.get(model, {}).get(state, [])
+                entry[f'ttft_{state}'] = {
+                    'count': len(samples),
+                    'mean': round(sum(samples) / len(samples), 3) if samples else None,
+                    'last': samples[-1] if samples else None
+                }
+            result[model] = entry
+        return {'refreshed_at': refreshed_at, 'catalog_ttl': self.catalog_ttl, 'models': result}
+
+    def shutdown(self):
+        self._stop.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+model_manager = ModelManager()
@@ -0,0 +1,157 @@
+import asyncio
+import json
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from constants import *
+import logs
+
+
+class OllamaError(Exception):
+    def __init__(self, status_code, message=""):
+        super().__init__(f"Ollama a répondu {status_code}: {message}")
+        self.status_code = status_code
+
+
+class OllamaStream:
+    def __init__(self, response):
+        self.response = response
+        self.closed = False
+        self.done = False
+
+    def __iter__(self):
+        try:
+            for line in self.response.iter_lines():
+                if self.closed:
+                    break
+                if not line:
+                    continue
+                try:
+                    chunk = json.loads(line)
+                except json.JSONDecodeError:
+                    logs.warning("⚠️ Ligne JSON illisible dans le flux Ollama", ligne=line[:200])
+                    continue
+                if chunk.get('done'):
+                    self.done = True
+                yield chunk
+        finally:
+            self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self.done:
+            # Réponse terminée : lire la fin du corps rend la connexion au pool
+            try:
+                for _ in self.response.iter_content(chunk_size=1024):
+                    pass
+            except Exception:
+                pass
+        # Sinon, fermer la réponse coupe la connexion : Ollama arrête alors la génération
+        self.response.close()
+
+    def abort(self):
+        # Appelable depuis un autre thread : débloque la lecture en cours et coupe la génération
+        self.closed = True
+        try:
+            self.response.close()
+        except Exception:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class OllamaClient:
+    def __init__(self, base_url=OLLAMA_BASE_URL, pool_size=OLLAMA_POOL_SIZE,
+                 connect_timeout=OLLAMA_CONNECT_TIMEOUT, read_timeout=OLLAMA_READ_TIMEOUT):
+        self.base_url = base_url.rstrip('/')
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._async_sessions = {}
+
+    def _url(self, path):
+        return f"{self.base_url}{path}"
+
+    def list_models(self):
+        response = self.session.get(self._url("/api/tags"), timeout=self.timeout)
+        if response.status_code != 200:
+            raise OllamaError(response.status_code, response.text)
+        return response.json().get("models", [])
+
+    def post(self, path, payload):
+        response = self.session.post(self._url(path), json={**payload, "stream": False}, timeout=self.timeout)
+        if response.status_code != 200:
+            raise OllamaError(response.status_code, response.text)
+        return response.json()
+
+    def generate(self, payload):
+        return self.post("/api/generate", payload)
+
+    def stream(self, path, payload):
+        response = self.session.post(self._url(path), json={**payload, "stream": True}, stream=True, timeout=self.timeout)
+        if response.status_code != 200:
+            body = response.text
+            response.close()
+            raise OllamaError(response.status_code, body)
+        return OllamaStream(response)
+
+    def stream_generate(self, payload):
+        return self.stream("/api/generate", payload)
+
+    async def _get_async_session(self):
+        import aiohttp
+
+        loop = asyncio.get_running_loop()
+        session = self._async_sessions.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=OLLAMA_KEEPALIVE_TIMEOUT)
+            timeout = aiohttp.ClientTimeout(sock_connect=self.timeout[0], sock_read=self.timeout[1])
+            session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+            self._async_sessions[loop] = session
+        return session
+
+    async def astream(self, path, payload):
+        session = await self._get_async_session()
+        response = await session.post(self._url(path), json={**payload, "stream": True})
+        completed = False
+        try:
+            if response.status != 200:
+                raise OllamaError(response.status, await response.text())
+            async for line in response.content:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logs.warning("⚠️ Ligne JSON illisible dans le flux Ollama", ligne=line[:200])
+            completed = True
+        finally:
+            if completed:
+                # Flux lu jusqu'au bout : la connexion retourne au pool, prête pour le tour suivant
+                response.release()
+            else:
+                # Erreur, CancelledError ou aclose() en plein flux : connexion fermée, l'amont arrête de générer
+                response.close()
+
+    async def aclose(self):
+        loop = asyncio.get_running_loop()
+        session = self._async_sessions.pop(loop, None)
+        if session is not None:
+            await session.close()
+
+    def close(self):
+        self.session.close()
+
+
+ollama_client = OllamaClient()
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from constants import *
+import logs
+from audio_postprocess import AudioClip
+from audio_transport import audio_chunk
+
+CachedResponse = namedtuple("CachedResponse", ["model", "digest", "response", "final_chunk", "events", "size"])
+
+
+def cacheable(payload):
+    # Seule une génération déterministe peut être rejouée à l'identique
+    return RESPONSE_CACHE_ENABLED and payload.get("options", {}).get("temperature", 1.0) == 0.0
+
+
+class ResponseRecording:
+    # Enregistre la séquence émise pendant un tour (texte et audio, avec leurs instants)
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.events = []
+        self.complete = True
+        self._lock = threading.Lock()
+
+    def text(self, index, text):
+        with self._lock:
+            self.events.append((time.perf_counter() - self.started_at, 'text', index, text))
+
+    def audio(self, index, clip, part=None):
+        with self._lock:
+            if clip is None:
+                # Un bloc sans audio ne doit pas être figé dans le cache : un nouvel essai pourra le synthétiser
+                self.complete = False
+                return
+            self.events.append((time.perf_counter() - self.started_at, 'audio', index, (clip.data, clip.format, clip.sample_rate, part)))
+
+
+class ResponseCache:
+    def __init__(self, max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        # Empreinte (digest Ollama) de chaque modèle : un modèle re-téléchargé invalide ses réponses
+        self.model_digests = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+
+    @staticmethod
+    def key(path, payload, lang, speed_factor, codec):
+        # keep_alive ne change pas la réponse : il reste hors de la clé
+        request = {k: v for k, v in payload.items() if k != "keep_alive"}
+        material = json.dumps([path, request, lang, speed_factor, codec], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.digest != self.model_digests.get(entry.model):
+                if entry is not None:
+                    self._remove(key)
+                    self.invalidated += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, model, recording, response, final_chunk):
+        if not recording.complete or not response:
+            return False
+        size = len(response.encode('utf-8')) + sum(
+            len(value[0]) if kind == 'audio' else len(value.encode('utf-8'))
+            for _, kind, _, value in recording.events
+        )
+        if size > self.max_bytes:
+            return False
+        final_chunk = {k: v for k, v in (final_chunk or {}).items() if k in ('done', 'context', 'prompt_eval_count', 'eval_count')}
+        with self._lock:
+            entry = CachedResponse(model, self.model_digests.get(model), response, final_chunk, list(recording.events), size)
+            self._remove(key)
+            self._entries[key] = entry
+            self._size += size
+            # LRU borné en octets, audio compris
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.size
+        return True
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry.size
+
+    def invalidate_model(self, model):
+        with self._lock:
+            keys = [key for key, entry in self._entries.items() if entry.model == model]
+            for key in keys:
+                self._remove(key)
+            self.invalidated += len(keys)
+        if keys:
+            logs.info("♻️ Réponses du cache invalidées", modele=model, reponses=len(keys))
+        return len(keys)
+
+    def sync_models(self, models):
+        # Catalogue Ollama (/api/tags) : un digest qui change ou un modèle supprimé invalide ses réponses
+        digests = {model.get("name"): model.get("digest") for model in models if model.get("name")}
+        with self._lock:
+            changed = [name for name, digest in self.model_digests.items() if digests.get(name) != digest]
+            self.model_digests = digests
+        for name in changed:
+            self.invalidate_model(name)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+                'invalidated': self.invalidated,
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+def replay_timeline(entry, speed=RESPONSE_CACHE_REPLAY_SPEED, max_gap=RESPONSE_CACHE_MAX_GAP):
+    # Premier événement immédiat, puis rythme d'origine accéléré, chaque pause bornée : le client
+    # reçoit un flux progressif comme pendant une vraie génération, sans en payer la durée
+    previous = entry.events[0][0] if entry.events else 0.0
+    for offset, kind, index, value in entry.events:
+        delay = min(max(0.0, offset - previous) / speed, max_gap)
+        previous = offset
+        yield delay, kind, index, value
+
+
+def replay_payload(kind, index, value, binary_audio):
+    if kind == 'text':
+        return {'text': value, 'audio': None, 'index': index, 'isComplete': False}
+    data, audio_format, sample_rate, part = value
+    return audio_chunk(index, AudioClip(data, audio_format, sample_rate), binary_audio, part)
+
+
+response_cache = ResponseCache()
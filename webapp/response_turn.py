@@ -0,0 +1,182 @@
+import time
+
+from constants import *
+import logs
+import tracing
+from metrics import record_turn
+from audio_transport import audio_chunk
+from response_cache import ResponseRecording, cacheable, replay_payload
+from speech_text import SpeechNormalizer
+from text_segmenter import create_segmenter
+from tts_pipeline import interrupt_metrics
+
+
+class ResponseTurn:
+    # Déroulé d'un tour commun aux serveurs threading (webassistant) et asyncio (async_pipeline) :
+    # activation, requête et clé de cache, segmentation, normalisation, enregistrement, mesures et
+    # charges utiles des événements. Les pipelines ne gardent que l'I/O : lecture du flux Ollama,
+    # ordonnancement de la synthèse et emit, bloquants d'un côté, attendus de l'autre
+    def __init__(self, assistant, model_ref, tts=True):
+        self.assistant = assistant
+        self.conversation = assistant.conversation
+        self.model_ref = model_ref
+        self.tts = tts
+        self.lang = assistant.tts_lang
+        self.user_prompt = None
+        self.path = None
+        self.payload = None
+        self.cache_key = None
+        self.cached = None
+        self.metrics = tracing.turn_fields()
+        self.recording = ResponseRecording()
+        self.segmenter = create_segmenter(TEXT_SEGMENTER)
+        # Normalisation dans l'ordre des segments : l'état markdown suit le flux, pas les workers TTS
+        self.normalizer = SpeechNormalizer(self.lang)
+        self.full_response = ""
+        self.final_chunk = None
+        self.model_warm = None
+        self.last_emit_at = None
+        self.started_at = time.perf_counter()
+
+    def open(self, user_prompt, typed=False):
+        # -> événements à émettre avant la génération ; self.user_prompt reste None si le tour s'arrête là
+        events = []
+        if self.assistant.is_interrupt(user_prompt):
+            events.append(('interrupt', {'message': RESPONSE_MESSAGES[self.lang]["response_cancelled"]}))
+        # Message saisi : adressé à l'assistant par construction, pas de mot d'activation
+        prompt = user_prompt.strip() if typed else self.assistant.activated_prompt(user_prompt)
+        if not prompt:
+            return events
+        events.append(('transcript', {'text': user_prompt}))
+        self.user_prompt = prompt
+
+        logs.info("🔄 Envoi de la requête à Ollama", mode=self.conversation.mode, historique=len(self.conversation.history))
+        self.path, self.payload = self.conversation.build_request(self.model_ref, self.lang, prompt)
+        if cacheable(self.payload):
+            # Sans synthèse, la réponse enregistrée n'a pas d'audio : elle ne doit pas servir aux tours parlés
+            codec = self.assistant.tts_codec if self.tts else None
+            self.cache_key = self.assistant.response_cache.key(self.path, self.payload, self.lang, AUDIO_SPEED_FACTOR, codec)
+            self.cached = self.assistant.response_cache.get(self.cache_key)
+        return events
+
+    def start_generation(self):
+        self.started_at = time.perf_counter()
+        self.recording = ResponseRecording()
+        # Modèle déjà chargé ou non : le premier token n'a pas le même coût
+        self.model_warm = self.assistant.model_manager.is_warm(self.model_ref)
+
+    def elapsed(self):
+        return round(time.perf_counter() - self.started_at, 3)
+
+    def feed(self, chunk_data):
+        # Morceau du flux Ollama -> segments de texte complets à émettre
+        segments = []
+        chunk_text = self.conversation.chunk_text(chunk_data)
+        if chunk_text:
+            self.metrics.setdefault('time_to_first_token', self.elapsed())
+            self.full_response += chunk_text
+            segments.extend(self.segmenter.feed(chunk_text))
+        if chunk_data.get('done'):
+            self.final_chunk = chunk_data
+            segments.extend(self.segmenter.flush())
+            record_turn(self.metrics, chunk_data, time.perf_counter() - self.started_at)
+        return segments
+
+    @property
+    def done(self):
+        return self.final_chunk is not None
+
+    def speech(self, text):
+        return self.normalizer.feed(text) if self.tts else ""
+
+    def speech_tail(self):
+        # Construction restée ouverte (lien, code) : prononcée dans un dernier bloc audio
+        tail = self.normalizer.flush()
+        return tail if self.tts else ""
+
+    def text_chunk(self, index, text):
+        self.metrics.setdefault('time_to_first_chunk', self.elapsed())
+        self.recording.text(index, text)
+        return {
+            'text': text,
+            'audio': None,
+            'index': index,
+            'isComplete': False
+        }
+
+    def audio_chunk(self, index, clip, binary_audio, part=None):
+        # -> charge utile du bloc audio, None si la synthèse a échoué (le bloc n'est pas mis en cache)
+        self.recording.audio(index, clip, part)
+        if not clip:
+            return None
+        self.metrics.setdefault('time_to_first_audio', self.elapsed())
+        self.last_emit_at = time.perf_counter()
+        return audio_chunk(index, clip, binary_audio, part)
+
+    def touch_model(self):
+        if 'time_to_first_token' in self.metrics:
+            self.assistant.model_manager.touch(self.model_ref)
+
+    def error(self, key):
+        return {'text': ERROR_MESSAGES[self.lang][key], 'isComplete': True}
+
+    def commit(self):
+        # Dès la fin de la génération : l'historique garde la réponse même si sa lecture est interrompue
+        self.metrics.update(self.conversation.commit_turn(self.model_ref, self.lang, self.user_prompt, self.full_response, self.final_chunk))
+
+    def complete(self, tts_metrics):
+        turn_metrics = self.metrics
+        turn_metrics.update(tts_metrics)
+        turn_metrics['model_warm'] = self.model_warm
+        self.assistant.model_manager.record_ttft(self.model_ref, self.model_warm, turn_metrics.get('time_to_first_token'))
+        logs.info("⏱️ Tour terminé", premier_segment=turn_metrics.get('time_to_first_chunk'),
+                  premier_audio=turn_metrics.get('time_to_first_audio'),
+                  tokens_par_seconde=turn_metrics.get('tokens_per_second'),
+                  tts=turn_metrics.get('tts_time'), tts_masque=turn_metrics.get('tts_hidden_time'))
+        return self._complete_payload(turn_metrics)
+
+    def finish(self):
+        # Après response_complete : réponse mise en cache, résumé de l'historique en arrière-plan
+        if self.cache_key:
+            self.assistant.response_cache.put(self.cache_key, self.model_ref, self.recording, self.full_response, self.final_chunk)
+        self.conversation.schedule_summary(self.model_ref, self.lang)
+        return self.full_response
+
+    def cancelled(self, cancel_token, last_emit_at=None):
+        cancel_metrics = interrupt_metrics(cancel_token, last_emit_at or self.last_emit_at, time.perf_counter())
+        logs.info("🛑 Tour annulé", raison=cancel_token.reason, arret=cancel_metrics['interrupt_to_quiet'],
+                  dernier_audio=cancel_metrics.get('interrupt_to_last_audio', 0.0))
+        return self._complete_payload(cancel_metrics, cancelled=True)
+
+    def _complete_payload(self, turn_metrics, cancelled=False):
+        payload = {
+            'lastUserMessage': self.user_prompt,
+            'isComplete': True,
+            'metrics': turn_metrics
+        }
+        if cancelled:
+            payload['cancelled'] = True
+        return payload
+
+    # Rejeu d'une réponse en cache : texte et audio enregistrés, mêmes événements et mêmes délais
+    def start_replay(self):
+        logs.info("♻️ Réponse rejouée depuis le cache", evenements=len(self.cached.events))
+        self.started_at = time.perf_counter()
+        self.metrics = {'cached': True}
+        self.full_response = self.cached.response
+        self.final_chunk = self.cached.final_chunk
+        # Déjà en cache : finish() ne l'enregistre pas une seconde fois
+        self.cache_key = None
+
+    def replay_chunk(self, kind, index, value, binary_audio):
+        metric = 'time_to_first_chunk' if kind == 'text' else 'time_to_first_audio'
+        self.metrics.setdefault(metric, self.elapsed())
+        if kind == 'audio':
+            self.last_emit_at = time.perf_counter()
+        return replay_payload(kind, index, value, binary_audio)
+
+    def replay_complete(self):
+        self.commit()
+        logs.info("⏱️ Tour rejoué depuis le cache", premier_segment=self.metrics.get('time_to_first_chunk'),
+                  premier_audio=self.metrics.get('time_to_first_audio'))
+        return self._complete_payload(self.metrics)
@@ -1,55 +1,351 @@
-from flask import jsonify, render_template
-from flask_socketio import emit
-import threading
-import queue
+import asyncio
 import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Response, jsonify, render_template, request
+from flask_socketio import emit
 
 from constants import *
+from async_pipeline import stream_ollama_response
+from tts_cache import tts_cache
+from response_cache import response_cache
+from model_manager import model_manager
+from metrics import metrics
+import logs
+import tracing
+from tracing import tracer
+from audio_transport import client_supports_binary, upload_bytes
+from audio_ingest import AudioIngestError, decode_data_url
+from speech_stream import StreamingUtterance
+from scheduler import Transcript
+from cancellation import CancelToken
+from sessions import AsyncStreamEmitter, QueueEmitter
+from webassistant import WebAssistant
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# ffmpeg et la reconnaissance vocale sont bloquants : en mode asyncio ils tournent ici
+ingest_executor = ThreadPoolExecutor(max_workers=INGEST_MAX_WORKERS, thread_name_prefix="ingest")
+
+def describe_upload(audio_data):
+    if isinstance(audio_data, Transcript):
+        return f"{'saisi' if audio_data.typed else 'déjà transcrit'}: {audio_data.text}"
+    if isinstance(audio_data, StreamingUtterance):
+        return f"flux de {audio_data.chunks} morceaux, {audio_data.received_bytes} bytes"
+    return f"size: {len(audio_data)} bytes"
+
+def transcribe_all(session, utterances):
+    texts = []
+    for audio_data in utterances:
+        if not audio_data:
+            logs.warning("⚠️ Énoncé audio vide")
+            continue
+        if logs.enabled(logging.DEBUG):
+            logs.debug("📥 Énoncé reçu", session=session.sid, contenu=describe_upload(audio_data))
+        with tracing.span("transcribe", kind=type(audio_data).__name__):
+            user_prompt = session.assistant.transcribe(audio_data)
+        logs.info("🔊 Texte analysé", session=session.sid, texte=repr(user_prompt))
+        if user_prompt and getattr(audio_data, 'interrupted', False) and session.assistant.is_interrupt(user_prompt):
+            # Son partiel a déjà interrompu le tour précédent : pas de second 'interrupt'
+            continue
+        if user_prompt:
+            texts.append(Transcript(user_prompt, getattr(audio_data, 'typed', False)))
+    return texts
+
+def coalesce_prompts(assistant, texts):
+    # Plusieurs énoncés en attente deviennent un seul tour : le premier énoncé activé
+    # garde sa forme, les suivants y sont ajoutés sans leur mot d'activation.
+    # Un message saisi compte toujours comme activé
+    activated = [t for t in texts if t.typed or assistant.activated_prompt(t.text) is not None]
+    if len(activated) < 2:
+        return activated[0] if activated else (texts[-1] if texts else None)
+    logs.info("🧩 Énoncés regroupés en un seul tour", enonces=len(activated))
+    rest = [t.text if t.typed else assistant.activated_prompt(t.text) for t in activated[1:]]
+    return Transcript(' '.join([activated[0].text] + rest), activated[0].typed)
 
-def process_audio_queue(socketio, audio_queue, is_processing_ref, assistant, model_ref_container):
-    print("🎧 Starting audio processing thread")
-    
-    while is_processing_ref[0]:
+def report_not_understood(session, utterances):
+    if any(u and not getattr(u, 'interrupted', False) for u in utterances):
+        logs.info("❌ Aucun texte n'a pu être extrait de l'audio")
+        return {'message': ERROR_MESSAGES[session.assistant.tts_lang]["not_understood"]}
+    return None
+
+def process_audio(session, utterances):
+    # Un tour = une trace : transcription des énoncés regroupés, génération, synthèse
+    with tracing.turn("turn", profile=session.take_profile_request(), session=session.sid, utterances=len(utterances)):
+        _process_audio(session, utterances)
+
+def _process_audio(session, utterances):
+    assistant = session.assistant
+    user_prompt = coalesce_prompts(assistant, transcribe_all(session, utterances))
+
+    if user_prompt:
+        cancel_token = session.begin_turn()
         try:
-            audio_data = audio_queue.get(timeout=1)
-            
-            if audio_data:
-                data_size = len(audio_data) if audio_data else 0
-                print(f"📥 Audio data received - size: {data_size} bytes")
-                user_prompt = assistant.analyze_audio(audio_data)
-                print(f"🔊 Texte analysé: {user_prompt}")
-
-                if user_prompt:
-                    assistant.get_ollama_response(user_prompt, socketio, audio_queue, model_ref_container[0])
-                else:
-                    print("❌ Aucun texte n'a pu être extrait de l'audio")
-                    error_msg = ERROR_MESSAGES[assistant.tts_lang]["not_understood"]
-                    socketio.emit('error', {'message': error_msg})
-            else:
-                print("⚠️ Audio data empty")
-            
-            audio_queue.task_done()
-        except queue.Empty:
-            pass
+            assistant.get_ollama_response(user_prompt.text, session.emitter, session.model, cancel_token, user_prompt.typed)
+        finally:
+            session.end_turn(cancel_token)
+    else:
+        error = report_not_understood(session, utterances)
+        if error:
+            session.emitter.emit('error', error)
+
+async def process_audio_async(session, utterances):
+    with tracing.turn("turn", profile=session.take_profile_request(), session=session.sid, utterances=len(utterances)):
+        await _process_audio_async(session, utterances)
+
+async def _process_audio_async(session, utterances):
+    assistant = session.assistant
+    loop = asyncio.get_running_loop()
+    texts = await loop.run_in_executor(ingest_executor, tracing.bind(transcribe_all), session, utterances)
+    user_prompt = coalesce_prompts(assistant, texts)
+
+    if user_prompt:
+        cancel_token = session.begin_turn()
+        try:
+            await stream_ollama_response(assistant, user_prompt.text, session.emitter, session.model, cancel_token, user_prompt.typed)
+        finally:
+            session.end_turn(cancel_token)
+    else:
+        error = report_not_understood(session, utterances)
+        if error:
+            await session.emitter.emit('error', error)
+
+def parse_flag(value):
+    # Booléen JSON, ou chaîne/entier explicite : "false" ne doit pas valoir True ; None si illisible
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ('1', 'true', 'yes', 'on'):
+        return True
+    if text in ('0', 'false', 'no', 'off'):
+        return False
+    return None
+
+def chat_request(data, available_models, default_model):
+    # Corps de POST /chat : {"text": "...", "model": "...", "lang": "fr", "tts": true}
+    lang = data.get('lang') or DEFAULT_TTS_LANG
+    if lang not in ('fr', 'en'):
+        return None, f"{ERROR_MESSAGES[DEFAULT_TTS_LANG]['language_not_supported']}: {lang}"
+    text = str(data.get('text') or '').strip()
+    if not text:
+        return None, ERROR_MESSAGES[lang]["empty_message"]
+    model = data.get('model') or default_model
+    if available_models and model not in available_models:
+        return None, f'Modèle inconnu: {model}'
+    tts = parse_flag(data.get('tts', True))
+    if tts is None:
+        return None, f"tts doit être un booléen: {data.get('tts')!r}"
+    return {'text': text, 'model': model, 'lang': lang, 'tts': tts}, None
+
+def wants_sse(headers):
+    return 'text/event-stream' in headers.get('Accept', '')
+
+def format_event(event, data, sse):
+    # SSE pour les navigateurs (EventSource), sinon une ligne JSON par événement
+    if sse:
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+    return json.dumps({'event': event, 'data': data}, ensure_ascii=False) + "\n"
+
+def http_assistant(chat):
+    # Un assistant par requête HTTP : aucun historique partagé entre clients scriptés
+    assistant = WebAssistant()
+    assistant.tts_lang = chat['lang']
+    return assistant
+
+def stream_text_turn(chat, sse):
+    assistant = http_assistant(chat)
+    emitter = QueueEmitter()
+    cancel_token = CancelToken()
+
+    def run():
+        try:
+            assistant.get_ollama_response(chat['text'], emitter, chat['model'], cancel_token, typed=True, tts=chat['tts'])
         except Exception as e:
-            import traceback
-            print(f"❌ Error in processing thread: {e}")
-            print(f"Stack trace: {traceback.format_exc()}")
-            error_prefix = "Erreur" if assistant.tts_lang == "fr" else "Error"
-            socketio.emit('error', {'message': f'{error_prefix}: {str(e)}'})
-            audio_queue.task_done()
+            logs.error("❌ Erreur pendant un tour HTTP", exc_info=True, erreur=e)
+            emitter.emit('error', {'message': str(e)})
+        finally:
+            emitter.events.put(None)
+
+    worker = threading.Thread(target=run, name="http-turn", daemon=True)
+    worker.start()
+    try:
+        for event, data in iter(emitter.events.get, None):
+            yield format_event(event, data, sse)
+    finally:
+        # Client parti avant la fin : la génération est coupée comme sur une interruption
+        if worker.is_alive():
+            cancel_token.cancel("disconnect")
+        worker.join()
+        assistant.close()
+
+def apply_trace_settings(data):
+    # POST /traces : {"enabled": bool} pour tracer tous les tours, {"profile_turns": n} pour profiler les n suivants
+    enabled = parse_flag(data['enabled']) if 'enabled' in data else tracer.enabled
+    if enabled is None:
+        return "enabled doit être un booléen"
+    try:
+        profile_turns = int(data.get('profile_turns') or 0)
+    except (TypeError, ValueError):
+        return "profile_turns doit être un entier"
+    tracer.enabled = enabled
+    tracer.request_profile(profile_turns)
+    return None
+
+def json_routes(session_manager, available_models_ref):
+    # GET communs aux deux serveurs : chemin -> fonction (paramètres de la requête) rendant le JSON
+    return {
+        '/models': lambda args: {"models": available_models_ref},
+        '/models/status': lambda args: model_manager.stats(),
+        # ?sid= : identifiant Socket.IO de l'appelant, dont la session a pu changer de modèle
+        '/current-model': lambda args: {"currentModel": session_manager.model_for(args.get('sid'))},
+        '/tts-cache': lambda args: tts_cache.stats(),
+        '/response-cache': lambda args: response_cache.stats(),
+        '/sessions': lambda args: session_manager.stats(),
+        '/traces': lambda args: tracer.stats()
+    }
+
+def post_traces(data):
+    # -> (JSON, statut HTTP)
+    error = apply_trace_settings(data if isinstance(data, dict) else {})
+    if error:
+        return {'error': error}, 400
+    return tracer.stats(), 200
 
-def register_routes(app, socketio, assistant, audio_queue, is_processing_ref, processing_thread_ref, available_models_ref, model_ref):
+def error_event(message):
+    return ('error', {'message': message})
 
-    model_ref_container = [model_ref]
+def status_event(message):
+    return ('status', {'message': message})
 
-    @app.route('/models')
-    def get_models():
-        return jsonify({"models": available_models_ref})
-        
-    @app.route('/current-model')
-    def get_current_model():
-        return jsonify({"currentModel": model_ref_container[0]})
+# Événements Socket.IO servis par SocketHandlers, sous le nom de leur méthode
+SOCKET_EVENTS = ('start_listening', 'audio_data', 'text_input', 'profile_next_turn', 'audio_stream_start',
+                 'audio_stream_chunk', 'audio_stream_end', 'change_model', 'change_tts_lang')
+# L'écriture dans le pipe ffmpeg peut bloquer : en mode asyncio, hors de la boucle d'événements
+BLOCKING_EVENTS = ('audio_stream_chunk',)
+
+class SocketHandlers:
+    # Gestionnaires communs aux serveurs threading et asyncio : chacun reçoit la session et les
+    # données de l'événement, et rend les événements à renvoyer au client, (nom, *arguments).
+    # register_routes et register_async_routes ne font qu'enregistrer, appeler et émettre
+    def __init__(self, session_manager, available_models_ref):
+        self.session_manager = session_manager
+        self.available_models_ref = available_models_ref
+
+    def connect(self, sid, auth=None):
+        binary_audio = client_supports_binary(auth)
+        logs.info("🔌 Client connecté", audio='binaire' if binary_audio else 'base64')
+        self.session_manager.create(sid, binary_audio)
+        return [status_event('Connecté au serveur')]
+
+    def disconnect(self, sid):
+        logs.info("🔌 Client déconnecté")
+        self.session_manager.remove(sid)
+
+    def start_listening(self, session, data=None):
+        assistant = session.assistant
+        if assistant.conversation_history and any(mot in ' '.join(assistant.conversation_history[-2:]).lower() for mot in INTERRUPT_WORDS["fr"] + INTERRUPT_WORDS["en"]):
+            assistant.conversation_history = []
+            logs.info("🧹 Historique de conversation réinitialisé après mot d'arrêt")
+        return [('listening_started',)]
+
+    def audio_data(self, session, data):
+        if not self.session_manager.submit(session.sid, upload_bytes(data)):
+            return [error_event(ERROR_MESSAGES[session.assistant.tts_lang]["server_busy"])]
+        return []
+
+    def text_input(self, session, data=None):
+        text = str((data or {}).get('text') or '').strip()
+        if not text:
+            return [error_event(ERROR_MESSAGES[session.assistant.tts_lang]["empty_message"])]
+        # Ni décodage ni reconnaissance : le texte rejoint directement la file des tours
+        if not self.session_manager.submit(session.sid, Transcript(text, typed=True)):
+            return [error_event(ERROR_MESSAGES[session.assistant.tts_lang]["server_busy"])]
+        return []
+
+    def profile_next_turn(self, session, data=None):
+        session.request_profile()
+        return [status_event(RESPONSE_MESSAGES[session.assistant.tts_lang]["profile_next_turn"])]
+
+    def audio_stream_start(self, session, data=None):
+        try:
+            data = data or {}
+            session.start_utterance(data.get('utteranceId'), data.get('mime'))
+        except AudioIngestError as e:
+            logs.warning("❌ Flux audio impossible", erreur=e)
+            return [error_event(ERROR_MESSAGES[session.assistant.tts_lang]["not_understood"])]
+        return []
+
+    def audio_stream_chunk(self, session, data):
+        try:
+            session.feed_utterance(data.get('utteranceId'), data.get('seq'), decode_data_url(upload_bytes(data)), data.get('mime'))
+        except AudioIngestError as e:
+            logs.warning("❌ Flux audio interrompu", erreur=e)
+            session.abort_utterance()
+        return []
+
+    def audio_stream_end(self, session, data=None):
+        data = data or {}
+        try:
+            utterance = session.end_utterance(data.get('utteranceId'), data.get('chunks'))
+        except AudioIngestError as e:
+            logs.warning("❌ Flux audio impossible", erreur=e)
+            return []
+        if data.get('discard'):
+            utterance.abort()
+        elif not self.session_manager.submit(session.sid, utterance):
+            utterance.abort()
+            return [error_event(ERROR_MESSAGES[session.assistant.tts_lang]["server_busy"])]
+        return []
+
+    def change_model(self, session, data):
+        model = data.get('model')
+        if model not in self.available_models_ref:
+            return [error_event(f'Modèle inconnu: {model}')]
+        session.model = model
+        # Chargement anticipé pendant que l'utilisateur formule sa question
+        model_manager.prefetch(model)
+        logs.info("🔁 Modèle changé", modele=session.model, session=session.sid)
+        return [status_event(f'Modèle changé pour {session.model}')]
+
+    def change_tts_lang(self, session, data):
+        assistant = session.assistant
+        lang = data.get('lang')
+        if lang not in ['fr', 'en']:
+            error_message = ERROR_MESSAGES[assistant.tts_lang]["language_not_supported"]
+            return [error_event(f'{error_message}: {lang}')]
+        assistant.tts_lang = lang
+        logs.info("🌐 Langue changée", langue=lang)
+        return [status_event(RESPONSE_MESSAGES[lang]["language_changed"])]
+
+def register_routes(app, socketio, session_manager, available_models_ref, model_ref):
+    handlers = SocketHandlers(session_manager, available_models_ref)
+
+    def json_view(read):
+        return lambda: jsonify(read(request.args))
+
+    for path, read in json_routes(session_manager, available_models_ref).items():
+        app.add_url_rule(path, path.strip('/').replace('/', '_').replace('-', '_'), json_view(read))
+
+    @app.route('/chat', methods=['POST'])
+    def chat():
+        # Tour piloté par texte, sans audio entrant : réponse en flux (SSE ou JSON lines)
+        chat, error = chat_request(request.get_json(silent=True) or {}, available_models_ref, model_ref)
+        if error:
+            return jsonify({'error': error}), 400
+        sse = wants_sse(request.headers)
+        return Response(stream_text_turn(chat, sse), mimetype='text/event-stream' if sse else 'application/x-ndjson')
+
+    @app.route('/traces', methods=['POST'])
+    def set_traces():
+        payload, status = post_traces(request.get_json(silent=True) or {})
+        return jsonify(payload), status
+
+    @app.route('/metrics')
+    def get_metrics():
+        return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
     @app.route('/service-worker.js')
     def serve_service_worker():
@@ -60,53 +356,111 @@ def register_routes(app, socketio, assistant, audio_queue, is_processing_ref, pr
         return render_template('index.html')
 
     @socketio.on('connect')
-    def handle_connect():
-        print('Client connected')
-        emit('status', {'message': 'Connecté au serveur'})
+    def handle_connect(auth=None):
+        for event in handlers.connect(request.sid, auth):
+            emit(*event)
 
     @socketio.on('disconnect')
     def handle_disconnect():
-        print('Client disconnected')
-
-    @socketio.on('start_listening')
-    def handle_start_listening():
-        if not is_processing_ref[0]:
-            is_processing_ref[0] = True
-            if assistant.conversation_history and any(mot in ' '.join(assistant.conversation_history[-2:]).lower() for mot in INTERRUPT_WORDS["fr"] + INTERRUPT_WORDS["en"]):
-                assistant.conversation_history = []
-                print("Historique de conversation réinitialisé après mot d'arrêt")
-            
-            processing_thread_ref[0] = threading.Thread(
-                target=process_audio_queue, 
-                args=(socketio, audio_queue, is_processing_ref, assistant, model_ref_container)
-            )
-            processing_thread_ref[0].daemon = True
-            processing_thread_ref[0].start()
-        
-        emit('listening_started')
-
-    @socketio.on('audio_data')
-    def handle_audio_data(data):
-        audio_queue.put(data['audio'])
-
-    @socketio.on('change_model')
-    def handle_model_change(data):
-        model = data.get('model')
-        if model in available_models_ref:
-            model_ref_container[0] = model
-            print(f"Modèle changé pour {model_ref_container[0]}")
-            emit('status', {'message': f'Modèle changé pour {model_ref_container[0]}'})
-        else:
-            emit('error', {'message': f'Modèle inconnu: {model}'})
-
-    @socketio.on('change_tts_lang')
-    def handle_tts_lang_change(data):
-        lang = data.get('lang')
-        if lang in ['fr', 'en']:
-            assistant.tts_lang = lang
-            status_message = RESPONSE_MESSAGES[lang]["language_changed"]
-            print(f"Langue changée pour {lang}")
-            emit('status', {'message': status_message})
-        else:
-            error_message = ERROR_MESSAGES[assistant.tts_lang]["language_not_supported"]
-            emit('error', {'message': f'{error_message}: {lang}'})
+        handlers.disconnect(request.sid)
+
+    def socket_handler(name):
+        def handler(data=None):
+            for event in getattr(handlers, name)(session_manager.get(request.sid), data):
+                emit(*event)
+        return handler
+
+    for name in SOCKET_EVENTS:
+        socketio.on_event(name, socket_handler(name))
+
+def register_async_routes(web_app, sio, session_manager, available_models_ref, model_ref):
+    import jinja2
+    from aiohttp import web
+
+    handlers = SocketHandlers(session_manager, available_models_ref)
+    templates = jinja2.Environment(loader=jinja2.FileSystemLoader(os.path.join(BASE_DIR, 'templates')))
+    templates.globals['url_for'] = lambda endpoint, filename='': f"/static/{filename}"
+
+    async def request_json(request):
+        try:
+            return await request.json()
+        except ValueError:
+            return {}
+
+    def json_view(read):
+        async def view(request):
+            return web.json_response(read(request.query))
+        return view
+
+    async def chat(request):
+        data = await request_json(request)
+        chat, error = chat_request(data if isinstance(data, dict) else {}, available_models_ref, model_ref)
+        if error:
+            return web.json_response({'error': error}, status=400)
+        sse = wants_sse(request.headers)
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream' if sse else 'application/x-ndjson'})
+        await response.prepare(request)
+
+        assistant = http_assistant(chat)
+        cancel_token = CancelToken()
+
+        async def write(event, data):
+            try:
+                await response.write(format_event(event, data, sse).encode('utf-8'))
+            except ConnectionResetError:
+                # Client parti avant la fin : la génération est coupée comme sur une interruption
+                cancel_token.cancel("disconnect")
+
+        try:
+            await stream_ollama_response(assistant, chat['text'], AsyncStreamEmitter(write), chat['model'], cancel_token, typed=True, tts=chat['tts'])
+            if not cancel_token.cancelled:
+                await response.write_eof()
+        finally:
+            assistant.close()
+        return response
+
+    async def set_traces(request):
+        payload, status = post_traces(await request_json(request))
+        return web.json_response(payload, status=status)
+
+    async def get_metrics(request):
+        return web.Response(text=metrics.render(), content_type='text/plain', charset='utf-8')
+
+    async def serve_service_worker(request):
+        return web.FileResponse(os.path.join(BASE_DIR, 'static', 'js', 'service-worker.js'))
+
+    async def index(request):
+        return web.Response(text=templates.get_template('index.html').render(), content_type='text/html')
+
+    for path, read in json_routes(session_manager, available_models_ref).items():
+        web_app.router.add_get(path, json_view(read))
+    web_app.router.add_post('/chat', chat)
+    web_app.router.add_post('/traces', set_traces)
+    web_app.router.add_get('/metrics', get_metrics)
+    web_app.router.add_get('/service-worker.js', serve_service_worker)
+    web_app.router.add_get('/', index)
+    web_app.router.add_static('/static', os.path.join(BASE_DIR, 'static'))
+
+    @sio.on('connect')
+    async def handle_connect(sid, environ, auth=None):
+        for event in handlers.connect(sid, auth):
+            await sio.emit(*event, to=sid)
+
+    @sio.on('disconnect')
+    async def handle_disconnect(sid):
+        handlers.disconnect(sid)
+
+    def socket_handler(name):
+        async def handler(sid, data=None):
+            session = session_manager.get(sid)
+            method = getattr(handlers, name)
+            if name in BLOCKING_EVENTS:
+                events = await asyncio.get_running_loop().run_in_executor(ingest_executor, method, session, data)
+            else:
+                events = method(session, data)
+            for event in events:
+                await sio.emit(*event, to=sid)
+        return handler
+
+    for name in SOCKET_EVENTS:
+        sio.on(name, socket_handler(name))
@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import deque, namedtuple
+
+from constants import *
+import logs
+
+# Énoncé déjà transcrit (pendant le tri des énoncés reçus en cours de réponse)
+# typed : message saisi au clavier, sans mot d'activation requis
+Transcript = namedtuple("Transcript", ["text", "typed"], defaults=[False])
+
+ScheduledUtterance = namedtuple("ScheduledUtterance", ["item", "received_at", "priority"])
+
+DROP_REASONS = ("overflow", "stale", "superseded")
+
+
+class UtteranceScheduler:
+    # Remplace la file brute : deux voies (interruptions prioritaires, énoncés normaux),
+    # capacité bornée, énoncés trop vieux écartés, et chaque abandon compté et signalé
+    def __init__(self, capacity=AUDIO_QUEUE_SIZE, max_age=UTTERANCE_MAX_AGE, coalesce_max=COALESCE_MAX_UTTERANCES,
+                 priority_capacity=PRIORITY_QUEUE_SIZE, on_drop=None, on_ready=None, name=""):
+        self.capacity = capacity
+        self.max_age = max_age
+        self.coalesce_max = max(1, coalesce_max)
+        self.priority_capacity = priority_capacity
+        self.on_drop = on_drop
+        self.on_ready = on_ready
+        self.name = name
+        self._lock = threading.Lock()
+        self._priority = deque()
+        self._normal = deque()
+        self.closed = False
+        self.accepted = 0
+        self.coalesced = 0
+        self.dropped = dict.fromkeys(DROP_REASONS, 0)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._priority) + len(self._normal)
+
+    def empty(self):
+        return len(self) == 0
+
+    def put(self, item, priority=False, received_at=None):
+        entry = ScheduledUtterance(item, received_at or time.perf_counter(), priority)
+        dropped = []
+        with self._lock:
+            if self.closed:
+                return False
+            self.accepted += 1
+            if priority:
+                # Une interruption rend caducs les énoncés normaux arrivés avant elle
+                while self._normal and self._normal[0].received_at <= entry.received_at:
+                    dropped.append((self._normal.popleft(), "superseded"))
+                self._priority.append(entry)
+                while len(self._priority) > self.priority_capacity:
+                    dropped.append((self._priority.popleft(), "overflow"))
+            else:
+                self._normal.append(entry)
+                # File pleine : c'est le plus ancien qui part, jamais le plus récent
+                while len(self._normal) > self.capacity:
+                    dropped.append((self._normal.popleft(), "overflow"))
+        self._report(dropped)
+        if self.on_ready:
+            self.on_ready()
+        return True
+
+    def supersede(self, before):
+        dropped = []
+        with self._lock:
+            while self._normal and self._normal[0].received_at <= before:
+                dropped.append((self._normal.popleft(), "superseded"))
+        self._report(dropped)
+
+    def pop_batch(self, now=None):
+        # Une interruption passe seule et en premier ; sinon, les énoncés normaux encore
+        # frais qui se suivent sont regroupés en un seul tour
+        now = now or time.perf_counter()
+        dropped = []
+        with self._lock:
+            if self._priority:
+                batch = [self._priority.popleft()]
+            else:
+                batch = []
+                while self._normal and len(batch) < self.coalesce_max:
+                    entry = self._normal.popleft()
+                    if now - entry.received_at > self.max_age:
+                        dropped.append((entry, "stale"))
+                    else:
+                        batch.append(entry)
+                if len(batch) > 1:
+                    self.coalesced += len(batch) - 1
+        self._report(dropped)
+        return batch
+
+    def clear(self):
+        with self._lock:
+            self.closed = True
+            entries = list(self._priority) + list(self._normal)
+            self._priority.clear()
+            self._normal.clear()
+        return [entry.item for entry in entries]
+
+    def _report(self, dropped):
+        for entry, reason in dropped:
+            with self._lock:
+                self.dropped[reason] += 1
+                total = sum(self.dropped.values())
+            age = time.perf_counter() - entry.received_at
+            logs.info("🗑️ Énoncé écarté", raison=reason, age=round(age, 1), session=self.name, total=total)
+            # Un énoncé en flux tient un processus ffmpeg : il est libéré tout de suite
+            if hasattr(entry.item, 'abort'):
+                entry.item.abort()
+            if self.on_drop:
+                try:
+                    self.on_drop(entry, reason)
+                except Exception as e:
+                    logs.warning("⚠️ Signalement de l'énoncé écarté impossible", erreur=e)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending': len(self._priority) + len(self._normal),
+                'accepted': self.accepted,
+                'coalesced': self.coalesced,
+                'dropped': dict(self.dropped)
+            }
@@ -0,0 +1,405 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from constants import *
+import logs
+from webassistant import WebAssistant
+from cancellation import CancelToken
+from scheduler import Transcript, UtteranceScheduler
+from metrics import metrics
+
+
+class SessionEmitter:
+    def __init__(self, socketio, sid):
+        self.socketio = socketio
+        self.sid = sid
+        # Négocié à la connexion : pièces jointes binaires ou base64 pour l'audio
+        self.binary_audio = False
+
+    def emit(self, event, data=None):
+        # Jamais de diffusion : chaque événement ne va qu'au client propriétaire
+        self.socketio.emit(event, data, to=self.sid)
+
+
+class AsyncSessionEmitter(SessionEmitter):
+    async def emit(self, event, data=None):
+        await self.socketio.emit(event, data, to=self.sid)
+
+
+class QueueEmitter:
+    # Tour piloté en HTTP (mode threading) : les événements attendent la réponse en flux dans une file
+    binary_audio = False
+
+    def __init__(self):
+        self.events = queue.Queue()
+
+    def emit(self, event, data=None):
+        self.events.put((event, data))
+
+
+class AsyncStreamEmitter:
+    # Tour piloté en HTTP (mode asyncio) : chaque événement est écrit aussitôt dans la réponse
+    binary_audio = False
+
+    def __init__(self, write):
+        self.write = write
+
+    async def emit(self, event, data=None):
+        await self.write(event, data)
+
+
+class Session:
+    def __init__(self, sid, socketio, model):
+        self.sid = sid
+        self.model = model
+        self.assistant = WebAssistant()
+        self.emitter = SessionEmitter(socketio, sid)
+        self.scheduler = UtteranceScheduler(on_drop=self.report_drop, name=sid)
+        self.lock = threading.Lock()
+        self.active = False
+        self.closed = False
+        self.utterance = None
+        self.utterance_lock = threading.Lock()
+        self.turn = None
+        self.profile_requested = False
+
+    def report_drop(self, entry, reason):
+        # Rien ne disparaît sans que le client le sache
+        self.emit_threadsafe('utterance_dropped', {
+            'reason': reason,
+            'message': RESPONSE_MESSAGES[self.assistant.tts_lang]["utterance_dropped"]
+        })
+
+    def emit_threadsafe(self, event, data):
+        self.emitter.emit(event, data)
+
+    def request_profile(self):
+        self.profile_requested = True
+
+    def take_profile_request(self):
+        # Le prochain tour de cette session seulement est profilé
+        requested, self.profile_requested = self.profile_requested, False
+        return requested
+
+    def begin_turn(self):
+        self.turn = CancelToken()
+        return self.turn
+
+    def end_turn(self, token):
+        if self.turn is token:
+            self.turn = None
+
+    def cancel_turn(self, reason="interrupt", origin_at=None):
+        turn = self.turn
+        return turn is not None and turn.cancel(reason, origin_at)
+
+    def interrupt_turn(self, origin_at=None):
+        if self.cancel_turn("interrupt", origin_at):
+            self.emitter.emit('interrupt', {'message': RESPONSE_MESSAGES[self.assistant.tts_lang]["response_cancelled"]})
+            return True
+        return False
+
+    def accept_screened(self, text, received_at, typed=False, interrupted=False):
+        if self.assistant.is_interrupt(text):
+            if interrupted:
+                # Fin d'un énoncé dont le partiel a déjà interrompu le tour : ni second 'interrupt' ni nouveau tour
+                logs.info("🛑 Interruption déjà traitée sur le transcript partiel", session=self.sid, texte=repr(text))
+                self.scheduler.supersede(received_at)
+                return
+            logs.info("🛑 Interruption détectée", session=self.sid, texte=repr(text))
+            if self.interrupt_turn(received_at):
+                self.scheduler.supersede(received_at)
+            else:
+                self.scheduler.put(Transcript(text, typed), priority=True, received_at=received_at)
+        else:
+            # Gardé pour après le tour en cours, au lieu d'être jeté
+            logs.info("📥 Énoncé mis en attente pendant la réponse", session=self.sid, texte=repr(text))
+            self.scheduler.put(Transcript(text, typed), received_at=received_at)
+
+    def screen_partial(self, text):
+        # Un transcript partiel suffit à arrêter le tour en cours, sans attendre la fin de l'énoncé
+        # -> True si le tour a été interrompu, l'énoncé en garde la trace
+        return self.turn is not None and self.assistant.is_interrupt(text) and self.interrupt_turn()
+
+    def emit_partial(self, text):
+        self.emitter.emit('partial_transcript', {'text': text})
+        return self.screen_partial(text)
+
+    def _current_utterance(self, utterance_id, mime=None):
+        # Les événements de début, de morceaux et de fin peuvent arriver dans le désordre :
+        # le premier qui porte un nouvel identifiant ouvre l'énoncé
+        with self.utterance_lock:
+            utterance = self.utterance
+            if utterance and utterance.id == utterance_id:
+                return utterance
+            if utterance and not utterance.ended:
+                utterance.abort()
+            self.utterance = self.assistant.start_utterance(self.emit_partial, mime, utterance_id)
+            return self.utterance
+
+    def start_utterance(self, utterance_id=None, mime=None):
+        return self._current_utterance(utterance_id, mime)
+
+    def feed_utterance(self, utterance_id, seq, data, mime=None):
+        self._current_utterance(utterance_id, mime).feed(seq, data)
+
+    def end_utterance(self, utterance_id=None, total_chunks=None):
+        utterance = self._current_utterance(utterance_id)
+        utterance.end(total_chunks)
+        return utterance
+
+    def abort_utterance(self):
+        with self.utterance_lock:
+            utterance, self.utterance = self.utterance, None
+        if utterance and not utterance.ended:
+            utterance.abort()
+
+    def close(self):
+        self.closed = True
+        self.abort_utterance()
+        # Les énoncés en flux encore en file tiennent un processus ffmpeg ouvert
+        for item in self.scheduler.clear():
+            if hasattr(item, 'abort'):
+                item.abort()
+        self.assistant.close()
+
+
+def scheduler_totals(sessions):
+    totals = {'sessions': len(sessions), 'turns': 0, 'pending': 0, 'accepted': 0, 'coalesced': 0, 'dropped': {}}
+    for session in sessions:
+        totals['turns'] += session.turn is not None
+        stats = session.scheduler.stats()
+        for key in ('pending', 'accepted', 'coalesced'):
+            totals[key] += stats[key]
+        for reason, count in stats['dropped'].items():
+            totals['dropped'][reason] = totals['dropped'].get(reason, 0) + count
+    return totals
+
+
+def register_gauges(manager):
+    # Lues au moment de la collecte /metrics : aucun coût sur le chemin des énoncés
+    metrics.gauge("assistant_sessions_active", "Sessions Socket.IO ouvertes", lambda: manager.stats()['sessions'])
+    metrics.gauge("assistant_turns_active", "Tours de réponse en cours", lambda: manager.stats()['turns'])
+    metrics.gauge("assistant_utterance_queue_depth", "Énoncés en attente, toutes sessions confondues", lambda: manager.stats()['pending'])
+
+
+class SessionManager:
+    def __init__(self, socketio, handler, default_model=DEFAULT_MODEL, max_workers=SESSION_MAX_WORKERS):
+        self.socketio = socketio
+        self.handler = handler
+        self.default_model = default_model
+        self.sessions = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="session")
+        self._screener = ThreadPoolExecutor(max_workers=INTERRUPT_MAX_WORKERS, thread_name_prefix="interrupt")
+        register_gauges(self)
+
+    def create(self, sid, binary_audio=False):
+        with self._lock:
+            session = self.sessions.get(sid)
+            if session is None:
+                session = Session(sid, self.socketio, self.default_model)
+                session.emitter.binary_audio = binary_audio
+                self.sessions[sid] = session
+        logs.info("👤 Session ouverte", session=sid, actives=len(self.sessions))
+        return session
+
+    def get(self, sid):
+        with self._lock:
+            session = self.sessions.get(sid)
+        return session or self.create(sid)
+
+    def model_for(self, sid):
+        # Modèle choisi par une session, sans la créer : celui du serveur pour un appelant inconnu
+        with self._lock:
+            session = self.sessions.get(sid)
+        return session.model if session else self.default_model
+
+    def remove(self, sid):
+        with self._lock:
+            session = self.sessions.pop(sid, None)
+        if session:
+            session.close()
+            logs.info("👋 Session fermée", session=sid, actives=len(self.sessions))
+
+    def submit(self, sid, item):
+        session = self.get(sid)
+        received_at = time.perf_counter()
+        if session.active:
+            # Session occupée (tour en cours ou file en traitement) : l'énoncé est transcrit tout
+            # de suite sur son propre chemin, sans attendre ni ralentir le flux de tokens
+            self._screener.submit(self._screen, session, item, received_at)
+            return True
+        if not session.scheduler.put(item, received_at=received_at):
+            return False
+        self._schedule(session)
+        return True
+
+    def _screen(self, session, item, received_at):
+        try:
+            text = session.assistant.transcribe(item)
+        except Exception as e:
+            logs.error("❌ Erreur lors de l'analyse d'un énoncé", session=session.sid, erreur=e)
+            return
+        if text:
+            session.accept_screened(text, received_at, getattr(item, 'typed', False), getattr(item, 'interrupted', False))
+        self._schedule(session)
+
+    def _schedule(self, session):
+        # Au plus un worker par session : les énoncés d'un client restent ordonnés,
+        # tandis que les sessions différentes sont servies en parallèle
+        with session.lock:
+            if session.active or session.closed:
+                return
+            session.active = True
+        self._executor.submit(self._drain, session)
+
+    def _drain(self, session):
+        while not session.closed:
+            batch = session.scheduler.pop_batch()
+            if not batch:
+                with session.lock:
+                    if session.scheduler.empty():
+                        session.active = False
+                        return
+                continue
+
+            try:
+                self.handler(session, [entry.item for entry in batch])
+            except Exception as e:
+                logs.error("❌ Erreur dans la session", exc_info=True, session=session.sid, erreur=e)
+                error_prefix = "Erreur" if session.assistant.tts_lang == "fr" else "Error"
+                session.emitter.emit('error', {'message': f'{error_prefix}: {str(e)}'})
+
+        with session.lock:
+            session.active = False
+
+    def stats(self):
+        with self._lock:
+            sessions = list(self.sessions.values())
+        return scheduler_totals(sessions)
+
+    def shutdown(self):
+        with self._lock:
+            sids = list(self.sessions)
+        for sid in sids:
+            self.remove(sid)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._screener.shutdown(wait=False, cancel_futures=True)
+
+
+class AsyncSession(Session):
+    def __init__(self, sid, socketio, model):
+        super().__init__(sid, socketio, model)
+        self.emitter = AsyncSessionEmitter(socketio, sid)
+        self.task = None
+        self.loop = asyncio.get_running_loop()
+        self.ready = asyncio.Event()
+        self.scheduler.on_ready = lambda: self.loop.call_soon_threadsafe(self.ready.set)
+
+    def emit_threadsafe(self, event, data):
+        # Utilisable depuis la boucle comme depuis un thread (lecture du décodeur, tri des interruptions)
+        asyncio.run_coroutine_threadsafe(self.emitter.emit(event, data), self.loop)
+
+    def emit_partial(self, text):
+        self.emit_threadsafe('partial_transcript', {'text': text})
+        return self.screen_partial(text)
+
+    def interrupt_turn(self, origin_at=None):
+        if self.cancel_turn("interrupt", origin_at):
+            self.emit_threadsafe('interrupt', {'message': RESPONSE_MESSAGES[self.assistant.tts_lang]["response_cancelled"]})
+            return True
+        return False
+
+    def close(self):
+        super().close()
+        if self.task:
+            self.task.cancel()
+
+
+class AsyncSessionManager:
+    def __init__(self, sio, handler, default_model=DEFAULT_MODEL, max_workers=SESSION_MAX_WORKERS):
+        self.sio = sio
+        self.handler = handler
+        self.default_model = default_model
+        self.max_workers = max_workers
+        self.sessions = {}
+        self._slots = None
+        self._screener = ThreadPoolExecutor(max_workers=INTERRUPT_MAX_WORKERS, thread_name_prefix="interrupt")
+        register_gauges(self)
+
+    def create(self, sid, binary_audio=False):
+        session = self.sessions.get(sid)
+        if session is None:
+            if self._slots is None:
+                self._slots = asyncio.Semaphore(self.max_workers)
+            session = AsyncSession(sid, self.sio, self.default_model)
+            session.emitter.binary_audio = binary_audio
+            session.task = asyncio.create_task(self._consume(session))
+            self.sessions[sid] = session
+            logs.info("👤 Session ouverte", session=sid, actives=len(self.sessions))
+        return session
+
+    def get(self, sid):
+        return self.sessions.get(sid) or self.create(sid)
+
+    def model_for(self, sid):
+        session = self.sessions.get(sid)
+        return session.model if session else self.default_model
+
+    def remove(self, sid):
+        session = self.sessions.pop(sid, None)
+        if session:
+            session.close()
+            logs.info("👋 Session fermée", session=sid, actives=len(self.sessions))
+
+    def submit(self, sid, item):
+        session = self.get(sid)
+        received_at = time.perf_counter()
+        if session.active:
+            asyncio.create_task(self._screen(session, item, received_at))
+            return True
+        return session.scheduler.put(item, received_at=received_at)
+
+    async def _screen(self, session, item, received_at):
+        loop = asyncio.get_running_loop()
+        try:
+            text = await loop.run_in_executor(self._screener, session.assistant.transcribe, item)
+        except Exception as e:
+            logs.error("❌ Erreur lors de l'analyse d'un énoncé", session=session.sid, erreur=e)
+            return
+        if text:
+            session.accept_screened(text, received_at, getattr(item, 'typed', False), getattr(item, 'interrupted', False))
+
+    async def _consume(self, session):
+        while not session.closed:
+            await session.ready.wait()
+            session.ready.clear()
+            while not session.closed:
+                batch = session.scheduler.pop_batch()
+                if not batch:
+                    break
+                # Nombre borné de tours en cours, toutes sessions confondues
+                async with self._slots:
+                    session.active = True
+                    try:
+                        await self.handler(session, [entry.item for entry in batch])
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        logs.error("❌ Erreur dans la session", exc_info=True, session=session.sid, erreur=e)
+                        error_prefix = "Erreur" if session.assistant.tts_lang == "fr" else "Error"
+                        await session.emitter.emit('error', {'message': f'{error_prefix}: {str(e)}'})
+                    finally:
+                        session.active = False
+
+    def stats(self):
+        return scheduler_totals(list(self.sessions.values()))
+
+    def shutdown(self):
+        for sid in list(self.sessions):
+            self.remove(sid)
+        self._screener.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,269 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import speech_recognition as sr
+
+from constants import *
+import logs
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class EngineUnavailable(Exception):
+    pass
+
+
+class GoogleRecognizer:
+    # Pas de résultats partiels côté Google : l'énoncé accumulé (et débarrassé de ses
+    # silences de bord) est reconnu en un seul appel à la fin
+    def __init__(self, language="fr-FR", sample_rate=INGEST_SAMPLE_RATE):
+        self.language = language
+        self.sample_rate = sample_rate
+        self._recognizer = sr.Recognizer()
+
+    def accept(self, pcm):
+        return None
+
+    def finalize(self, pcm):
+        return self.recognize(pcm)
+
+    def recognize(self, pcm):
+        audio = sr.AudioData(pcm, self.sample_rate, 2)
+        logs.debug("🔍 Reconnaissance via Google", langue=self.language)
+
+        try:
+            texte = self._recognizer.recognize_google(audio, language=self.language)
+            logs.info("✅ Texte reconnu", moteur="google", texte=repr(texte))
+            return texte
+        except sr.UnknownValueError:
+            logs.debug("❌ Aucune parole reconnue", moteur="google")
+            return None
+        except sr.RequestError as e:
+            logs.error("❌ Erreur de l'API Google Speech", erreur=e)
+            return None
+
+
+# Modèles locaux chargés une seule fois par processus et partagés par tous les workers ;
+# seul l'état d'un énoncé (décodeur Vosk) est propre à chaque reconnaissance
+_engines = {}
+_engines_lock = threading.Lock()
+_unavailable = set()
+
+
+def load_engine(name, language):
+    lang = language.split('-')[0]
+    key = (name, ENGINE_KEYS.get(name, lambda lang: lang)(lang))
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            if key in _unavailable:
+                raise EngineUnavailable(f"{name} ({language})")
+            try:
+                engine = ENGINE_LOADERS[name](lang)
+            except Exception as e:
+                # Signalé une seule fois : les énoncés suivants passent directement par Google
+                _unavailable.add(key)
+                logs.warning("⚠️ Moteur de reconnaissance indisponible, repli sur Google", moteur=name, langue=lang, erreur=e)
+                raise EngineUnavailable(f"{name} ({language}): {e}") from e
+            _engines[key] = engine
+    return engine
+
+
+def _load_vosk(lang):
+    import vosk
+
+    path = VOSK_MODEL_PATHS.get(lang)
+    if not path or not os.path.isdir(os.path.join(BASE_DIR, path)):
+        raise FileNotFoundError(f"modèle Vosk introuvable pour '{lang}': {path}")
+    vosk.SetLogLevel(-1)
+    logs.info("📦 Chargement du modèle Vosk", chemin=path)
+    return vosk.Model(os.path.join(BASE_DIR, path))
+
+
+def _load_whisper(lang):
+    from faster_whisper import WhisperModel
+
+    logs.info("📦 Chargement du modèle Whisper", modele=WHISPER_MODEL, calcul=WHISPER_COMPUTE_TYPE)
+    # num_workers : autant de transcriptions simultanées que de workers de reconnaissance
+    return WhisperModel(WHISPER_MODEL, device="cpu", compute_type=WHISPER_COMPUTE_TYPE, num_workers=STT_WORKERS)
+
+
+ENGINE_LOADERS = {
+    "vosk": _load_vosk,
+    "whisper": _load_whisper
+}
+
+# Clé de partage d'un modèle chargé : un modèle Vosk par langue, un seul modèle Whisper
+# multilingue (la langue est donnée à chaque transcription)
+ENGINE_KEYS = {
+    "vosk": lambda lang: lang,
+    "whisper": lambda lang: WHISPER_MODEL
+}
+
+
+class VoskRecognizer:
+    # Reconnaissance locale en flux : chaque morceau de PCM avance le décodeur et donne un partiel
+    def __init__(self, language="fr-FR", sample_rate=INGEST_SAMPLE_RATE):
+        self.language = language
+        self.sample_rate = sample_rate
+        self._model = load_engine("vosk", language)
+        self._decoder = None
+        self._finals = []
+
+    def _new_decoder(self):
+        import vosk
+
+        return vosk.KaldiRecognizer(self._model, self.sample_rate)
+
+    def accept(self, pcm):
+        if self._decoder is None:
+            self._decoder = self._new_decoder()
+        if self._decoder.AcceptWaveform(pcm):
+            text = json.loads(self._decoder.Result()).get('text', '')
+            if text:
+                self._finals.append(text)
+            return ' '.join(self._finals) or None
+        partial = json.loads(self._decoder.PartialResult()).get('partial', '')
+        return ' '.join(self._finals + [partial]).strip() or None
+
+    def finalize(self, pcm):
+        # Énoncé reçu en flux : le décodeur a déjà tout vu, il ne reste qu'à le vider
+        if self._decoder is None:
+            return self.recognize(pcm)
+        text = json.loads(self._decoder.FinalResult()).get('text', '')
+        texte = ' '.join(self._finals + [text]).strip()
+        self._decoder = None
+        self._finals = []
+        return self._report(texte)
+
+    def recognize(self, pcm):
+        decoder = self._new_decoder()
+        decoder.AcceptWaveform(pcm)
+        return self._report(json.loads(decoder.FinalResult()).get('text', '').strip())
+
+    def _report(self, texte):
+        if texte:
+            logs.info("✅ Texte reconnu", moteur="vosk", texte=repr(texte))
+            return texte
+        logs.debug("❌ Aucune parole reconnue", moteur="vosk")
+        return None
+
+
+class WhisperRecognizer:
+    # Modèle Whisper local sur CPU : pas de partiels, l'énoncé entier est transcrit à la fin
+    def __init__(self, language="fr-FR", sample_rate=INGEST_SAMPLE_RATE):
+        self.language = language
+        self.sample_rate = sample_rate
+        self._model = load_engine("whisper", language)
+
+    def accept(self, pcm):
+        return None
+
+    def finalize(self, pcm):
+        return self.recognize(pcm)
+
+    def recognize(self, pcm):
+        if self.sample_rate != 16000:
+            raise ValueError("Whisper attend du PCM à 16 kHz")
+        audio = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+        segments, _ = self._model.transcribe(audio, language=self.language.split('-')[0], beam_size=1)
+        texte = ' '.join(segment.text.strip() for segment in segments).strip()
+        if texte:
+            logs.info("✅ Texte reconnu", moteur="whisper", texte=repr(texte))
+            return texte
+        logs.debug("❌ Aucune parole reconnue", moteur="whisper")
+        return None
+
+
+# Les moteurs de repli tournent ici, seulement quand le moteur principal échoue ou tarde
+fallback_executor = ThreadPoolExecutor(max_workers=STT_WORKERS, thread_name_prefix="stt-fallback")
+
+
+class FallbackRecognizer:
+    # Repli différé : un moteur de repli ne part que si le principal n'a rien reconnu, ou n'a
+    # pas répondu après STT_FALLBACK_DELAY secondes (il tourne alors en parallèle). Le premier
+    # résultat non vide dans l'ordre de priorité l'emporte, sans attendre les suivants
+    def __init__(self, primary, fallbacks, delay=STT_FALLBACK_DELAY):
+        self.primary = primary
+        self.fallbacks = fallbacks
+        self.delay = delay
+        self.language = primary.language
+        self.sample_rate = primary.sample_rate
+
+    def accept(self, pcm):
+        return self.primary.accept(pcm)
+
+    def finalize(self, pcm):
+        return self._first_result(self.primary.finalize, pcm)
+
+    def recognize(self, pcm):
+        return self._first_result(self.primary.recognize, pcm)
+
+    def _delayed(self, recognizer, pcm, primary_done, primary_result):
+        if primary_done.wait(self.delay) and primary_result:
+            return None
+        return recognizer.recognize(pcm)
+
+    def _first_result(self, primary_call, pcm):
+        primary_done = threading.Event()
+        primary_result = []
+        futures = [fallback_executor.submit(self._delayed, recognizer, pcm, primary_done, primary_result)
+                   for recognizer in self.fallbacks]
+        try:
+            texte = primary_call(pcm)
+        except Exception as e:
+            logs.error("❌ Erreur du moteur de reconnaissance principal", erreur=e)
+            texte = None
+        if texte:
+            primary_result.append(texte)
+        primary_done.set()
+        for future in futures:
+            if texte:
+                future.cancel()
+                continue
+            try:
+                texte = future.result()
+            except Exception as e:
+                logs.error("❌ Erreur d'un moteur de reconnaissance de repli", erreur=e)
+        return texte
+
+
+RECOGNIZERS = {
+    "google": GoogleRecognizer,
+    "vosk": VoskRecognizer,
+    "whisper": WhisperRecognizer
+}
+
+
+def _create_single(spec, language, sample_rate):
+    # "google" ou "google:en-US" : un moteur de repli peut viser une autre langue
+    name, _, spec_language = spec.partition(':')
+    try:
+        return RECOGNIZERS.get(name, GoogleRecognizer)(spec_language or language, sample_rate)
+    except EngineUnavailable:
+        return GoogleRecognizer(spec_language or language, sample_rate)
+
+
+def create_recognizer(name=STT_BACKEND, language="fr-FR", sample_rate=INGEST_SAMPLE_RATE, fallbacks=()):
+    primary = _create_single(name, language, sample_rate)
+    fallbacks = [_create_single(spec, language, sample_rate) for spec in fallbacks]
+    # Un repli identique au principal (moteur local absent, remplacé par Google) ne sert à rien
+    fallbacks = [r for r in fallbacks if (type(r), r.language) != (type(primary), primary.language)]
+    if not fallbacks:
+        return primary
+    return FallbackRecognizer(primary, fallbacks)
+
+
+def preload_recognizers(language, names=None):
+    # Au démarrage : le coût de chargement des modèles locaux n'est jamais payé par un énoncé
+    for spec in names or [STT_BACKEND] + list(STT_FALLBACKS):
+        name, _, spec_language = spec.partition(':')
+        if name not in ENGINE_LOADERS:
+            continue
+        try:
+            load_engine(name, spec_language or language)
+        except EngineUnavailable:
+            pass
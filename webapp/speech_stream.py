@@ -0,0 +1,130 @@
+import threading
+import time
+
+from constants import *
+from audio_ingest import AudioIngestError, StreamingDecoder
+from speech_recognizers import create_recognizer
+from vad import vad
+from metrics import metrics
+import logs
+
+STREAM_INPUT_FORMATS = {
+    'audio/webm': 'webm',
+    'audio/ogg': 'ogg',
+    'audio/mp4': 'mp4'
+}
+
+
+def input_format_for(mime):
+    return STREAM_INPUT_FORMATS.get((mime or '').split(';')[0].strip())
+
+
+class StreamingUtterance:
+    def __init__(self, recognizer, on_partial=None, mime=None, sample_rate=INGEST_SAMPLE_RATE, utterance_id=None):
+        self.id = utterance_id
+        self.recognizer = recognizer
+        self.on_partial = on_partial
+        self.started_at = time.perf_counter()
+        self.chunks = 0
+        self.received_bytes = 0
+        self.pcm = bytearray()
+        self._lock = threading.Condition()
+        self._next_seq = 0
+        self.expected_chunks = None
+        self.ended = False
+        self._out_of_order = {}
+        self.dropped = False
+        # Un partiel a déjà arrêté le tour en cours : le texte final ne doit pas l'interrompre une seconde fois
+        self.interrupted = False
+        self._last_partial = None
+        self.closed = False
+        self.decoder = StreamingDecoder(self._on_pcm, sample_rate, input_format_for(mime))
+
+    def _on_pcm(self, pcm):
+        self.pcm.extend(pcm)
+        partial = self.recognizer.accept(pcm)
+        if partial and partial != self._last_partial and self.on_partial:
+            self._last_partial = partial
+            try:
+                if self.on_partial(partial):
+                    self.interrupted = True
+            except Exception as e:
+                logs.warning("⚠️ Émission du transcript partiel impossible", erreur=e)
+
+    def feed(self, seq, data):
+        # Les événements Socket.IO peuvent être traités hors ordre : les morceaux sont
+        # remis dans l'ordre du MediaRecorder avant d'atteindre ffmpeg
+        with self._lock:
+            if self.closed:
+                return
+            if seq is None:
+                seq = self._next_seq
+            if seq < self._next_seq:
+                # Morceau déjà transmis à ffmpeg : un doublon ne doit pas rester en attente
+                return
+            dropped = seq - self._next_seq > STREAM_MAX_PENDING_CHUNKS or len(self._out_of_order) >= STREAM_MAX_PENDING_CHUNKS
+            if dropped:
+                self._drop(seq)
+            else:
+                self._out_of_order[seq] = data
+                while self._next_seq in self._out_of_order:
+                    chunk = self._out_of_order.pop(self._next_seq)
+                    self._next_seq += 1
+                    self.chunks += 1
+                    self.received_bytes += len(chunk)
+                    self.decoder.feed(chunk)
+            self._lock.notify_all()
+        if dropped:
+            self.decoder.abort()
+
+    def _drop(self, seq):
+        # Appelé sous le verrou : l'énoncé reste celui de la session pour absorber ses derniers
+        # morceaux, mais ne sera ni décodé ni reconnu
+        logs.warning("⚠️ Morceau manquant jamais reçu, énoncé abandonné", attendu=self._next_seq, recu=seq,
+                     en_attente=len(self._out_of_order))
+        self.dropped = True
+        self.closed = True
+        self._out_of_order.clear()
+
+    def end(self, total_chunks=None):
+        with self._lock:
+            self.ended = True
+            self.expected_chunks = total_chunks
+
+    def finish(self):
+        # Tout est déjà décodé et donné au moteur : il ne reste qu'à finaliser.
+        # La fin peut être traitée avant les derniers morceaux : on les attend un court instant
+        with self._lock:
+            if self.expected_chunks is not None:
+                self._lock.wait_for(lambda: self.dropped or self._next_seq >= self.expected_chunks, timeout=STREAM_END_GRACE)
+            self.closed = True
+            if self.dropped:
+                return None
+            if self._out_of_order:
+                logs.warning("⚠️ Morceaux manquants en fin d'énoncé", morceaux=len(self._out_of_order))
+        finalize_start = time.perf_counter()
+        try:
+            # Seule la fin du flux reste à convertir : c'est la part de ffmpeg sur le chemin critique
+            with metrics.timed("ffmpeg"):
+                self.decoder.close()
+        except AudioIngestError as e:
+            logs.error("❌ Conversion du flux audio impossible", erreur=e)
+            return None
+        speech = vad.gate(bytes(self.pcm))
+        if speech is None:
+            return None
+        with metrics.timed("recognition"):
+            texte = self.recognizer.finalize(speech)
+        logs.debug("✅ Énoncé finalisé", duree=round(time.perf_counter() - finalize_start, 3),
+                   morceaux=self.chunks, octets=self.received_bytes)
+        return texte
+
+    def abort(self):
+        with self._lock:
+            self.closed = True
+        self.decoder.abort()
+
+
+def start_utterance(language, on_partial=None, mime=None, utterance_id=None, backend=STT_BACKEND, fallbacks=STT_FALLBACKS):
+    recognizer = create_recognizer(backend, language, INGEST_SAMPLE_RATE, fallbacks)
+    return StreamingUtterance(recognizer, on_partial, mime, INGEST_SAMPLE_RATE, utterance_id)
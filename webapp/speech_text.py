@@ -0,0 +1,170 @@
+import re
+
+from constants import *
+
+# Constructions reconnues seulement en début de ligne, essayées une fois par ligne
+LINE_START = re.compile(r'''
+    (?P<fence>[ \t]*(?:```|~~~)[^\n]*)
+  | (?P<rule>[ \t]*([-_*])(?:[ \t]*\3){2,}[ \t]*(?=\n|$))
+  | (?P<table>[^\n]*\|[^\n]*)
+  | (?P<heading>[ \t]*\#{1,6}[ \t]+)
+  | (?P<quote>[ \t]*(?:>[ \t]?)+)
+  | (?P<bullet>[ \t]*[-*+][ \t]+)
+  | (?P<number>[ \t]*\d+[.)][ \t]+)
+''', re.VERBOSE)
+
+# Constructions en ligne : une seule recherche avance dans le texte, le texte ordinaire
+# entre deux correspondances est recopié tel quel
+INLINE = re.compile(r'''
+    (?P<newline>\n)
+  | `(?P<code>[^`]+)`
+  | !?\[(?P<link>[^\]]*)\]\([^)\s]*\)
+  | (?P<html><[A-Za-z/!][^>\n]*>)
+  | \b(?P<decimal>\d+)\.(?P<fraction>\d+)
+  | \b(?P<dotted>[^\W\d_]\w*(?:\.\w+)+)
+  | (?P<emphasis>(?<!\w)(?:\*{1,3}|_{1,3})(?=\S)|(?<=\S)(?:\*{1,3}|_{1,3})(?!\w))
+  | (?P<opener>`+|!?\[|<(?=[A-Za-z/!]|\Z)|[*_]+\Z)
+''', re.VERBOSE)
+
+# Construction ouverte en fin de morceau (code, lien, balise, emphase) : gardée pour le morceau suivant
+UNFINISHED = re.compile(r'(?:`+[^`]*|!?\[[^\]]*(?:\](?:\([^)\s]*)?)?|<(?:[A-Za-z/!][^>\n]*)?|[*_]+)\Z')
+UNFINISHED_MAX_CHARS = 200
+# Début de ligne coupé qui peut encore devenir une construction de LINE_START ("``" puis "`",
+# "#" puis "# ", "1" puis ". ", "--" puis "-\n") : gardé pour le morceau suivant
+PARTIAL_LINE_START = re.compile(r'[ \t]*(?:`{1,2}|~{1,2}|\#{1,6}|\d+[.)]?|([-*_])(?:[ \t]*\1)*[ \t]*)?\Z')
+
+SPACES = re.compile(r'[ \t]+')
+BLANK_LINES = re.compile(r'\s*\n\s*')
+
+SPOKEN_WORDS = {
+    "fr": {"decimal": "virgule", "dot": "point", "table": "Tableau."},
+    "en": {"decimal": "point", "dot": "dot", "table": "Table."}
+}
+
+
+class SpeechNormalizer:
+    # Markdown du LLM -> texte à prononcer, en une passe par morceau. L'état (bloc de code,
+    # tableau, début de ligne, construction coupée) passe d'un response_chunk au suivant
+    def __init__(self, lang=DEFAULT_TTS_LANG):
+        self.words = SPOKEN_WORDS.get(lang, SPOKEN_WORDS["fr"])
+        self.in_code = False
+        self.in_table = False
+        self.at_line_start = True
+        self.skip_line = False
+        self.pending = ""
+        self.previous = ""
+
+    def feed(self, text):
+        text, self.pending = self.pending + text, ""
+        return self._normalize(text)
+
+    def flush(self):
+        text, self.pending = self.pending, ""
+        return self._normalize(text, final=True)
+
+    def _normalize(self, text, final=False):
+        # Le dernier caractère du morceau précédent reste devant le texte : les assertions arrière
+        # (fin d'emphase, frontière de mot) voient à travers la coupure
+        out = []
+        pos = len(self.previous)
+        text = self.previous + text
+        end = len(text)
+        while pos < end:
+            if self.at_line_start:
+                if not final and PARTIAL_LINE_START.match(text, pos):
+                    self.pending = text[pos:]
+                    break
+                start = pos
+                pos = self._line_start(text, pos, out)
+                if pos >= end:
+                    break
+                if self.at_line_start and pos != start:
+                    # Ligne entière consommée (clôture, tableau, séparateur) : la suivante commence
+                    continue
+            if self.in_code or self.skip_line:
+                # Bloc de code, ou suite d'une ligne écartée (tableau, séparateur, clôture) coupée
+                # entre deux morceaux : rien n'est prononcé jusqu'à la fin de ligne
+                newline = text.find('\n', pos)
+                pos = end if newline < 0 else newline + 1
+                self.at_line_start = newline >= 0
+                self.skip_line = newline < 0 and self.skip_line
+                continue
+
+            match = INLINE.search(text, pos)
+            stop = match.start() if match else end
+            if stop > pos:
+                out.append(text[pos:stop])
+                self.at_line_start = False
+            if not match:
+                break
+            kind = match.lastgroup
+            if kind == 'opener':
+                if not final and len(text) - match.start() <= UNFINISHED_MAX_CHARS and UNFINISHED.match(text, match.start()):
+                    self.pending = text[match.start():]
+                    break
+                if not match.group().startswith('`'):
+                    out.append(match.group())
+            pos = match.end()
+            if kind == 'newline':
+                out.append('\n')
+                self.at_line_start = True
+            elif kind == 'code':
+                out.append(match.group('code'))
+            elif kind == 'link':
+                out.append(match.group('link'))
+            elif kind == 'fraction':
+                out.append(f"{match.group('decimal')} {self.words['decimal']} {match.group('fraction')}")
+            elif kind == 'dotted':
+                out.append(f" {self.words['dot']} ".join(match.group('dotted').split('.')))
+            if kind != 'newline':
+                self.at_line_start = False
+
+        consumed = len(text) - len(self.pending)
+        self.previous = text[consumed - 1:consumed] if consumed else self.previous
+        if final:
+            self.in_code = False
+            self.in_table = False
+            self.skip_line = False
+            self.previous = ""
+        spoken = BLANK_LINES.sub('\n', SPACES.sub(' ', ''.join(out)))
+        return spoken.strip()
+
+    def _line_start(self, text, pos, out):
+        match = LINE_START.match(text, pos)
+        kind = match.lastgroup if match else None
+
+        if kind == 'fence':
+            self.in_code = not self.in_code
+            return self._skip_line(text, match.end())
+        if self.in_code:
+            return pos
+        if kind == 'table':
+            # Un tableau entier devient une simple mention, une seule fois
+            if not self.in_table:
+                out.append(f" {self.words['table']} ")
+                self.in_table = True
+            return self._skip_line(text, match.end())
+        if text[pos] != '\n' or not self.in_table:
+            self.in_table = False
+        if kind == 'rule':
+            return self._skip_line(text, match.end())
+        if kind in ('heading', 'quote', 'bullet', 'number'):
+            self.at_line_start = False
+            return match.end()
+        return pos
+
+    def _skip_line(self, text, pos):
+        newline = text.find('\n', pos)
+        if newline < 0:
+            self.at_line_start = False
+            self.skip_line = True
+            return len(text)
+        self.at_line_start = True
+        return newline + 1
+
+
+def normalize_for_speech(text, lang=DEFAULT_TTS_LANG):
+    normalizer = SpeechNormalizer(lang)
+    spoken = normalizer.feed(text or "")
+    rest = normalizer.flush()
+    return f"{spoken} {rest}".strip() if rest else spoken
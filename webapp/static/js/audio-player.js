@@ -2,9 +2,34 @@ import config from './config.js';
 import uiController from './ui-controller.js';
 import socketManager from './socket-manager.js';
 
+// Pause entre deux blocs de la réponse ; les trames d'un même bloc s'enchaînent sans pause
+const BLOCK_GAP_SECONDS = 0.3;
+
 class AudioPlayer {
     constructor() {
-        this.audioQueue = [];
+        // Lecture par Web Audio : chaque clip est décodé puis programmé sur une même ligne de temps,
+        // à la suite du précédent, sans recharger un élément <audio> entre deux trames
+        this.context = null;
+        this.sources = new Set();
+        this.nextStartTime = 0;
+        this.pendingDecodes = 0;
+        this.decodeChain = Promise.resolve();
+        // Incrémenté à chaque vidage : les décodages encore en cours sont ignorés
+        this.generation = 0;
+    }
+
+    getContext() {
+        if (!this.context) {
+            this.context = new (window.AudioContext || window.webkitAudioContext)();
+            // Politique de lecture automatique : le contexte peut naître suspendu jusqu'au premier geste
+            const resume = () => this.context.resume();
+            document.addEventListener('click', resume, { once: true });
+            document.addEventListener('keydown', resume, { once: true });
+        }
+        if (this.context.state === 'suspended') {
+            this.context.resume().catch(() => {});
+        }
+        return this.context;
     }
 
     interruptResponse() {
@@ -16,46 +41,79 @@ class AudioPlayer {
         }
     }
 
-    queueAudioForPlayback(base64Audio) {
-        this.audioQueue.push(base64Audio);
-        if (!config.isPlayingAudio) {
-            this.playNextQueuedAudio();
-        }
-    }
-    
-    playNextQueuedAudio() {
-        if (this.audioQueue.length === 0) {
-            config.isPlayingAudio = false;
-            console.log('File d\'attente audio vide - réponse complète terminée');
-            uiController.updateRecordingUI();
-            return;
-        }
-        
+    queueAudioForPlayback(audio, mime = 'audio/mpeg', part = undefined) {
+        const context = this.getContext();
+        const generation = this.generation;
+        const data = this.toArrayBuffer(audio);
         config.isPlayingAudio = true;
         uiController.updateRecordingUI(true);
-        const base64Audio = this.audioQueue.shift();
-        const audioSrc = `data:audio/mp3;base64,${base64Audio}`;
-        const audioPlayer = document.getElementById('audio-player');
-        audioPlayer.src = audioSrc;
-        
-        audioPlayer.onended = () => {
-            console.log('Fin de lecture audio, passage au suivant');
-            setTimeout(() => {
-                this.playNextQueuedAudio();
-            }, 300);
+        this.pendingDecodes++;
+        // Décodages enchaînés : les clips sont programmés dans leur ordre d'arrivée
+        this.decodeChain = this.decodeChain
+            .then(() => context.decodeAudioData(data))
+            .then(buffer => {
+                if (generation === this.generation) {
+                    this.schedule(context, buffer, part);
+                }
+            })
+            .catch(error => console.error('Erreur lors de la lecture audio:', error))
+            .finally(() => {
+                if (generation === this.generation) {
+                    this.pendingDecodes--;
+                    this.checkFinished();
+                }
+            });
+    }
+
+    schedule(context, buffer, part) {
+        // Trame suivante d'un même bloc synthétisé en flux : collée à la précédente
+        const continuation = part !== undefined && part !== null && part > 0;
+        const gap = continuation || this.sources.size === 0 ? 0 : BLOCK_GAP_SECONDS;
+        const startAt = Math.max(context.currentTime, this.nextStartTime + gap);
+        const source = context.createBufferSource();
+        source.buffer = buffer;
+        source.connect(context.destination);
+        source.onended = () => {
+            this.sources.delete(source);
+            this.checkFinished();
         };
-        
-        audioPlayer.play().catch(error => {
-            console.error('Erreur lors de la lecture audio:', error);
-            this.playNextQueuedAudio();
-        });
+        this.sources.add(source);
+        source.start(startAt);
+        this.nextStartTime = startAt + buffer.duration;
     }
-    
+
+    checkFinished() {
+        if (this.sources.size > 0 || this.pendingDecodes > 0 || !config.isPlayingAudio) {
+            return;
+        }
+        config.isPlayingAudio = false;
+        console.log('File d\'attente audio vide - réponse complète terminée');
+        uiController.updateRecordingUI();
+    }
+
+    toArrayBuffer(audio) {
+        // Pièce jointe binaire : utilisée telle quelle ; ancien client : audio en base64
+        if (audio instanceof ArrayBuffer) {
+            return audio;
+        }
+        if (ArrayBuffer.isView(audio)) {
+            return audio.buffer.slice(audio.byteOffset, audio.byteOffset + audio.byteLength);
+        }
+        return Uint8Array.from(atob(audio), c => c.charCodeAt(0)).buffer;
+    }
+
     clearAudioQueue() {
-        this.audioQueue = [];
+        this.generation++;
+        this.pendingDecodes = 0;
+        for (const source of this.sources) {
+            source.onended = null;
+            source.stop();
+        }
+        this.sources.clear();
+        this.nextStartTime = 0;
         config.isPlayingAudio = false;
     }
 }
 
 const audioPlayer = new AudioPlayer();
-export default audioPlayer;
\ No newline at end of file
+export default audioPlayer;
@@ -15,6 +15,7 @@ class AudioRecorder {
         this.silenceAudioFrameCount = 0;
         this.blockRecordingUntilFullResponse = false;
         this.backgroundStream = null;
+        this.audioStream = null;
     }
 
     async getAudioDevice() {
@@ -39,6 +40,9 @@ class AudioRecorder {
         try {
             if (this.mediaRecorder) {
                 try {
+                    if (this.audioStream) {
+                        this.audioStream.cancelled = true;
+                    }
                     if (this.mediaRecorder.state === 'recording') {
                         this.mediaRecorder.stop();
                     }
@@ -81,6 +85,9 @@ class AudioRecorder {
             this.audioChunks = [];
             config.isRecording = true;
             this.mediaRecorder.addEventListener('dataavailable', event => this.audioChunks.push(event.data));
+            if (config.streamingUpload && config.binaryAudio) {
+                this.startAudioStream(this.mediaRecorder);
+            }
             this.mediaRecorder.start(100);
             uiController.updateRecordingUI(true);
 
@@ -113,8 +120,11 @@ class AudioRecorder {
                 return;
             }
 
-            const audioBlob = new Blob(this.audioChunks);
-            this.processAudio(audioBlob);
+            // En flux, l'audio est déjà parti : la fin d'énoncé est envoyée à l'arrêt du MediaRecorder
+            if (!this.audioStream) {
+                const audioBlob = new Blob(this.audioChunks);
+                this.processAudio(audioBlob);
+            }
             this.stream.getTracks().forEach(track => track.stop());
             this.audioChunks = [];
 
@@ -133,6 +143,36 @@ class AudioRecorder {
         }
     }
 
+    startAudioStream(mediaRecorder) {
+        const mime = mediaRecorder.mimeType;
+        const audioStream = {
+            id: socketManager.startAudioStream(mime),
+            chunks: 0,
+            bytes: 0,
+            cancelled: false
+        };
+        this.audioStream = audioStream;
+
+        mediaRecorder.addEventListener('dataavailable', event => {
+            if (event.data.size === 0) {
+                return;
+            }
+            socketManager.sendAudioChunk(audioStream.id, audioStream.chunks++, event.data, mime);
+            audioStream.bytes += event.data.size;
+        });
+
+        mediaRecorder.addEventListener('stop', () => {
+            const discard = audioStream.cancelled || audioStream.bytes < 1000;
+            if (discard && !audioStream.cancelled) {
+                console.warn("⚠️ Audio stream too small, likely no speech detected");
+            }
+            socketManager.endAudioStream(audioStream.id, audioStream.chunks, discard);
+            if (this.audioStream === audioStream) {
+                this.audioStream = null;
+            }
+        });
+    }
+
     startAudioAnalysis(dataArray) {
         let audioMonitoringId = null;
         const analyzeAudio = () => {
@@ -165,6 +205,16 @@ class AudioRecorder {
             return;
         }
 
+        if (config.binaryAudio) {
+            audioBlob.arrayBuffer()
+                .then(buffer => {
+                    console.log(`📤 Sending binary audio to server: ${buffer.byteLength} bytes`);
+                    socketManager.sendAudioData(buffer, audioBlob.type);
+                })
+                .catch(error => console.error("❌ Error reading audio blob:", error));
+            return;
+        }
+
         const reader = new FileReader();
         reader.onloadend = () => {
             const audioData = reader.result;
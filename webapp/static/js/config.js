@@ -5,6 +5,8 @@ const config = {
     isRecording: false,
     isPlayingAudio: false,
     continuousListening: true,
+    binaryAudio: true, // Audio en pièces jointes binaires Socket.IO plutôt qu'en base64
+    streamingUpload: true, // Envoi des morceaux du micro au fil de l'eau (nécessite binaryAudio)
     stopWords: ["au revoir", "bye"], // Mots pour terminer la conversation
     shutdownWords: ["stop", "arrête", "interrompt", "tais-toi", "silence"] // Mots pour interrompre la réponse du LLM
 };
@@ -14,7 +14,9 @@ class ModelsManager {
     }
 
     loadAvailableModels() {
-        fetch('/current-model')
+        // Le modèle est propre à chaque session : le serveur la retrouve par l'identifiant Socket.IO
+        const sid = socketManager.socket.id;
+        fetch(sid ? `/current-model?sid=${encodeURIComponent(sid)}` : '/current-model')
             .then(response => response.json())
             .then(data => {
                 config.currentModel = data.currentModel;
@@ -6,8 +6,10 @@ import uiSoundManager from './ui-sound-manager.js';
 
 class SocketManager {
     constructor() {
-        this.socket = io();
+        // Le serveur n'envoie l'audio en binaire qu'aux clients qui l'annoncent ici
+        this.socket = io({ auth: { binaryAudio: config.binaryAudio } });
         this.isGeneratingResponse = false;
+        this.nextUtteranceId = 0;
     }
 
     init() {
@@ -41,6 +43,15 @@ class SocketManager {
             uiController.showAssistantLoading();
         });
         
+        this.socket.on('partial_transcript', (data) => {
+            uiController.setStatus(`… ${data.text}`);
+        });
+        
+        this.socket.on('utterance_dropped', (data) => {
+            console.warn(`Énoncé écarté par le serveur (${data.reason})`);
+            uiController.setStatus(data.message);
+        });
+        
         this.socket.on('response_chunk', (data) => {
             this.isGeneratingResponse = true;
             console.log("--- RÉCEPTION CHUNK DE RÉPONSE ---");
@@ -56,16 +67,19 @@ class SocketManager {
                 }
             }
             
-            if (!uiController.isStreamingResponse) {
-                uiController.hideAssistantLoading();
-                uiController.disableTextInput(false);
-                uiController.startStreamingResponse(processedText);
-            } else {
-                uiController.appendToStreamingResponse(processedText);
+            // Le texte arrive immédiatement, l'audio suit dans un chunk séparé (text vide)
+            if (processedText) {
+                if (!uiController.isStreamingResponse) {
+                    uiController.hideAssistantLoading();
+                    uiController.disableTextInput(false);
+                    uiController.startStreamingResponse(processedText);
+                } else {
+                    uiController.appendToStreamingResponse(processedText);
+                }
             }
             
             if (data.audio) {
-                audioPlayer.queueAudioForPlayback(data.audio);
+                audioPlayer.queueAudioForPlayback(data.audio, data.mime, data.part);
             }
             
             setTimeout(() => {
@@ -114,8 +128,30 @@ class SocketManager {
         this.socket.emit('start_listening');
     }
 
-    sendAudioData(audioData) {
-        this.socket.emit('audio_data', { audio: audioData });
+    sendAudioData(audioData, mime) {
+        // ArrayBuffer : envoyé tel quel en pièce jointe binaire ; chaîne : ancienne data URL base64
+        if (audioData instanceof ArrayBuffer) {
+            this.socket.emit('audio_data', { audio: audioData, mime, size: audioData.byteLength });
+        } else {
+            this.socket.emit('audio_data', { audio: audioData });
+        }
+    }
+
+    startAudioStream(mime) {
+        const utteranceId = `${this.socket.id}-${this.nextUtteranceId++}`;
+        this.socket.emit('audio_stream_start', { utteranceId, mime });
+        return utteranceId;
+    }
+
+    sendAudioChunk(utteranceId, seq, blob, mime) {
+        // Le numéro de séquence permet au serveur de remettre les morceaux dans l'ordre
+        blob.arrayBuffer()
+            .then(buffer => this.socket.emit('audio_stream_chunk', { utteranceId, seq, mime, audio: buffer }))
+            .catch(error => console.error("❌ Error reading audio chunk:", error));
+    }
+
+    endAudioStream(utteranceId, chunks, discard = false) {
+        this.socket.emit('audio_stream_end', { utteranceId, chunks, discard });
     }
 
     sendTextMessage(text) {
@@ -143,10 +179,12 @@ class SocketManager {
     }
     
     cancelSpeech() {
-        const audioPlayer = document.getElementById('audio-player');
-        if (audioPlayer) {
-            audioPlayer.pause();
-            audioPlayer.currentTime = 0;
+        // Sources Web Audio déjà programmées, puis élément <audio> de la lecture directe
+        audioPlayer.clearAudioQueue();
+        const audioElement = document.getElementById('audio-player');
+        if (audioElement) {
+            audioElement.pause();
+            audioElement.currentTime = 0;
         }
     }
 }
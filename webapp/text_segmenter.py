@@ -0,0 +1,129 @@
+import re
+
+from constants import *
+
+# Abréviations françaises et anglaises dont le point ne termine pas une phrase
+ABBREVIATIONS = {
+    "m.", "mm.", "mme.", "mlle.", "dr.", "pr.", "me.", "st.", "ste.", "cf.", "env.",
+    "etc.", "ex.", "p.", "pp.", "av.", "apr.", "j.-c.", "n°.", "vol.", "chap.",
+    "mr.", "mrs.", "ms.", "prof.", "sr.", "jr.", "vs.", "no.", "approx.", "fig.",
+    "inc.", "ltd.", "co.", "dept.", "est.", "min.", "max."
+}
+
+SENTENCE_BOUNDARY = re.compile(r'[.!?…]+["\'»)\]]*[ \t]+|\n')
+SOFT_BOUNDARY = re.compile(r'[,;:][ \t]+')
+LAST_WORD = re.compile(r'(\S+)$')
+INITIALS = re.compile(r'^(?:[A-ZÀ-Ý]\.)+$|^(?:[^\W\d_]\.){2,}$')
+LIST_NUMBER = re.compile(r'(?:^|\n)[ \t]*\d+\.$')
+
+
+class NewlineSegmenter:
+    def __init__(self):
+        self.buffer = ""
+
+    def feed(self, text):
+        self.buffer += text
+        if '\n' not in self.buffer:
+            return []
+        blocks = self.buffer.split('\n')
+        self.buffer = blocks[-1]
+        complete = '\n'.join(blocks[:-1])
+        return [complete] if complete.strip() else []
+
+    def flush(self):
+        remaining, self.buffer = self.buffer, ""
+        return [remaining] if remaining.strip() else []
+
+
+class SentenceSegmenter:
+    def __init__(self, min_chars=SEGMENT_MIN_CHARS, max_chars=SEGMENT_MAX_CHARS,
+                 first_min_chars=SEGMENT_FIRST_MIN_CHARS, first_max_chars=SEGMENT_FIRST_MAX_CHARS):
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.first_min_chars = first_min_chars
+        self.first_max_chars = first_max_chars
+        self.buffer = ""
+        self.in_code_block = False
+        self.segment_count = 0
+
+    def feed(self, text):
+        self.buffer += text
+        segments = []
+        while True:
+            cut = self._find_cut()
+            if cut is None:
+                break
+            self._emit(self.buffer[:cut], segments)
+            self.buffer = self.buffer[cut:]
+        return segments
+
+    def flush(self):
+        segments = []
+        self._emit(self.buffer, segments)
+        self.buffer = ""
+        return segments
+
+    def _emit(self, segment, segments):
+        if segment.count('```') % 2:
+            self.in_code_block = not self.in_code_block
+        if segment.strip():
+            segments.append(segment)
+            self.segment_count += 1
+
+    def _find_cut(self):
+        is_first = self.segment_count == 0
+        min_chars = self.first_min_chars if is_first else self.min_chars
+        max_chars = self.first_max_chars if is_first else self.max_chars
+
+        for match in SENTENCE_BOUNDARY.finditer(self.buffer):
+            if match.end() < min_chars:
+                continue
+            if self._inside_code_block(match.start()):
+                continue
+            if match.group() != '\n' and self._is_abbreviation(match.start()):
+                continue
+            return match.end()
+
+        # Premier bloc : une virgule suffit pour démarrer la parole au plus tôt
+        if is_first:
+            for match in SOFT_BOUNDARY.finditer(self.buffer):
+                if match.end() >= min_chars and not self._inside_code_block(match.start()):
+                    return match.end()
+
+        if len(self.buffer) > max_chars and not self._inside_code_block(max_chars):
+            return self._forced_cut(max_chars)
+        return None
+
+    def _inside_code_block(self, position):
+        fences = self.buffer.count('```', 0, position)
+        return self.in_code_block != (fences % 2 == 1)
+
+    def _is_abbreviation(self, position):
+        if self.buffer[position] != '.':
+            return False
+        head = self.buffer[:position + 1]
+        word_match = LAST_WORD.search(head)
+        if not word_match:
+            return False
+        word = word_match.group(1).lstrip('(«"\'')
+        if word.lower() in ABBREVIATIONS or INITIALS.match(word):
+            return True
+        return bool(LIST_NUMBER.search(head))
+
+    def _forced_cut(self, max_chars):
+        window = self.buffer[:max_chars]
+        soft = [m.end() for m in SOFT_BOUNDARY.finditer(window)]
+        if soft and soft[-1] >= self.first_min_chars:
+            return soft[-1]
+        space = window.rfind(' ')
+        return space + 1 if space > 0 else max_chars
+
+
+SEGMENTERS = {
+    "sentence": SentenceSegmenter,
+    "newline": NewlineSegmenter
+}
+
+
+def create_segmenter(name=TEXT_SEGMENTER):
+    return SEGMENTERS.get(name, SentenceSegmenter)()
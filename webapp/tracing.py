@@ -0,0 +1,253 @@
+import contextvars
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+from constants import *
+import logs
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Trace du tour en cours : suit le thread de session et les tâches asyncio ; les workers
+# (TTS, ingestion) la reçoivent explicitement par bind()
+_current = contextvars.ContextVar("trace", default=None)
+_UNTRACED = nullcontext()
+
+
+class SamplingProfiler(threading.Thread):
+    # Échantillonne les piles de tous les threads à intervalle fixe pendant un tour
+    def __init__(self, interval=TRACE_PROFILE_INTERVAL, max_samples=TRACE_PROFILE_MAX_SAMPLES):
+        super().__init__(name="trace-profiler", daemon=True)
+        self.interval = interval
+        self.max_samples = max_samples
+        self.samples = []
+        self._stopped = threading.Event()
+
+    def run(self):
+        own = threading.get_ident()
+        while not self._stopped.wait(self.interval) and len(self.samples) < self.max_samples:
+            now = time.perf_counter()
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.samples.append((now, thread_id, tuple(reversed(stack))))
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+class Trace:
+    def __init__(self, turn_id, profile=False):
+        self.turn_id = turn_id
+        self.started_at = time.perf_counter()
+        self.wall_started_at = time.time()
+        self.events = []
+        self.threads = {}
+        self._lock = threading.Lock()
+        self.profiler = SamplingProfiler() if profile else None
+        if self.profiler:
+            self.profiler.start()
+
+    def record(self, name, start, end, **args):
+        thread_id = threading.get_ident()
+        with self._lock:
+            self.threads.setdefault(thread_id, threading.current_thread().name)
+            self.events.append((name, start, end, thread_id, args))
+
+    @contextmanager
+    def span(self, name, **args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter(), **args)
+
+    def _us(self, at):
+        return round((at - self.started_at) * 1e6, 1)
+
+    def _profile_events(self, pid):
+        # Piles échantillonnées -> spans imbriqués par thread (vue « flame chart » de Chrome) ;
+        # seuls les threads qui ont travaillé pour ce tour sont gardés
+        per_thread = {}
+        for at, thread_id, stack in self.profiler.samples:
+            if thread_id in self.threads:
+                per_thread.setdefault(thread_id, []).append((at, stack))
+        events = []
+        for thread_id, samples in per_thread.items():
+            open_frames = []
+            for at, stack in samples + [(samples[-1][0] + self.profiler.interval, ())]:
+                common = 0
+                while common < len(open_frames) and common < len(stack) and open_frames[common][0] == stack[common]:
+                    common += 1
+                for name, start in reversed(open_frames[common:]):
+                    events.append({'name': name, 'cat': 'profile', 'ph': 'X', 'pid': pid, 'tid': thread_id,
+                                   'ts': self._us(start), 'dur': round((at - start) * 1e6, 1)})
+                open_frames = open_frames[:common] + [(name, at) for name in stack[common:]]
+        return events
+
+    def chrome_events(self):
+        pid = os.getpid()
+        with self._lock:
+            spans = list(self.events)
+            threads = dict(self.threads)
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': thread_id, 'args': {'name': name}}
+                  for thread_id, name in threads.items()]
+        for name, start, end, thread_id, args in spans:
+            events.append({'name': name, 'cat': 'turn', 'ph': 'X', 'pid': pid, 'tid': thread_id,
+                           'ts': self._us(start), 'dur': round((end - start) * 1e6, 1),
+                           'args': dict(args, turn_id=self.turn_id)})
+        if self.profiler:
+            events.extend(self._profile_events(pid))
+        return events
+
+    def finish(self):
+        if self.profiler:
+            self.profiler.stop()
+
+    def duration(self):
+        with self._lock:
+            ends = [end for _, _, end, _, _ in self.events]
+        return max(ends, default=self.started_at) - self.started_at
+
+
+class Tracer:
+    def __init__(self, enabled=TRACE_ENABLED, directory=TRACE_DIR, max_files=TRACE_MAX_FILES):
+        self.enabled = enabled
+        self.directory = os.path.join(BASE_DIR, directory)
+        self.max_files = max_files
+        self._lock = threading.Lock()
+        self._profile_requests = 0
+        self._sequence = itertools.count(1)
+        self.recent = deque(maxlen=max_files)
+
+    def request_profile(self, turns=1):
+        with self._lock:
+            self._profile_requests += max(0, turns)
+
+    def _take_profile_request(self):
+        with self._lock:
+            if self._profile_requests:
+                self._profile_requests -= 1
+                return True
+            return False
+
+    def new_trace(self, profile=False):
+        # None quand rien n'est demandé : les spans ne coûtent alors qu'une lecture de variable de contexte
+        profile = profile or self._take_profile_request()
+        if not (self.enabled or profile):
+            return None
+        turn_id = f"{next(self._sequence):05d}-{uuid.uuid4().hex[:8]}"
+        return Trace(turn_id, profile)
+
+    def export(self, trace):
+        trace.finish()
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(trace.wall_started_at))
+        path = os.path.join(self.directory, f"turn-{stamp}-{trace.turn_id}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': trace.chrome_events(), 'displayTimeUnit': 'ms',
+                       'otherData': {'turn_id': trace.turn_id, 'profiled': trace.profiler is not None}}, f)
+        self.recent.append({'turn_id': trace.turn_id, 'file': os.path.basename(path),
+                            'duration': round(trace.duration(), 3), 'profiled': trace.profiler is not None})
+        self._prune()
+        return path
+
+    def _prune(self):
+        # Répertoire tournant : seules les max_files traces les plus récentes sont gardées
+        files = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.name.startswith("turn-") and entry.name.endswith(".json")),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        for entry in files[:-self.max_files] if len(files) > self.max_files else []:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            pending = self._profile_requests
+        return {'enabled': self.enabled, 'directory': self.directory, 'profile_pending': pending,
+                'recent': list(self.recent)}
+
+
+def current():
+    return _current.get()
+
+
+def record(name, start, end, **args):
+    trace = _current.get()
+    if trace is not None:
+        trace.record(name, start, end, **args)
+
+
+def turn_fields():
+    # Identifiant du tour dans les métriques envoyées au client, pour retrouver sa trace
+    trace = _current.get()
+    return {'turn_id': trace.turn_id} if trace is not None else {}
+
+
+def span(name, **args):
+    # Hors d'un tour tracé : un contexte vide partagé, sans générateur à créer
+    trace = _current.get()
+    return trace.span(name, **args) if trace is not None else _UNTRACED
+
+
+@contextmanager
+def activate(trace):
+    token = _current.set(trace)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def bind(function):
+    # Pour un exécuteur : la fonction s'exécute dans la trace du tour qui l'a soumise
+    trace = _current.get()
+    if trace is None:
+        return function
+
+    def traced(*args, **kwargs):
+        with activate(trace):
+            return function(*args, **kwargs)
+    return traced
+
+
+@contextmanager
+def turn(name, profile=False, **args):
+    # Racine d'un tour (ou simple span s'il est déjà tracé) ; exportée à la sortie
+    parent = _current.get()
+    if parent is not None:
+        with parent.span(name, **args):
+            yield parent
+        return
+    trace = tracer.new_trace(profile)
+    if trace is None:
+        yield None
+        return
+    token = _current.set(trace)
+    try:
+        with trace.span(name, **args):
+            yield trace
+    finally:
+        _current.reset(token)
+        try:
+            tracer.export(trace)
+        except OSError as e:
+            logs.warning("⚠️ Trace du tour non écrite", tour=trace.turn_id, erreur=e)
+
+
+tracer = Tracer()
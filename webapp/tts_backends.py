@@ -0,0 +1,164 @@
+import io
+import os
+import shutil
+import subprocess
+import threading
+
+from gtts import gTTS
+
+from constants import *
+import logs
+from audio_postprocess import AudioClip, pcm_to_wav
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class TtsUnavailable(Exception):
+    pass
+
+
+class GttsBackend:
+    # Service Google : un aller-retour réseau par bloc, un mp3 complet avant toute lecture.
+    # L'accélération est faite après coup par le post-traitement
+    name = "gtts"
+    codec = "gtts-mp3"
+    streaming = False
+    native_speed = False
+
+    def synthesize(self, text, lang, speed=1.0):
+        tts = gTTS(text=text, lang=lang, slow=False)
+        # Tampons en mémoire propres à chaque bloc : aucune collision entre synthèses parallèles
+        buffer = io.BytesIO()
+        tts.write_to_fp(buffer)
+        return AudioClip(buffer.getvalue(), 'mp3', None)
+
+    def stream(self, text, lang, speed=1.0):
+        yield self.synthesize(text, lang, speed)
+
+
+def batch_frames(chunks, sample_rate, frame_ms=TTS_STREAM_FRAME_MS):
+    # Regroupe le PCM produit au fil de l'eau en trames d'au moins frame_ms, lisibles telles quelles
+    minimum = int(sample_rate * frame_ms / 1000) * 2
+    pending = b''
+    for chunk in chunks:
+        pending += chunk
+        usable = len(pending) - len(pending) % 2
+        if usable >= minimum:
+            yield AudioClip(pending[:usable], 'pcm', sample_rate)
+            pending = pending[usable:]
+    if len(pending) >= 2:
+        yield AudioClip(pending[:len(pending) - len(pending) % 2], 'pcm', sample_rate)
+
+
+def join_frames(frames):
+    # Bloc entier à partir des trames : un seul WAV (ou le clip d'origine s'il n'y en a qu'un compressé)
+    frames = list(frames)
+    if len(frames) == 1 and frames[0].format != 'pcm':
+        return frames[0]
+    if not frames:
+        return None
+    sample_rate = frames[0].sample_rate
+    return AudioClip(pcm_to_wav(b''.join(frame.data for frame in frames), sample_rate), 'wav', sample_rate)
+
+
+class EspeakBackend:
+    # espeak-ng en local : le PCM sort sur stdout pendant la synthèse, la vitesse est native
+    name = "espeak"
+    codec = "espeak-wav"
+    streaming = True
+    native_speed = True
+    sample_rate = 22050
+
+    def __init__(self):
+        self.binary = shutil.which("espeak-ng") or shutil.which("espeak")
+        if not self.binary:
+            raise TtsUnavailable("espeak-ng introuvable")
+        # Premier appel à vide : données de prononciation chargées (cache disque) avant le premier bloc
+        subprocess.run([self.binary, "-q", "x"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=10)
+
+    def synthesize(self, text, lang, speed=1.0):
+        return join_frames(self.stream(text, lang, speed))
+
+    def stream(self, text, lang, speed=1.0):
+        voice = TTS_VOICES["espeak"].get(lang, lang)
+        rate = int(ESPEAK_BASE_RATE * speed)
+        process = subprocess.Popen(
+            [self.binary, "--stdout", "-v", voice, "-s", str(rate), text],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        try:
+            # En-tête WAV (tailles inconnues en flux) puis PCM 16 bits mono
+            # Fréquence propre à la voix : gardée pour ce bloc, le backend est partagé entre les sessions
+            header = process.stdout.read(44)
+            sample_rate = int.from_bytes(header[24:28], 'little') if len(header) == 44 else self.sample_rate
+            chunks = iter(lambda: process.stdout.read1(4096), b'')
+            yield from batch_frames(chunks, sample_rate)
+        finally:
+            # Bloc annulé en cours de lecture : le processus ne survit pas au générateur
+            if process.poll() is None:
+                process.kill()
+            process.stdout.close()
+            process.wait()
+
+
+class PiperBackend:
+    # Voix Piper (ONNX) chargées une fois et partagées ; une trame par phrase synthétisée
+    name = "piper"
+    codec = "piper-wav"
+    streaming = True
+    native_speed = True
+
+    def __init__(self):
+        try:
+            from piper import PiperVoice
+        except ImportError as e:
+            raise TtsUnavailable(f"paquet piper-tts absent: {e}")
+        self._voice_class = PiperVoice
+        self._voices = {}
+        self._lock = threading.Lock()
+        self.voice(DEFAULT_TTS_LANG)
+
+    def voice(self, lang):
+        with self._lock:
+            voice = self._voices.get(lang)
+            if voice is None:
+                path = TTS_VOICES["piper"].get(lang)
+                if not path or not os.path.isfile(os.path.join(BASE_DIR, path)):
+                    raise TtsUnavailable(f"voix Piper introuvable pour '{lang}': {path}")
+                logs.info("📦 Chargement de la voix Piper", chemin=path)
+                voice = self._voice_class.load(os.path.join(BASE_DIR, path))
+                self._voices[lang] = voice
+        return voice
+
+    def synthesize(self, text, lang, speed=1.0):
+        return join_frames(self.stream(text, lang, speed))
+
+    def stream(self, text, lang, speed=1.0):
+        voice = self.voice(lang)
+        sample_rate = voice.config.sample_rate
+        chunks = voice.synthesize_stream_raw(text, length_scale=1.0 / speed)
+        yield from batch_frames(chunks, sample_rate)
+
+
+TTS_BACKENDS = {
+    "gtts": GttsBackend,
+    "espeak": EspeakBackend,
+    "piper": PiperBackend
+}
+
+# Un moteur (et ses voix) par processus, partagé par toutes les sessions et par le script
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def load_tts_backend(name=TTS_BACKEND):
+    with _backends_lock:
+        backend = _backends.get(name)
+        if backend is None:
+            try:
+                backend = TTS_BACKENDS.get(name, GttsBackend)()
+            except Exception as e:
+                logs.warning("⚠️ Moteur de synthèse indisponible, repli sur gTTS", moteur=name, erreur=e)
+                backend = _backends.get("gtts") or GttsBackend()
+            _backends[name] = backend
+    return backend
@@ -0,0 +1,196 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from constants import *
+import logs
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def normalize_text(text):
+    # Deux textes qui se prononcent pareil doivent partager la même entrée
+    text = unicodedata.normalize('NFC', text or '')
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+class TtsCache:
+    def __init__(self, max_bytes=TTS_CACHE_MAX_BYTES, disk_dir=TTS_CACHE_DIR, disk_max_bytes=TTS_CACHE_DISK_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self.disk_dir = os.path.join(BASE_DIR, disk_dir) if disk_dir else None
+        self._entries = OrderedDict()
+        self._size = 0
+        # Index du niveau disque (clé -> taille), du moins au plus récemment utilisé : un échec en
+        # mémoire ne touche le disque que si la clé y est, et le budget disque se tient sans parcours
+        self._disk = OrderedDict()
+        self._disk_size = 0
+        self._lock = threading.Lock()
+        # Écritures, rafraîchissements et évictions disque hors du worker TTS, dans l'ordre de soumission
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts-cache")
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if self.disk_dir:
+            self._writer.submit(self._load_disk_index)
+
+    @staticmethod
+    def key(text, lang, speed_factor, codec):
+        material = f"{normalize_text(text)}\x00{lang}\x00{speed_factor}\x00{codec}"
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, key[:2], key)
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+            on_disk = self.disk_dir is not None and key in self._disk
+        data = self._read_disk(key) if on_disk else None
+        with self._lock:
+            if data is None:
+                if on_disk:
+                    # Fichier supprimé hors du cache : l'index est corrigé
+                    self._disk_size -= self._disk.pop(key, 0)
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store(key, data)
+            if key in self._disk:
+                self._disk.move_to_end(key)
+        self._writer.submit(self._touch_disk, key)
+        return data
+
+    def put(self, key, data):
+        if not data:
+            return
+        with self._lock:
+            self._store(key, data)
+        if self.disk_dir:
+            self._writer.submit(self._write_disk, key, data)
+
+    def _store(self, key, data):
+        # LRU borné en octets : une entrée plus grosse que le budget n'est gardée que sur disque
+        if len(data) > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._size -= len(previous)
+        self._entries[key] = data
+        self._size += len(data)
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _load_disk_index(self):
+        # Au démarrage : fichiers déjà présents, rangés par date de dernier usage
+        found = []
+        for root, _, names in os.walk(self.disk_dir):
+            for name in names:
+                if len(name) != 64:
+                    continue
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                found.append((stat.st_mtime, name, stat.st_size))
+        with self._lock:
+            # Du plus récent au plus ancien, chacun placé en tête : les écritures de la session restent en queue
+            for _, key, size in sorted(found, reverse=True):
+                if key not in self._disk:
+                    self._disk[key] = size
+                    self._disk_size += size
+                    self._disk.move_to_end(key, last=False)
+        self._evict_disk()
+
+    def _write_disk(self, key, data):
+        if not self.disk_dir or len(data) > self.disk_max_bytes:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Écriture atomique : un lecteur concurrent ne voit jamais un fichier partiel
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logs.warning("⚠️ Cache TTS disque indisponible", erreur=e)
+            return
+        with self._lock:
+            self._disk_size += len(data) - self._disk.pop(key, 0)
+            self._disk[key] = len(data)
+        self._evict_disk()
+
+    def _touch_disk(self, key):
+        # mtime = dernier usage : l'ordre d'éviction survit à un redémarrage
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+
+    def _evict_disk(self):
+        evicted = []
+        with self._lock:
+            while self._disk_size > self.disk_max_bytes and self._disk:
+                key, size = self._disk.popitem(last=False)
+                self._disk_size -= size
+                evicted.append(key)
+        for key in evicted:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def flush(self):
+        # Attend les écritures disque en file (arrêt propre, mesures)
+        self._writer.submit(lambda: None).result()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_ratio': round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'disk_entries': len(self._disk),
+                'disk_bytes': self._disk_size,
+                'disk_max_bytes': self.disk_max_bytes
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+def system_messages():
+    for lang in set(ERROR_MESSAGES) | set(RESPONSE_MESSAGES):
+        for messages in (ERROR_MESSAGES.get(lang, {}), RESPONSE_MESSAGES.get(lang, {})):
+            for text in messages.values():
+                yield text, lang
+
+
+tts_cache = TtsCache()
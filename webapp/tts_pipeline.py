@@ -0,0 +1,169 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from constants import *
+import logs
+from metrics import metrics
+import tracing
+
+
+def overlap_metrics(spans, generation_done_at, wait_time):
+    synthesis_time = sum(end - start for start, end in spans)
+    # Temps de synthèse recouvert par la génération du LLM
+    hidden_time = sum(
+        max(0.0, min(end, generation_done_at) - start)
+        for start, end in spans
+    )
+    return {
+        'chunks': len(spans),
+        'tts_time': round(synthesis_time, 3),
+        'tts_hidden_time': round(hidden_time, 3),
+        'tts_wait_time': round(wait_time, 3)
+    }
+
+
+def interrupt_metrics(token, last_emit_at, quiet_at):
+    # Réactivité d'une interruption, mesurée depuis la fin de l'énoncé qui l'a déclenchée
+    cancel_metrics = {
+        'cancel_reason': token.reason,
+        'interrupt_to_cancel': round(token.cancelled_at - token.origin_at, 3),
+        'interrupt_to_quiet': round(quiet_at - token.origin_at, 3)
+    }
+    if last_emit_at is not None:
+        cancel_metrics['interrupt_to_last_audio'] = round(max(0.0, last_emit_at - token.origin_at), 3)
+    return cancel_metrics
+
+
+class TtsTurn:
+    def __init__(self, executor, synthesize, on_audio, lang, cancel_token=None):
+        self._executor = executor
+        self._synthesize = synthesize
+        self._on_audio = on_audio
+        self._lang = lang
+        self._token = cancel_token
+        self._lock = threading.Lock()
+        # Trames en attente par bloc ; un bloc est terminé quand son index est dans _done
+        self._results = {}
+        self._done = set()
+        self._futures = []
+        self._next_index = 0
+        self._submitted = 0
+        self._all_emitted = threading.Condition(self._lock)
+        self._started_at = time.perf_counter()
+        self._generation_done_at = None
+        self._spans = []
+        self._first_frames = []
+        self.last_emit_at = None
+        if cancel_token:
+            cancel_token.add_callback(self._cancel)
+
+    @property
+    def cancelled(self):
+        return self._token is not None and self._token.cancelled
+
+    def submit(self, text):
+        with self._lock:
+            index = self._submitted
+            self._submitted += 1
+            if not text:
+                # Rien à prononcer (bloc de code, suite de tableau) : bloc terminé sans passer par un worker
+                self._done.add(index)
+                self._flush()
+            elif not self.cancelled:
+                self._futures.append(self._executor.submit(tracing.bind(self._run), index, text))
+        return index
+
+    def _cancel(self):
+        # Les synthèses pas encore démarrées sont retirées de l'exécuteur ; celles en cours
+        # finissent, mais leur résultat n'est jamais émis
+        with self._lock:
+            for future in self._futures:
+                future.cancel()
+            self._futures = []
+            self._all_emitted.notify_all()
+
+    def _run(self, index, text):
+        if self.cancelled:
+            return
+        start = time.perf_counter()
+        first_frame_at = None
+        try:
+            result = self._synthesize(text, self._lang)
+            if isinstance(result, tuple):
+                self._push(index, text, result[0], None)
+            else:
+                # Synthèse en flux : chaque trame part dès qu'elle est prête, si c'est le tour de ce bloc
+                for part, frame in enumerate(result):
+                    first_frame_at = first_frame_at or time.perf_counter()
+                    self._push(index, text, frame, part)
+                    if self.cancelled:
+                        result.close()
+                        break
+        except Exception as e:
+            logs.error("❌ Erreur TTS", bloc=index, erreur=e)
+            self._push(index, text, None, None)
+        end = time.perf_counter()
+
+        metrics.stage("tts_chunk", end - start)
+        tracing.record("tts_chunk", start, end, index=index, first_frame=first_frame_at and round(first_frame_at - start, 3))
+        with self._lock:
+            self._spans.append((start, end))
+            self._first_frames.append((first_frame_at or end) - start)
+            self._done.add(index)
+            self._flush()
+
+    def _push(self, index, text, clip, part):
+        with self._lock:
+            self._results.setdefault(index, []).append((text, clip, part))
+            self._flush()
+
+    def _flush(self):
+        # Émission dans l'ordre de soumission, quel que soit l'ordre de fin
+        while not self.cancelled:
+            for chunk_text, chunk_audio, part in self._results.pop(self._next_index, []):
+                try:
+                    self._on_audio(self._next_index, chunk_text, chunk_audio, part)
+                    if chunk_audio:
+                        self.last_emit_at = time.perf_counter()
+                except Exception as e:
+                    logs.error("❌ Erreur lors de l'émission audio", erreur=e)
+            if self._next_index not in self._done:
+                break
+            self._next_index += 1
+        self._all_emitted.notify_all()
+
+    def mark_generation_done(self):
+        self._generation_done_at = time.perf_counter()
+
+    def wait(self, timeout=None):
+        if self._generation_done_at is None:
+            self.mark_generation_done()
+        wait_start = time.perf_counter()
+        with self._lock:
+            self._all_emitted.wait_for(lambda: self._next_index >= self._submitted or self.cancelled, timeout=timeout)
+        wait_time = time.perf_counter() - wait_start
+        return self._metrics(wait_time)
+
+    def _metrics(self, wait_time):
+        with self._lock:
+            spans = list(self._spans)
+            first_frames = list(self._first_frames)
+        overlap = overlap_metrics(spans, self._generation_done_at, wait_time)
+        if first_frames:
+            # Délai entre le début de synthèse d'un bloc et sa première trame audio
+            overlap['tts_first_frame'] = round(sum(first_frames) / len(first_frames), 3)
+        return overlap
+
+
+class TtsPipeline:
+    def __init__(self, synthesize, max_workers=TTS_MAX_WORKERS):
+        self.synthesize = synthesize
+        self.max_workers = max(1, max_workers)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tts")
+
+    def start_turn(self, on_audio, lang, cancel_token=None):
+        return TtsTurn(self.executor, self.synthesize, on_audio, lang, cancel_token)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,102 @@
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+from constants import *
+import logs
+from metrics import metrics
+
+VadResult = namedtuple("VadResult", ["speech", "start", "end", "speech_ms", "trimmed_ms"])
+
+
+class VoiceActivityDetector:
+    def __init__(self, sample_rate=INGEST_SAMPLE_RATE, frame_ms=VAD_FRAME_MS, energy_threshold=VAD_ENERGY_THRESHOLD,
+                 zcr_max=VAD_ZCR_MAX, hangover_ms=VAD_HANGOVER_MS, min_speech_ms=VAD_MIN_SPEECH_MS, padding_ms=VAD_PADDING_MS):
+        self.sample_rate = sample_rate
+        self.frame_ms = frame_ms
+        self.energy_threshold = energy_threshold
+        self.zcr_max = zcr_max
+        self.hangover_frames = max(0, hangover_ms // frame_ms)
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self.padding_frames = max(0, padding_ms // frame_ms)
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.dropped = 0
+        self.trimmed_ms = 0
+
+    def voiced_frames(self, samples, sample_rate=None):
+        frame = int((sample_rate or self.sample_rate) * self.frame_ms / 1000)
+        n_frames = len(samples) // frame
+        if n_frames == 0:
+            return np.zeros(0, dtype=bool), frame
+        frames = samples[:n_frames * frame].reshape(n_frames, frame).astype(np.float32)
+
+        # Énergie (RMS) et taux de passage par zéro, calculés pour toutes les trames d'un coup
+        energy = np.sqrt(np.mean(frames * frames, axis=1))
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / frame
+
+        # Seuil adaptatif : au-dessus du plancher de bruit mesuré sur l'énoncé lui-même, mais
+        # plafonné par rapport aux trames les plus fortes pour un énoncé sans aucun silence
+        noise_floor, peak = np.percentile(energy, [10, 95])
+        threshold = max(self.energy_threshold, min(noise_floor * 3, peak * 0.25))
+        # Un ZCR élevé à énergie modérée, c'est du souffle ; une consonne forte passe quand même
+        voiced = (energy > threshold) & ((zcr < self.zcr_max) | (energy > threshold * 4))
+
+        if self.hangover_frames and voiced.any():
+            # Hangover : une trame voisée maintient l'état « parole » sur les trames suivantes
+            kernel = np.ones(self.hangover_frames + 1, dtype=np.int32)
+            voiced = np.convolve(voiced.astype(np.int32), kernel)[:n_frames] > 0
+        return voiced, frame
+
+    def analyze(self, pcm, sample_rate=None):
+        samples = np.frombuffer(pcm, dtype=np.int16)
+        sample_rate = sample_rate or self.sample_rate
+        total_ms = int(len(samples) * 1000 / sample_rate)
+        voiced, frame = self.voiced_frames(samples, sample_rate)
+        indices = np.flatnonzero(voiced)
+        speech_frames = len(indices) - min(len(indices), self.hangover_frames)
+        if speech_frames < self.min_speech_frames:
+            return VadResult(False, 0, 0, speech_frames * self.frame_ms, total_ms)
+
+        first = max(0, indices[0] - self.padding_frames)
+        last = min(len(voiced), indices[-1] + 1 + self.padding_frames)
+        start = first * frame
+        end = len(samples) if last == len(voiced) else last * frame
+        trimmed_ms = total_ms - int((end - start) * 1000 / sample_rate)
+        return VadResult(True, start * 2, end * 2, speech_frames * self.frame_ms, trimmed_ms)
+
+    def trim(self, pcm, sample_rate=None):
+        result = self.analyze(pcm, sample_rate)
+        return pcm[result.start:result.end] if result.speech else b''
+
+    def gate(self, pcm, sample_rate=None):
+        # Retourne le PCM débarrassé des silences de début et de fin, ou None si rien n'est à reconnaître
+        result = self.analyze(pcm, sample_rate)
+        self.record(result)
+        if not result.speech:
+            return None
+        return pcm[result.start:result.end]
+
+    def record(self, result):
+        with self._lock:
+            self.checked += 1
+            self.trimmed_ms += result.trimmed_ms
+            if not result.speech:
+                self.dropped += 1
+                logs.debug("🔇 Aucune parole détectée, reconnaissance évitée", ecartes=self.dropped, verifies=self.checked)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'checked': self.checked,
+                'recognitions_saved': self.dropped,
+                'trimmed_ms': self.trimmed_ms
+            }
+
+
+vad = VoiceActivityDetector()
+metrics.counter("assistant_vad_checked_total", "Énoncés passés par la détection de parole", lambda: vad.stats()['checked'])
+metrics.counter("assistant_vad_recognitions_saved_total", "Reconnaissances évitées faute de parole", lambda: vad.stats()['recognitions_saved'])
+metrics.counter("assistant_vad_trimmed_seconds_total", "Silence retiré avant la reconnaissance", lambda: vad.stats()['trimmed_ms'] / 1000)
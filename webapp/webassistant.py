@@ -1,335 +1,276 @@
-import os
-import requests
 import time
-import re
-import tempfile
 import base64
-import json
-import requests
-import shutil
-import speech_recognition as sr
-import subprocess
-import uuid
-from gtts import gTTS
+import logging
 from constants import *
+import logs
+import tracing
+from metrics import metrics
+from audio_ingest import AudioIngestError, decode_data_url, decode_to_pcm
+from audio_postprocess import AudioClip, PostProcessError, create_postprocessor
+from ollama_client import OllamaError
+from conversation import ConversationEngine
+from tts_pipeline import TtsPipeline
+from cancellation import CancelToken
+from tts_cache import tts_cache, system_messages
+from response_cache import replay_timeline, response_cache
+from response_turn import ResponseTurn
+from model_manager import model_manager
+from tts_backends import join_frames, load_tts_backend
+from speech_recognizers import create_recognizer
+from speech_stream import StreamingUtterance, start_utterance
+from scheduler import Transcript
+from vad import vad
+from speech_text import normalize_for_speech
 
 class WebAssistant:
     def __init__(self):
-        self.temp_dir = tempfile.gettempdir()
-        self.conversation_history = []
+        self.conversation = ConversationEngine()
         self.tts_lang = DEFAULT_TTS_LANG
         self.speech_lang_map = SPEECH_LANG_MAP
+        self.postprocessor = create_postprocessor(AUDIO_POSTPROCESS_ENGINE, AUDIO_SPEED_FACTOR)
+        self.tts_cache = tts_cache
+        self.tts_backend = load_tts_backend(TTS_BACKEND)
+        self.tts_codec = self.tts_backend.codec
+        self.response_cache = response_cache
+        self.model_manager = model_manager
+        self.tts_pipeline = TtsPipeline(self.synthesize_for_turn, max_workers=TTS_MAX_WORKERS)
 
-    def get_ollama_response(self, user_prompt, socketio, audio_queue, model_ref):
-        interrupt_words = INTERRUPT_WORDS[self.tts_lang]
-        has_interrupt_prefix = any(word in user_prompt.lower() for word in interrupt_words)
-        if has_interrupt_prefix:
-            socketio.emit('interrupt', {'message': RESPONSE_MESSAGES[self.tts_lang]["response_cancelled"]})
+    def close(self):
+        self.tts_pipeline.shutdown()
+        self.conversation.close()
 
-        activation_words = ACTIVATION_WORDS[self.tts_lang]
-        has_activation_prefix = any(word in user_prompt.lower() for word in activation_words)
-        if not has_activation_prefix:
+    @property
+    def conversation_history(self):
+        return self.conversation.history
+
+    @conversation_history.setter
+    def conversation_history(self, history):
+        self.conversation.history = history
+
+    def is_interrupt(self, text):
+        return any(word in text.lower() for word in INTERRUPT_WORDS[self.tts_lang])
+
+    def activated_prompt(self, user_prompt):
+        if not any(word in user_prompt.lower() for word in ACTIVATION_WORDS[self.tts_lang]):
+            return None
+        return user_prompt[len("ok assistant"):].strip() if user_prompt.lower().startswith("ok assistant") else user_prompt
+
+    def get_ollama_response(self, user_prompt, socketio, model_ref, cancel_token=None, typed=False, tts=True):
+        with tracing.turn("response", model=model_ref, typed=typed, tts=tts):
+            return self._respond(user_prompt, socketio, model_ref, cancel_token, typed, tts)
+
+    def _respond(self, user_prompt, socketio, model_ref, cancel_token, typed, tts):
+        cancel_token = cancel_token or CancelToken()
+        turn = ResponseTurn(self, model_ref, tts)
+        for event, data in turn.open(user_prompt, typed):
+            socketio.emit(event, data)
+        if not turn.user_prompt:
             return
+        if turn.cached is not None:
+            return self._replay_response(socketio, turn, cancel_token)
 
-        socketio.emit('transcript', {'text': user_prompt})
-        user_prompt = user_prompt[len("ok assistant"):].strip() if user_prompt.lower().startswith("ok assistant") else user_prompt
-        
-        context_messages = []
-        current_lang = self.tts_lang
-        for i, msg in enumerate(self.conversation_history):
-            speaker = 'Assistant' if i%2 else 'Utilisateur'
-            context_messages.append(f"{speaker} [{current_lang}]: {msg}")
-        
-        context = "\n".join(context_messages)
-        prompt = f"{context}\nUtilisateur [{current_lang}]: {user_prompt}\nAssistant [{current_lang}]:"
-        system_prompt = SYSTEM_PROMPTS.get(self.tts_lang, SYSTEM_PROMPTS["fr"])
-        
-        payload = {
-            "model": model_ref,
-            "prompt": prompt,
-            "system": system_prompt,
-            "stream": True,
-            "options": OLLAMA_OPTIONS
-        }
-
-        print(f"🔄 Envoi de la requête à Ollama: {payload}")
-        
         try:
-            response_stream = requests.post(OLLAMA_URL, json=payload, stream=True)
-            
-            if response_stream.status_code != 200:
-                print(f"❌ Erreur Ollama: {response_stream.status_code}")
-                error_msg = ERROR_MESSAGES[self.tts_lang]["model_communication"]
-                socketio.emit('response', {'text': error_msg, 'isComplete': True})
+            turn.start_generation()
+            try:
+                response_stream = self.conversation.client.stream(turn.path, turn.payload)
+            except OllamaError as e:
+                logs.error("❌ Erreur Ollama", statut=e.status_code)
+                socketio.emit('response', turn.error("model_communication"))
                 return
+            # Une annulation coupe la connexion HTTP : Ollama arrête de générer immédiatement
+            cancel_token.add_callback(response_stream.abort)
+
+            binary_audio = getattr(socketio, 'binary_audio', False)
+
+            def emit_audio(index, text, clip, part=None):
+                payload = turn.audio_chunk(index, clip, binary_audio, part)
+                if payload:
+                    with metrics.timed("emit"):
+                        socketio.emit('response_chunk', payload)
+
+            tts_turn = self.tts_pipeline.start_turn(emit_audio, turn.lang, cancel_token)
+
+            def emit_block(text):
+                if cancel_token.cancelled:
+                    return
+                index = tts_turn.submit(turn.speech(text))
+                socketio.emit('response_chunk', turn.text_chunk(index, text))
             
-            full_response = ""
-            buffer = ""
-            current_blocks = []
-            
-            for line in response_stream.iter_lines():
-                parallel_audio_instruction = self._get_parallel_audio_instruction(audio_queue)
-                if (parallel_audio_instruction):
-                    parallel_user_prompt = self.analyze_audio(parallel_audio_instruction)
-                    if parallel_user_prompt:
-                        has_interrupt_prefix = any(word in parallel_user_prompt.lower() for word in interrupt_words)
-                        if has_interrupt_prefix:
-                            socketio.emit('interrupt', {'message': RESPONSE_MESSAGES[self.tts_lang]["response_cancelled"]})
+            try:
+                with response_stream:
+                    for chunk_data in response_stream:
+                        if cancel_token.cancelled:
                             break
-                if line:
-                    try:
-                        chunk_data = json.loads(line)
-                        if 'response' in chunk_data:
-                            chunk_text = chunk_data['response']
-                            buffer += chunk_text
-                            full_response += chunk_text
-                            
-                            if '\n' in buffer:
-                                blocks = buffer.split('\n')
-                                complete_blocks = blocks[:-1]
-                                
-                                if complete_blocks:
-                                    blocks_text = '\n'.join(complete_blocks)
-                                    current_blocks.extend(complete_blocks)
-                                    audio_base64, _ = self._convert_text_to_speech(blocks_text)
-                                    socketio.emit('response_chunk', {
-                                        'text': blocks_text,
-                                        'audio': audio_base64,
-                                        'isComplete': False
-                                    })
-                                    
-                                    buffer = blocks[-1]
-                    except json.JSONDecodeError:
-                        print(f"Erreur décodage JSON: {line}")
-                        continue
-                    
-                    if 'done' in chunk_data and chunk_data['done']:
-                        if buffer.strip():
-                            last_audio_base64, _ = self._convert_text_to_speech(buffer)
-                            socketio.emit('response_chunk', {
-                                'text': buffer,
-                                'audio': last_audio_base64,
-                                'isComplete': False
-                            })
-                            current_blocks.append(buffer)
-                        
-                        socketio.emit('response_complete', {
-                            'lastUserMessage': user_prompt,
-                            'isComplete': True
-                        })
-                        
-                        if len(self.conversation_history) > 10:
-                            self.conversation_history = self.conversation_history[-10:]
-                        self.conversation_history.append(user_prompt)
-                        self.conversation_history.append(full_response)
-                        break
-            
-            return full_response
+
+                        for segment in turn.feed(chunk_data):
+                            emit_block(segment)
+
+                        if turn.done:
+                            tail = turn.speech_tail()
+                            if tail and not cancel_token.cancelled:
+                                tts_turn.submit(tail)
+
+                            tts_turn.mark_generation_done()
+                            turn.commit()
+                            tts_metrics = tts_turn.wait()
+                            if cancel_token.cancelled:
+                                break
+                            socketio.emit('response_complete', turn.complete(tts_metrics))
+                            turn.finish()
+                            break
+            except Exception:
+                # La coupure du flux par l'annulation fait échouer la lecture : ce n'est pas une erreur
+                if not cancel_token.cancelled:
+                    raise
+            finally:
+                cancel_token.remove_callback(response_stream.abort)
+                turn.touch_model()
+
+            if cancel_token.cancelled:
+                tts_turn.wait()
+                socketio.emit('response_complete', turn.cancelled(cancel_token, tts_turn.last_emit_at))
+                return None
+            return turn.full_response
             
         except Exception as e:
-            print(f"❌ Exception lors du streaming depuis Ollama: {e}")
-            error_msg = ERROR_MESSAGES[self.tts_lang]["model_access"]
-            socketio.emit('response', {'text': error_msg, 'isComplete': True})
+            logs.error("❌ Exception lors du streaming depuis Ollama", erreur=e)
+            socketio.emit('response', turn.error("model_access"))
+            return None
+
+    def _replay_response(self, socketio, turn, cancel_token):
+        # Même requête déterministe : texte et audio enregistrés rejoués par les mêmes événements
+        turn.start_replay()
+        binary_audio = getattr(socketio, 'binary_audio', False)
+
+        for delay, kind, index, value in replay_timeline(turn.cached):
+            if (delay and cancel_token.wait(delay)) or cancel_token.cancelled:
+                break
+            socketio.emit('response_chunk', turn.replay_chunk(kind, index, value, binary_audio))
+
+        if cancel_token.cancelled:
+            socketio.emit('response_complete', turn.cancelled(cancel_token))
             return None
 
+        socketio.emit('response_complete', turn.replay_complete())
+        return turn.finish()
+
     def analyze_audio(self, audio_data):
         try:
-            print(f"💾 Début d'analyse audio, taille de données: {len(audio_data) if audio_data else 'None'}")
+            logs.debug("💾 Début d'analyse audio", taille=len(audio_data) if audio_data else None)
             if not audio_data or len(audio_data) < 100:
-                print("❌ Données audio invalides ou trop petites")
+                logs.warning("❌ Données audio invalides ou trop petites")
                 return None
 
-            audio_bytes = base64.b64decode(audio_data.split(',')[1])
-            print(f"💾 Audio décodé avec succès, taille: {len(audio_bytes)} octets")
-            
-            session_id = str(uuid.uuid4())
-            session_dir = os.path.join(self.temp_dir, f"audio_session_{session_id}")
-            os.makedirs(session_dir, exist_ok=True)
-            timestamp = int(time.time() * 1000)
-            temp_source = os.path.join(session_dir, f"temp_audio_source_{timestamp}")
-            temp_wav = os.path.join(session_dir, f"temp_audio_{timestamp}.wav")
-            
-            with open(temp_source, 'wb') as f:
-                f.write(audio_bytes)
-            print(f"💾 Fichier source écrit: {temp_source}")
-            
-            # Analyse des premiers octets pour diagnostic
-            with open(temp_source, 'rb') as f:
-                header = f.read(16)
-                header_hex = ' '.join([f'{b:02x}' for b in header])
-                print(f"🔍 En-tête fichier audio: {header_hex}")
-            
-            # Modify the conversion command to hide ffmpeg output
-            conversion_command = ["ffmpeg", "-y", "-loglevel", "error", "-i", temp_source, "-acodec", "pcm_s16le", "-ar", "16000", "-ac", "1", temp_wav]
-            print(f"🔄 Commande de conversion: ffmpeg conversion (output hidden)")
-            
-            try:
-                process = subprocess.run(conversion_command, capture_output=True, text=True, check=False)
-                if process.returncode != 0:
-                    print(f"❌ Error converting audio: ffmpeg returned {process.returncode}")
-                    print(f"STDERR: {process.stderr}")
-                    return None
-                print(f"✅ Conversion réussie: {temp_wav}")
-            except Exception as e:
-                print(f"❌ Error executing ffmpeg: {e}")
-                return None
-            
-            recognizer = sr.Recognizer()
-            
-            with sr.AudioFile(temp_wav) as source:
-                print(f"🎤 Lecture du fichier WAV converti")
-                audio = recognizer.record(source)
-                print(f"✅ Audio chargé dans recognizer")
-                
-            speech_lang = self.speech_lang_map.get(self.tts_lang, "fr-FR")
-            print(f"🗣️ Reconnaissance vocale avec la langue: {speech_lang}")
-                
+            audio_bytes = decode_data_url(audio_data)
+            if logs.enabled(logging.DEBUG):
+                # En-tête du conteneur, pour diagnostiquer un format refusé par ffmpeg
+                logs.debug("🔍 Audio décodé", octets=len(audio_bytes), entete=audio_bytes[:16].hex())
+
             try:
-                print("🔍 Tentative de reconnaissance via Google...")
-                texte = recognizer.recognize_google(audio, language=speech_lang)
-                print(f"✅ Texte reconnu: {texte}")
-                return texte
-            except sr.UnknownValueError:
-                print("❌ Speech not recognized - aucune parole détectée")
+                pcm = decode_to_pcm(audio_bytes, INGEST_SAMPLE_RATE)
+            except AudioIngestError as e:
+                logs.error("❌ Conversion audio impossible", erreur=e)
                 return None
-            except sr.RequestError as e:
-                print(f"❌ Google Speech API error: {e}")
+            logs.debug("✅ Conversion réussie", octets_pcm=len(pcm))
+
+            speech = vad.gate(pcm, INGEST_SAMPLE_RATE)
+            if speech is None:
                 return None
-            finally:
-                try:
-                    # Conserver les fichiers temporaires en cas d'erreur pour le débogage
-                    if os.path.exists(temp_source) and os.path.exists(temp_wav):
-                        print(f"🧹 Nettoyage des fichiers temporaires dans: {session_dir}")
-                        shutil.rmtree(session_dir, ignore_errors=True)
-                    else:
-                        print(f"⚠️ Conservation des fichiers de débogage dans: {session_dir}")
-                except Exception as cleanup_error:
-                    print(f"⚠️ Error during cleanup: {cleanup_error}")
-                    pass
-                
+            return self.recognize_pcm(speech)
         except Exception as e:
-            import traceback
-            print(f"❌ Error processing audio: {e}")
-            print(f"Stack trace: {traceback.format_exc()}")
+            logs.error("❌ Erreur lors de l'analyse audio", exc_info=True, erreur=e)
+            return None
+
+    def recognize_pcm(self, pcm):
+        recognizer = create_recognizer(STT_BACKEND, self.speech_language(), INGEST_SAMPLE_RATE, STT_FALLBACKS)
+        with metrics.timed("recognition"):
+            return recognizer.recognize(pcm)
+
+    def speech_language(self):
+        return self.speech_lang_map.get(self.tts_lang, "fr-FR")
+
+    def start_utterance(self, on_partial=None, mime=None, utterance_id=None):
+        return start_utterance(self.speech_language(), on_partial, mime, utterance_id)
+
+    def transcribe(self, item):
+        # Énoncé reçu en flux : déjà décodé et reconnu au fil de l'eau, il ne reste qu'à finaliser
+        if isinstance(item, StreamingUtterance):
+            return item.finish()
+        if isinstance(item, Transcript):
+            return item.text
+        return self.analyze_audio(item)
+
+    def _speech_text(self, texte, lang, normalized=False):
+        lang = lang or self.tts_lang
+        texte_brut = texte if normalized else normalize_for_speech(texte, lang)
+        return texte_brut, lang, self.tts_cache.key(texte_brut, lang, AUDIO_SPEED_FACTOR, self.tts_codec)
+
+    def _cached_clip(self, cache_key):
+        cached = self.tts_cache.get(cache_key)
+        if cached is None:
             return None
+        # mp3 de gTTS une fois accéléré, ou wav d'un moteur local
+        return AudioClip(cached, 'wav' if cached[:4] == b'RIFF' else 'mp3', None)
 
-    def _convert_text_to_speech(self, texte):
-        texte_brut = self._markdown_to_text(texte)
-        texte_brut = self._clean_text(texte_brut)
+    def synthesize_audio(self, texte, lang=None, normalized=False):
+        texte_brut, lang, cache_key = self._speech_text(texte, lang, normalized)
+        cached = self._cached_clip(cache_key)
+        if cached is not None:
+            return cached, texte
         
         try:
-            tts = gTTS(text=texte_brut, lang=self.tts_lang, slow=False)
-            timestamp = int(time.time())
-            temp_file = os.path.join(self.temp_dir, f"assistant_vocal_{timestamp}.mp3")
-            temp_file_fast = os.path.join(self.temp_dir, f"assistant_vocal_{timestamp}_fast.mp3")
-            tts.save(temp_file)
-            cmd = f"ffmpeg -y -i {temp_file} -filter:a \"atempo={AUDIO_SPEED_FACTOR}\" -vn {temp_file_fast} > /dev/null 2>&1"
-            os.system(cmd)
-
-            audio_file = temp_file_fast if os.path.exists(temp_file_fast) else temp_file
-            with open(audio_file, 'rb') as f:
-                audio_data = f.read()
-                audio_base64 = base64.b64encode(audio_data).decode('utf-8')
-            
+            if self.tts_backend.native_speed:
+                # Moteur local : vitesse réglée à la synthèse, pas de post-traitement
+                with tracing.span("tts_backend", backend=self.tts_backend.name):
+                    clip = self.tts_backend.synthesize(texte_brut, lang, AUDIO_SPEED_FACTOR)
+                self.tts_cache.put(cache_key, clip.data)
+                return clip, texte
+
+            with tracing.span("tts_backend", backend=self.tts_backend.name):
+                clip = self.tts_backend.synthesize(texte_brut, lang)
             try:
-                if os.path.exists(temp_file):
-                    os.remove(temp_file)
-                if os.path.exists(temp_file_fast):
-                    os.remove(temp_file_fast)
-            except Exception as e:
-                print(f"❌ Erreur lors du nettoyage des fichiers: {e}")
-                
-            return audio_base64, texte
+                with tracing.span("postprocess"):
+                    clip = self.postprocessor.process(clip)
+                self.tts_cache.put(cache_key, clip.data)
+            except PostProcessError as e:
+                logs.warning("⚠️ Accélération audio impossible, audio d'origine conservé", erreur=e)
+
+            return clip, texte
         except Exception as e:
-            print(f"❌ Erreur lors de la synthèse vocale: {e}")
+            logs.error("❌ Erreur lors de la synthèse vocale", erreur=e)
             return None, texte
 
-    def _get_parallel_audio_instruction(self, q):
-        while not q.empty():
-            current_item = q.get()
-            return current_item
-        return None
+    def synthesize_stream(self, texte, lang=None, normalized=False):
+        # Trames PCM émises pendant la synthèse ; le bloc complet rejoint le cache à la fin
+        texte_brut, lang, cache_key = self._speech_text(texte, lang, normalized)
+        cached = self._cached_clip(cache_key)
+        if cached is not None:
+            yield cached
+            return
+        frames = []
+        for frame in self.tts_backend.stream(texte_brut, lang, AUDIO_SPEED_FACTOR):
+            frames.append(frame)
+            yield frame
+        clip = join_frames(frames)
+        if clip:
+            self.tts_cache.put(cache_key, clip.data)
+
+    def synthesize_for_turn(self, texte, lang=None):
+        # Texte déjà normalisé segment par segment par le tour en cours
+        if self.tts_backend.streaming:
+            return self.synthesize_stream(texte, lang, normalized=True)
+        return self.synthesize_audio(texte, lang, normalized=True)
 
-    def _markdown_to_text(self, markdown_text):
-        if not markdown_text:
-            return ""
-            
-        # Supprimer complètement les blocs de code
-        text = re.sub(r'```[\s\S]*?```', '', markdown_text)
-        
-        # Supprimer les backticks simples (code inline)
-        text = re.sub(r'`([^`]+)`', r'\1', text)
-        
-        # Supprimer les balises HTML
-        text = re.sub(r'<[^>]+>', '', markdown_text)
-        
-        # Convertir les liens [texte](url) en texte uniquement
-        text = re.sub(r'\[([^\]]+)\]\([^)]+\)', r'\1', text)
-        
-        # Supprimer les symboles de titre (#)
-        text = re.sub(r'^#{1,6}\s+', '', text, flags=re.MULTILINE)
-        
-        # Supprimer les symboles de liste (*, -, +)
-        text = re.sub(r'^\s*[-*+]\s+', '', text, flags=re.MULTILINE)
-        
-        # Supprimer les listes numériques
-        text = re.sub(r'^\s*\d+\.\s+', '', text, flags=re.MULTILINE)
-        
-        # Supprimer les symboles d'emphase (* et _) pour le gras et l'italique
-        text = re.sub(r'\*\*(.*?)\*\*', r'\1', text)  # Gras **texte**
-        text = re.sub(r'__(.*?)__', r'\1', text)      # Gras __texte__
-        text = re.sub(r'\*(.*?)\*', r'\1', text)      # Italique *texte*
-        text = re.sub(r'_(.*?)_', r'\1', text)        # Italique _texte_
-        
-        # Supprimer les symboles de citation (>)
-        text = re.sub(r'^\s*>\s+', '', text, flags=re.MULTILINE)
-        
-        # Supprimer les barres horizontales (---, ___, ***)
-        text = re.sub(r'^\s*([-_*])\1{2,}\s*$', '', text, flags=re.MULTILINE)
-        
-        # Remplacer les tableaux par une indication simple
-        if '|' in text and re.search(r'[-|]+', text):
-            # Détection améliorée des tableaux
-            lines = text.split('\n')
-            in_table = False
-            table_lines = []
-            
-            for i, line in enumerate(lines):
-                if '|' in line:
-                    if not in_table:
-                        in_table = True
-                    table_lines.append(i)
-                elif in_table and not line.strip():
-                    # Ligne vide après un tableau
-                    in_table = False
-            
-            if table_lines:
-                # Nombre de tableaux détectés
-                table_count = 1
-                prev_line = -2
-                
-                for line_num in table_lines:
-                    if line_num > prev_line + 1:
-                        table_count += 1
-                    prev_line = line_num
-                
-                # Remplacer chaque tableau par une description simple
-                text_lines = text.split('\n')
-                for i in sorted(table_lines, reverse=True):
-                    if i < len(text_lines):
-                        text_lines.pop(i)
-                        if i == table_lines[0]:
-                            text_lines.insert(i, f"[Tableau]")
-                
-                text = '\n'.join(text_lines)
-        
-        # Supprimer les espaces et retours à la ligne superflus
-        text = re.sub(r'\n{3,}', '\n\n', text)
-        text = text.strip()
-        
-        return text
-    
-    def _clean_text(self, texte):
-        texte = re.sub(r'(\d+)\.(\d+)', r'\1 virgule \2', texte)
-        texte = re.sub(r'(\w+)\.(\w+)', r'\1 point \2', texte)
-        return texte
+    def _convert_text_to_speech(self, texte, lang=None):
+        clip, texte = self.synthesize_audio(texte, lang)
+        if clip is None:
+            return None, texte
+        return base64.b64encode(clip.data).decode('utf-8'), texte
+
+    def prewarm_tts_cache(self):
+        # Messages fixes (erreurs, statuts) synthétisés une fois au démarrage
+        start = time.perf_counter()
+        for text, lang in system_messages():
+            self.synthesize_audio(text, lang)
+        stats = self.tts_cache.stats()
+        logs.info("🔥 Cache TTS préchauffé", duree=round(time.perf_counter() - start, 1), entrees=stats['entries'], octets=stats['bytes'])